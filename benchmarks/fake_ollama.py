@@ -0,0 +1,110 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+DEFAULT_ANSWER = (
+    "A process has its own address space, while threads share the memory of the process that owns them. "
+    "Threads are cheaper to create and switch between, but need synchronization around shared state."
+)
+
+
+class FakeOllamaServer:
+    """
+    Minimal local stand-in for the Ollama HTTP API, enough for LLMClient:
+    /api/tags, /api/generate (warm-up) and /api/chat (streamed or not).
+    Answers are streamed word by word at token_rate tokens per second
+    after first_token_delay seconds, so latency numbers are reproducible.
+    """
+
+    def __init__(self, token_rate: float = 50.0, first_token_delay: float = 0.1, answer: str = DEFAULT_ANSWER,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.token_rate = token_rate
+        self.first_token_delay = first_token_delay
+        self.answer = answer
+        self.requests = []
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def tokens(self):
+        """Splits the answer into word-sized tokens, keeping the spaces so they join back exactly."""
+        words = self.answer.split(" ")
+        return [words[0]] + [" " + word for word in words[1:]]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": []})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                server.requests.append((self.path, body))
+                if self.path == "/api/generate":
+                    self._send_json({"model": body.get("model", ""), "response": "", "done": True})
+                elif self.path == "/api/chat":
+                    self._chat(body)
+                else:
+                    self.send_error(404)
+
+            def _chat(self, body):
+                model = body.get("model", "")
+                time.sleep(server.first_token_delay)
+                if not body.get("stream", True):
+                    time.sleep(len(server.tokens()) / server.token_rate)
+                    self._send_json({"model": model, "done": True,
+                                     "message": {"role": "assistant", "content": server.answer}})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                for i, token in enumerate(server.tokens()):
+                    if i:
+                        time.sleep(1.0 / server.token_rate)
+                    self._write_line({"model": model, "done": False,
+                                      "message": {"role": "assistant", "content": token}})
+                self._write_line({"model": model, "done": True, "done_reason": "stop",
+                                  "message": {"role": "assistant", "content": ""}})
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _write_line(self, payload):
+                self.wfile.write(json.dumps(payload).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,103 @@
+import os
+import wave
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+SAMPLE_RATE = 16000
+# What most microphones capture at; the app normalizes it to SAMPLE_RATE
+CAPTURE_RATE = 48000
+
+SCREEN_LINES = [
+    "Given an array of integers nums and an integer target, return indices",
+    "of the two numbers such that they add up to target.",
+    "Example 1: Input: nums = [2,7,11,15], target = 9  Output: [0,1]",
+    "Constraints: 2 <= nums.length <= 10^4",
+    "def two_sum(nums, target):",
+    "    seen = {}",
+    "    for i, n in enumerate(nums):",
+]
+
+
+def synth_utterance(seconds: float, sample_rate: int = SAMPLE_RATE, seed: int = 0) -> np.ndarray:
+    """
+    Speech-like int16 audio: 0.5 s of room noise (for VAD calibration), then
+    syllable-rate amplitude-modulated harmonics with short pauses between words,
+    then 0.6 s of noise so the utterance ends.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 40 * rng.random()
+    voice = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+    syllables = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None)
+    words = (np.sin(2 * np.pi * 0.8 * t + rng.random()) > -0.9).astype(np.float64)
+    speech = 6000 * voice * syllables * words
+    lead = np.zeros(int(0.5 * sample_rate))
+    tail = np.zeros(int(0.6 * sample_rate))
+    samples = np.concatenate([lead, speech, tail])
+    samples += rng.normal(0, 60, samples.size)
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def write_wav(path: str, samples: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+
+
+def read_wav(path: str) -> Tuple[bytes, int, int]:
+    """Returns (mono pcm, sample_rate, sample_width); multi-channel files are reduced to the first channel."""
+    with wave.open(path, "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+    if channels > 1:
+        frames = np.frombuffer(pcm, dtype=np.uint8).reshape(-1, channels, width)
+        pcm = frames[:, 0, :].tobytes()
+    return pcm, rate, width
+
+
+def write_wav_fixtures(directory: str, count: int = 8, sample_rate: int = CAPTURE_RATE) -> List[str]:
+    """Writes count synthetic utterances of 1.5 to 5 seconds and returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        seconds = 1.5 + 3.5 * i / max(1, count - 1)
+        path = os.path.join(directory, f"utterance-{i:02d}.wav")
+        write_wav(path, synth_utterance(seconds, sample_rate, seed=i), sample_rate)
+        paths.append(path)
+    return paths
+
+
+def synth_screenshot(width: int = 1920, height: int = 1080, dark: bool = False, seed: int = 0) -> np.ndarray:
+    """A BGRA frame (height, width, 4) with an editor-like layout of real text lines."""
+    rng = np.random.default_rng(seed)
+    background, ink = ((30, 30, 30), (220, 220, 220)) if dark else ((255, 255, 255), (20, 20, 20))
+    image = Image.new("RGB", (width, height), background)
+    draw = ImageDraw.Draw(image)
+    y = 40
+    for column in (40, width // 2 + 40):
+        for line in SCREEN_LINES:
+            draw.text((column, y), line, fill=ink)
+            y += 22 + int(rng.integers(0, 8))
+        y = 40
+    rgb = np.asarray(image)
+    frame = np.empty((height, width, 4), dtype=np.uint8)
+    frame[:, :, 0] = rgb[:, :, 2]
+    frame[:, :, 1] = rgb[:, :, 1]
+    frame[:, :, 2] = rgb[:, :, 0]
+    frame[:, :, 3] = 255
+    return frame
+
+
+def load_screenshot(path: str) -> np.ndarray:
+    """Loads a PNG/JPEG screenshot as a BGRA frame, the layout mss captures in."""
+    rgb = np.asarray(Image.open(path).convert("RGB"))
+    frame = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+    frame[:, :, :3] = rgb[:, :, ::-1]
+    frame[:, :, 3] = 255
+    return frame
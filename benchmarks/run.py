@@ -0,0 +1,224 @@
+"""
+End-to-end latency benchmark.
+
+Replays WAV fixtures through the VAD and AudioTranscriber's recognition pool,
+screenshot fixtures through ScreenCapturer, and the resulting questions
+through LLMClient against a local fake Ollama server, then reports
+p50/p95/p99 per stage and compares them with a stored baseline.
+
+    python benchmarks/run.py                      # run and compare with baseline.json
+    python benchmarks/run.py --update-baseline    # run and store the results as the new baseline
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import speech_recognition as sr
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from audio import AudioTranscriber, MockBackend, PcmRingBuffer, PcmSegment, VoiceActivityDetector, create_backend
+from llm import LLMClient
+from vision import ScreenCapturer, find_text_blocks, preprocess
+from fake_ollama import FakeOllamaServer
+from fixtures import load_screenshot, read_wav, synth_screenshot, write_wav_fixtures
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+STAGES = ("capture", "segmentation", "asr", "first_token", "answer", "total")
+# p99 is reported but not checked: with a few dozen samples it is a single outlier
+CHECKED_PERCENTILES = ("p50", "p95")
+
+
+def percentiles(samples):
+    """Summarizes latencies in seconds as milliseconds."""
+    if not samples:
+        return {"n": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "n": len(samples),
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def compare(results, baseline, tolerance=0.5, slack_ms=5.0):
+    """
+    Returns a description of every stage percentile that got slower than the
+    baseline by more than tolerance (relative) plus slack_ms (absolute).
+    """
+    regressions = []
+    for stage, base in baseline.get("stages", {}).items():
+        current = results["stages"].get(stage, {})
+        for key in CHECKED_PERCENTILES:
+            if key not in base or key not in current:
+                continue
+            limit = base[key] * (1 + tolerance) + slack_ms
+            if current[key] > limit:
+                regressions.append(f"{stage} {key}: {current[key]:.1f} ms > {limit:.1f} ms "
+                                   f"(baseline {base[key]:.1f} ms)")
+    return regressions
+
+
+def wait_ready(llm, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while llm.status != "ready" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    if llm.status != "ready":
+        raise RuntimeError(f"LLM did not become ready: {llm.last_error}")
+
+
+def bench_capture(frames, samples):
+    """OCRs each frame with a cold cache; without Tesseract only preprocessing and block detection are timed."""
+    for frame in frames:
+        capturer = ScreenCapturer()
+        start = time.perf_counter()
+        if capturer.tesseract_available:
+            capturer.read_frame(frame)
+        else:
+            find_text_blocks(preprocess(frame))
+        samples["capture"].append(time.perf_counter() - start)
+
+
+def bench_pipeline(wav_paths, transcriber, llm, samples, chunk_frames=1024):
+    """
+    Replays each WAV in microphone-sized chunks. For every utterance the VAD
+    emits, times recognition, then streams an answer for its transcript.
+    Audio is replayed faster than real time, so total excludes the VAD's
+    hangover (the pause it waits for before closing an utterance).
+    Segmentation includes normalizing the audio to the recognizer's format.
+    """
+    for path in wav_paths:
+        pcm, rate, width = read_wav(path)
+        # Same path as the microphone loop: normalizer, ring buffer, VAD spans, zero-copy segments
+        normalizer = transcriber.normalizer(rate, width)
+        rate, width = normalizer.target_rate, 2
+        ring = PcmRingBuffer(int(transcriber.ring_seconds * rate) * width)
+        vad = VoiceActivityDetector(rate, output="range", **transcriber.vad_options)
+        chunk_bytes = chunk_frames * normalizer.sample_width
+        for offset in range(0, len(pcm) + chunk_bytes, chunk_bytes):
+            chunk_start = time.perf_counter()
+            if offset < len(pcm):
+                chunk = normalizer.process(pcm[offset:offset + chunk_bytes])
+                ring.write(chunk)
+                spans = vad.process(chunk)
+            else:
+                span = vad.flush()
+                spans = [span] if span else []
+            segmented = time.perf_counter()
+            samples["segmentation"].append(segmented - chunk_start)
+            for start, end in spans:
+                transcriber.audio_queue.put(PcmSegment(ring, start * width, end * width, rate, width).trim(vad.threshold))
+                texts = transcriber.get_transcript()
+                while not texts:
+                    time.sleep(0.0005)
+                    texts = transcriber.get_transcript()
+                recognized = time.perf_counter()
+                samples["asr"].append(recognized - segmented)
+
+                first_token = None
+                for _ in llm.stream_answer(" ".join(texts)):
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                answered = time.perf_counter()
+                samples["first_token"].append(first_token - recognized)
+                samples["answer"].append(answered - recognized)
+                samples["total"].append(answered - chunk_start)
+
+
+def run(args):
+    config = {
+        "token_rate": args.token_rate,
+        "first_token_delay": args.first_token_delay,
+        "asr": args.asr,
+        "asr_latency": args.asr_latency,
+    }
+    samples = {stage: [] for stage in STAGES}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_paths = sorted(glob.glob(os.path.join(args.wav_dir, "*.wav"))) if args.wav_dir \
+            else write_wav_fixtures(os.path.join(tmp, "wav"))
+        if args.screenshot_dir:
+            frames = [load_screenshot(p) for p in sorted(glob.glob(os.path.join(args.screenshot_dir, "*.png")))]
+        else:
+            frames = [synth_screenshot(), synth_screenshot(dark=True, seed=1), synth_screenshot(3840, 2160, seed=2)]
+        config["ocr"] = ScreenCapturer().tesseract_available
+
+        backend = MockBackend(latency=args.asr_latency) if args.asr == "mock" else create_backend(args.asr, sr.Recognizer())
+        transcriber = AudioTranscriber(mock_mode=True, backend=backend)
+
+        with FakeOllamaServer(token_rate=args.token_rate, first_token_delay=args.first_token_delay) as server:
+            llm = LLMClient(model="benchmark", host=server.url)
+            wait_ready(llm)
+            try:
+                for _ in range(args.repeat):
+                    bench_capture(frames, samples)
+                    bench_pipeline(wav_paths, transcriber, llm, samples)
+            finally:
+                llm.close()
+
+    return {"config": config, "stages": {stage: percentiles(samples[stage]) for stage in STAGES}}
+
+
+def print_results(results):
+    print(f"{'stage':<14}{'n':>6}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    for stage, summary in results["stages"].items():
+        if summary["n"]:
+            print(f"{stage:<14}{summary['n']:>6}{summary['p50']:>12.2f}{summary['p95']:>12.2f}{summary['p99']:>12.2f}")
+    if not results["config"]["ocr"]:
+        print("(Tesseract not installed: capture covers preprocessing and block detection only)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency benchmark for the transcription and answer pipeline.")
+    parser.add_argument("--wav-dir", help="Directory of recorded .wav fixtures (default: synthetic utterances)")
+    parser.add_argument("--screenshot-dir", help="Directory of .png screenshot fixtures (default: synthetic screens)")
+    parser.add_argument("--repeat", type=int, default=3, help="Times to replay all fixtures")
+    parser.add_argument("--token-rate", type=float, default=80.0, help="Fake Ollama tokens per second")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="Fake Ollama delay before the first token (s)")
+    parser.add_argument("--asr", default="mock", help="Recognizer backend: mock (simulated latency), google or vosk")
+    parser.add_argument("--asr-latency", type=float, default=0.02, help="Simulated latency of the mock recognizer (s)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative slowdown before failing")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="Allowed absolute slowdown before failing (ms)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != results["config"]:
+        print("Warning: baseline was recorded with a different configuration:", baseline.get("config"))
+    regressions = compare(results, baseline, args.tolerance, args.slack_ms)
+    for regression in regressions:
+        print("REGRESSION:", regression)
+    if regressions:
+        return 1
+    print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
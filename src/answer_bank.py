@@ -0,0 +1,284 @@
+"""
+Precomputed answers for common interview questions.
+
+An offline build step answers a question bank with LLMClient and writes a
+compact index; at runtime every new question is matched against it in well
+under a millisecond, so a known question gets an answer on screen at once.
+
+    python src/answer_bank.py build -o answer_bank/                 # default questions
+    python src/answer_bank.py build my_questions.txt -o answer_bank/
+    python src/answer_bank.py query answer_bank/ "whats the CAP theorem"
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from audio import MOCK_PHRASES
+from llm import AnswerCache, LLMClient
+from metrics import metrics
+from retrieval import VectorIndex
+
+# Asked in most technical interviews; the mock listener's phrases come first
+DEFAULT_QUESTIONS = MOCK_PHRASES + [
+    "What is the difference between TCP and UDP?",
+    "What happens when you type a URL into the browser?",
+    "Explain the SOLID principles.",
+    "What is the difference between SQL and NoSQL databases?",
+    "What is a database index and how does it work?",
+    "Explain ACID transactions.",
+    "What is the difference between a list and a tuple in Python?",
+    "What is the Global Interpreter Lock in Python?",
+    "Explain Big O notation.",
+    "How does a hash map work?",
+    "What is the difference between a stack and a queue?",
+    "How would you design a URL shortener?",
+    "What is the difference between horizontal and vertical scaling?",
+    "Explain how garbage collection works.",
+    "What are microservices and when would you use them?",
+    "What is a deadlock and how do you prevent it?",
+    "Explain the difference between authentication and authorization.",
+    "What is caching and what are common cache eviction policies?",
+    "Tell me about yourself.",
+    "Describe a challenging project you worked on.",
+]
+
+# Mersenne prime for the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+
+def permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The (a, b) coefficients of num_perm hash permutations x -> (a * x + b) mod p.
+    a * x deliberately wraps around in uint64; that only mixes the bits further.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingles(text: str, ngram: int = 3) -> set:
+    """Character n-grams of the normalized text (lowercase, no punctuation, single spaces)."""
+    normalized = f" {AnswerCache.normalize(text)} "
+    return {normalized[i:i + ngram] for i in range(len(normalized) - ngram + 1)}
+
+
+def minhash(text: str, coefficients: Tuple[np.ndarray, np.ndarray], ngram: int = 3) -> np.ndarray:
+    """MinHash signature of text's n-grams: for each permutation, the smallest permuted n-gram hash."""
+    a, b = coefficients
+    grams = shingles(text, ngram)
+    if not grams:
+        return np.full(len(a), _PRIME, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+    return ((np.outer(a, hashes) + b[:, None]) % _PRIME).min(axis=1)
+
+
+class BankMatch:
+    """A bank entry matching a question, with the estimated similarity (0 to 1)."""
+
+    def __init__(self, question: str, answer: str, score: float):
+        self.question = question
+        self.answer = answer
+        self.score = score
+
+    def __repr__(self):
+        return f"BankMatch({self.question!r}, score={self.score:.2f})"
+
+
+class AnswerBank:
+    """
+    MinHash index over character n-grams of the bank's questions.
+    On disk it is a directory with meta.json, signatures.npy (one row of
+    num_perm uint64 MinHash values per question), offsets.npy and
+    strings.bin (questions and answers as UTF-8, question i between
+    offsets[2i] and offsets[2i + 1], its answer up to offsets[2i + 2]).
+    The arrays are memory-mapped, so loading is instant and several
+    processes share the pages. A lookup hashes the question's n-grams
+    once and compares its signature with every row in one NumPy pass;
+    the fraction of equal values estimates the n-gram Jaccard similarity.
+    """
+
+    def __init__(self, signatures, offsets, strings, ngram: int = 3, num_perm: int = 128, seed: int = 1,
+                 threshold: float = 0.6):
+        self.signatures = signatures
+        self.offsets = offsets
+        self.strings = strings
+        self.ngram = ngram
+        self.num_perm = num_perm
+        self.seed = seed
+        # Matches scoring below this are ignored
+        self.threshold = threshold
+        self._coefficients = permutations(num_perm, seed)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        return minhash(text, self._coefficients, self.ngram)
+
+    def question(self, index: int) -> str:
+        return self._string(2 * index)
+
+    def answer(self, index: int) -> str:
+        return self._string(2 * index + 1)
+
+    def _string(self, k: int) -> str:
+        return bytes(self.strings[self.offsets[k]:self.offsets[k + 1]]).decode("utf-8")
+
+    def lookup(self, question: str, threshold: Optional[float] = None) -> Optional[BankMatch]:
+        """Returns the best matching entry scoring at least threshold (default: the bank's), or None."""
+        if not len(self):
+            return None
+        threshold = self.threshold if threshold is None else threshold
+        with metrics.span("answer_bank_lookup"):
+            scores = (self.signatures == self.signature(question)).mean(axis=1)
+            best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            metrics.incr("answer_bank_misses")
+            return None
+        metrics.incr("answer_bank_hits")
+        return BankMatch(self.question(best), self.answer(best), float(scores[best]))
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.6) -> "AnswerBank":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        signatures = np.load(os.path.join(path, "signatures.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        strings_path = os.path.join(path, "strings.bin")
+        # np.memmap refuses empty files
+        strings = np.memmap(strings_path, dtype=np.uint8, mode="r") if os.path.getsize(strings_path) else b""
+        return cls(signatures, offsets, strings, ngram=meta["ngram"], num_perm=meta["num_perm"], seed=meta["seed"],
+                   threshold=threshold)
+
+    @classmethod
+    def write(cls, path: str, entries: Iterable[Tuple[str, str]], ngram: int = 3, num_perm: int = 128, seed: int = 1,
+              model: Optional[str] = None, knowledge: Optional[str] = None) -> "AnswerBank":
+        """
+        Writes (question, answer) pairs as a bank at path and returns it loaded.
+        knowledge is the fingerprint of the notes index the answers were grounded in.
+        """
+        entries = list(entries)
+        os.makedirs(path, exist_ok=True)
+        coefficients = permutations(num_perm, seed)
+        signatures = np.empty((len(entries), num_perm), dtype=np.uint64)
+        offsets = [0]
+        # Everything is written to temporary files and renamed into place, so a running
+        # app that has the old bank memory-mapped keeps reading consistent (old) files
+        with open(os.path.join(path, "strings.bin.tmp"), "wb") as f:
+            for i, (question, answer) in enumerate(entries):
+                signatures[i] = minhash(question, coefficients, ngram)
+                for text in (question, answer):
+                    data = text.encode("utf-8")
+                    f.write(data)
+                    offsets.append(offsets[-1] + len(data))
+        with open(os.path.join(path, "signatures.npy.tmp"), "wb") as f:
+            np.save(f, signatures)
+        with open(os.path.join(path, "offsets.npy.tmp"), "wb") as f:
+            np.save(f, np.asarray(offsets, dtype=np.int64))
+        with open(os.path.join(path, "meta.json.tmp"), "w") as f:
+            json.dump({"ngram": ngram, "num_perm": num_perm, "seed": seed, "count": len(entries), "model": model,
+                       "knowledge": knowledge, "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+        for name in ("strings.bin", "signatures.npy", "offsets.npy", "meta.json"):
+            os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+        return cls.load(path)
+
+
+def build(questions: List[str], llm: LLMClient, path: str, reuse: bool = True,
+          retriever: Optional[VectorIndex] = None) -> AnswerBank:
+    """
+    Answers every question with llm and writes the bank to path. With a
+    retriever (the personal notes index), llm answers from the candidate's
+    notes, so "Tell me about yourself" is not answered generically. With
+    reuse, answers already in an existing bank at path (same question text,
+    built from the same notes) are kept instead of being generated again.
+    Raises if llm fails on any question, leaving an existing bank untouched.
+    """
+    if retriever is not None:
+        llm.retriever = retriever
+    knowledge = llm.retriever.fingerprint() if llm.retriever is not None else None
+    existing = {}
+    meta_path = os.path.join(path, "meta.json")
+    if reuse and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            built_from = json.load(f).get("knowledge")
+        if built_from == knowledge:
+            old = AnswerBank.load(path)
+            existing = {AnswerCache.normalize(old.question(i)): old.answer(i) for i in range(len(old))}
+    entries = []
+    for i, question in enumerate(questions, 1):
+        answer = existing.get(AnswerCache.normalize(question))
+        if answer is None:
+            # Raises rather than returning a mock answer or error text that would be kept in the bank
+            answer = llm.get_answer(question, fallback=False)
+        entries.append((question, answer))
+        print(f"[{i}/{len(questions)}] {question}")
+    return AnswerBank.write(path, entries, model=llm.model, knowledge=knowledge)
+
+
+def read_questions(path: Optional[str]) -> List[str]:
+    """One question per line; blank lines and lines starting with # are skipped. Defaults to DEFAULT_QUESTIONS."""
+    if not path:
+        return list(DEFAULT_QUESTIONS)
+    with open(path) as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the precomputed answer bank.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Answer a question bank with Ollama and write the index")
+    build_parser.add_argument("questions", nargs="?", help="Text file with one question per line (default: built-in)")
+    build_parser.add_argument("-o", "--output", default=os.getenv("ANSWER_BANK_PATH", "answer_bank"),
+                              help="Bank directory (default: ANSWER_BANK_PATH or answer_bank)")
+    build_parser.add_argument("--model", help="Ollama model (default: OLLAMA_MODEL or llama3.2)")
+    build_parser.add_argument("--host", help="Ollama host (default: OLLAMA_HOST or http://localhost:11434)")
+    build_parser.add_argument("--regenerate", action="store_true", help="Regenerate answers already in the bank")
+    build_parser.add_argument("--knowledge", default=os.getenv("KNOWLEDGE_INDEX_PATH", "knowledge"),
+                              help="Personal notes index to ground answers in, if it exists "
+                                   "(default: KNOWLEDGE_INDEX_PATH or knowledge)")
+    query_parser = commands.add_parser("query", help="Look a question up in a bank")
+    query_parser.add_argument("bank", help="Bank directory")
+    query_parser.add_argument("question")
+    query_parser.add_argument("--threshold", type=float, default=0.0, help="Minimum score to report")
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        bank = AnswerBank.load(args.bank)
+        start = time.perf_counter()
+        match = bank.lookup(args.question, threshold=args.threshold)
+        elapsed = (time.perf_counter() - start) * 1000
+        if match is None:
+            print(f"No match ({elapsed:.3f} ms)")
+            return 1
+        print(f"{match.score:.2f} {match.question} ({elapsed:.3f} ms)\n\n{match.answer}")
+        return 0
+
+    llm = LLMClient(model=args.model, host=args.host, retrieval_k=int(os.getenv("RETRIEVAL_K", "3")))
+    try:
+        if not llm.connection.wait_checked():
+            print(f"Cannot reach Ollama at {llm.host}: {llm.last_error}", file=sys.stderr)
+            return 1
+        try:
+            retriever = VectorIndex(args.knowledge) \
+                if os.path.exists(os.path.join(args.knowledge, "manifest.json")) else None
+            bank = build(read_questions(args.questions), llm, args.output, reuse=not args.regenerate,
+                         retriever=retriever)
+        except Exception as e:
+            print(f"Could not build the answer bank: {e}", file=sys.stderr)
+            return 1
+    finally:
+        llm.close()
+    print(f"Wrote {len(bank)} answers to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
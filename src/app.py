@@ -2,9 +2,18 @@ import streamlit as st
 import threading
 import time
 import os
+import uuid
+from answer_bank import AnswerBank
 from audio import AudioTranscriber
-from llm import LLMClient
+from events import UpdateNotifier
+from history import TranscriptHistory
+from llm import AnswerCache, ConversationContext, LLMClient, OllamaConnection
+from metrics import metrics, serve as serve_metrics
+from questions import QuestionDetector
+from retrieval import VectorIndex
+from scheduler import InferenceScheduler
 from vision import ScreenCapturer
+from worker import AnswerWorker
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -12,21 +21,102 @@ load_dotenv()
 
 st.set_page_config(page_title="Parakeet-like Interview Copilot", layout="wide")
 
+# Set METRICS_PORT to expose /metrics (Prometheus) and /metrics.json for dashboards
+if os.getenv("METRICS_PORT") and metrics.enabled:
+    serve_metrics(int(os.getenv("METRICS_PORT")))
+
+# Process-wide resources, created once and shared by every browser session.
+# Heavy libraries (ollama, pytesseract, ...) are imported lazily on first use.
+@st.cache_resource(show_spinner=False)
+def shared_answer_cache(path):
+    return AnswerCache(path=path)
+
+def configured_ollama_settings():
+    """(model, host, draft model) from the environment."""
+    return (os.getenv("OLLAMA_MODEL", "llama3.2"), os.getenv("OLLAMA_HOST", "http://localhost:11434"),
+            os.getenv("OLLAMA_DRAFT_MODEL") or None)
+
+@st.cache_resource(show_spinner=False)
+def shared_ollama_connection():
+    # Only the configured settings are shared: settings typed into the sidebar get a connection of their
+    # own (see "Update LLM Settings"), so mistyped hosts never pile up here.
+    # Connects and loads the model(s) in the background, so this never waits on the network
+    model, host, draft_model = configured_ollama_settings()
+    return OllamaConnection(model=model, host=host, draft_model=draft_model)
+
+@st.cache_resource(show_spinner=False)
+def shared_scheduler():
+    # All sessions' generations go through one queue; OLLAMA_MAX_CONCURRENT of them run at a time
+    return InferenceScheduler(max_concurrent=int(os.getenv("OLLAMA_MAX_CONCURRENT", "2")))
+
+@st.cache_resource(show_spinner=False)
+def shared_answer_bank(path, threshold):
+    # Built offline with `python src/answer_bank.py build`; memory-mapped, so cheap to share
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    return AnswerBank.load(path, threshold=threshold)
+
+@st.cache_resource(show_spinner=False)
+def shared_knowledge_index(path):
+    # Built with `python src/retrieval.py ingest`; later ingests are picked up without a restart
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    return VectorIndex(path)
+
 # Initialize Session State
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'notifier' not in st.session_state:
+    st.session_state.notifier = UpdateNotifier()
 if 'transcriber' not in st.session_state:
-    st.session_state.transcriber = AudioTranscriber(mock_mode=False) # Will auto-fallback
+    st.session_state.transcriber = AudioTranscriber(mock_mode=False, notifier=st.session_state.notifier) # Will auto-fallback
+if 'answer_cache' not in st.session_state:
+    # Set ANSWER_CACHE_PATH to keep answers across restarts
+    st.session_state.answer_cache = shared_answer_cache(os.getenv("ANSWER_CACHE_PATH"))
+if 'conversation' not in st.session_state:
+    # Earlier questions and answers are sent with each new question, within this token budget
+    st.session_state.conversation = ConversationContext(max_tokens=int(os.getenv("CONTEXT_TOKENS", "1500")))
 if 'llm' not in st.session_state:
-    model = os.getenv("OLLAMA_MODEL", "llama3.2")
-    host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-    st.session_state.llm = LLMClient(model=model, host=host)
+    # With OLLAMA_DRAFT_MODEL set, its quick answer is shown until the main model's is ready,
+    # unless the main model has recently started answering within LATENCY_BUDGET seconds.
+    # The RETRIEVAL_K most relevant chunks of your own documents are sent with each question.
+    st.session_state.llm = LLMClient(cache=st.session_state.answer_cache, context=st.session_state.conversation,
+                                     connection=shared_ollama_connection(),
+                                     latency_budget=float(os.getenv("LATENCY_BUDGET", "1.0")),
+                                     retriever=shared_knowledge_index(os.getenv("KNOWLEDGE_INDEX_PATH", "knowledge")),
+                                     retrieval_k=int(os.getenv("RETRIEVAL_K", "3")))
 if 'vision' not in st.session_state:
-    st.session_state.vision = ScreenCapturer()
+    st.session_state.vision = ScreenCapturer(notifier=st.session_state.notifier)
+if 'answer_worker' not in st.session_state:
+    # Known questions are answered from the precomputed bank at once (None if it has not been built)
+    answer_bank = shared_answer_bank(os.getenv("ANSWER_BANK_PATH", "answer_bank"),
+                                     float(os.getenv("ANSWER_BANK_MATCH", "0.6")))
+    # Drafts answers from partial transcripts while the interviewer is still talking
+    st.session_state.answer_worker = AnswerWorker(st.session_state.llm, notifier=st.session_state.notifier,
+                                                  scheduler=shared_scheduler(),
+                                                  session_id=st.session_state.session_id,
+                                                  speculative=os.getenv("SPECULATIVE_ANSWERS", "1") != "0",
+                                                  match_ratio=float(os.getenv("SPECULATION_MATCH", "0.8")),
+                                                  bank=answer_bank,
+                                                  refine_bank_answers=os.getenv("ANSWER_BANK_REFINE", "1") != "0")
+if 'question_detector' not in st.session_state:
+    st.session_state.question_detector = QuestionDetector()
 if 'transcript_history' not in st.session_state:
-    st.session_state.transcript_history = []
+    # Every session is logged to SESSION_LOG_DIR; only recent entries stay in memory
+    log_dir = os.getenv("SESSION_LOG_DIR", "sessions")
+    # The session id keeps sessions started in the same second out of each other's logs
+    log_path = os.path.join(log_dir, time.strftime("session-%Y%m%d-%H%M%S-") + f"{st.session_state.session_id}.jsonl")
+    st.session_state.transcript_history = TranscriptHistory(max_entries=200, log_path=log_path)
 if 'latest_answer' not in st.session_state:
     st.session_state.latest_answer = ""
 if 'listening' not in st.session_state:
     st.session_state.listening = False
+if 'stream_answers' not in st.session_state:
+    st.session_state.stream_answers = True
+if 'watch_screen' not in st.session_state:
+    st.session_state.watch_screen = False
+if 'watch_interval' not in st.session_state:
+    st.session_state.watch_interval = 1.0
 
 def toggle_listening():
     if st.session_state.listening:
@@ -36,12 +126,138 @@ def toggle_listening():
         st.session_state.transcriber.start_listening()
         st.session_state.listening = True
 
+# Number of transcript entries drawn in the live panel
+VISIBLE_ENTRIES = 50
+
+def format_entry(entry):
+    if entry["source"] == "screen":
+        label = "Screen Watch" if entry.get("watched") else "Screen Capture"
+        return f"**[{label}]**: {entry['text']}"
+    marker = "❓" if entry.get("is_question") else "💬"
+    return f"**[Audio]** {marker} `{entry.get('confidence', 0):.2f}`: {entry['text']}"
+
+def render_transcript(placeholder):
+    """Redraws the newest history entries, replacing what the placeholder showed before."""
+    with placeholder.container():
+        for entry in st.session_state.transcript_history.tail(VISIBLE_ENTRIES):
+            st.markdown(format_entry(entry))
+
+def collect_transcripts():
+    """Moves newly finished transcripts into the history and returns the new entries."""
+    new_text = st.session_state.transcriber.get_transcript()
+    # Fragments split by a pause are merged; held ones are released once their window passes
+    segments = st.session_state.question_detector.flush()
+    for text in new_text:
+        segments.extend(st.session_state.question_detector.feed(text))
+    entries = [
+        st.session_state.transcript_history.append(
+            segment.text, source="audio", confidence=round(segment.confidence, 2), is_question=segment.is_question)
+        for segment in segments
+    ]
+    questions = [segment for segment in segments if segment.is_question]
+    if questions:
+        # Only the latest question gets an answer; the worker drops any older generation
+        st.session_state.answer_worker.submit(questions[-1].text)
+    return entries
+
+def speculate_answer():
+    """Starts a draft answer if what the interviewer has said so far already reads like a question."""
+    partial = st.session_state.transcriber.get_partial()
+    if partial:
+        st.session_state.answer_worker.speculate(partial)
+
+def render_listening_status(placeholder):
+    partial = st.session_state.transcriber.get_partial()
+    if partial:
+        placeholder.markdown(f"🔴 *Listening...*  \n🗣️ {partial}...")
+    else:
+        placeholder.markdown("🔴 *Listening...*")
+
+def answer_queued(job):
+    """True while the job waits for a free slot in the shared scheduler."""
+    return job is not None and job.ticket is not None and not job.ticket.started and not job.done
+
+def render_answer(placeholder, status_placeholder):
+    """Draws the current answer. Returns True while an answer is still being generated."""
+    job = st.session_state.answer_worker.poll()
+    # Snapshot once so a job finishing mid-render still gets a final redraw
+    answer_pending = job is not None and not job.done
+    if job is not None and not answer_pending:
+        st.session_state.latest_answer = job.text
+    shown_early = job is not None and (job.bank_match is not None or job.route == "draft")
+    if answer_pending and (st.session_state.stream_answers or shown_early) and job.text:
+        placeholder.info(job.text)
+    elif st.session_state.latest_answer:
+        placeholder.info(st.session_state.latest_answer)
+    else:
+        placeholder.write("Waiting for questions...")
+    if answer_pending and answer_queued(job):
+        position = job.ticket.position()
+        wait = job.ticket.expected_wait()
+        status_placeholder.caption(f"⏳ *Queued behind {position or 0} other answer(s), about {wait:.0f}s...*")
+    elif answer_pending and job.bank_match is not None:
+        status_placeholder.caption(f"📚 *From the answer bank ({job.bank_match.score:.0%} match); "
+                                   "generating a fresh answer...*")
+    elif answer_pending and job.route == "draft":
+        llm = st.session_state.llm
+        status_placeholder.caption(f"⚡ *Quick answer from {llm.draft_model}; {llm.model} is writing a fuller one...*")
+    elif answer_pending and job.speculative:
+        status_placeholder.caption("✍️ *Drafting an answer from what has been said so far...*")
+    elif answer_pending:
+        status_placeholder.caption("⏳ *Generating answer...*")
+    else:
+        status_placeholder.empty()
+    return answer_pending
+
+def render_metrics(placeholder):
+    """Draws per-stage latencies, queue depth and cache hit rate in the sidebar panel."""
+    snapshot = metrics.snapshot()
+    lines = ["| Stage | n | p50 ms | p95 ms |", "|---|---:|---:|---:|"]
+    for name, stage in sorted(snapshot["stages"].items()):
+        lines.append(f"| {name} | {stage['count']} | {stage['p50_ms']:.1f} | {stage['p95_ms']:.1f} |")
+    gauges = snapshot["gauges"]
+    counters = snapshot["counters"]
+    lookups = counters.get("answer_cache_hits", 0) + counters.get("answer_cache_misses", 0)
+    details = [
+        f"ASR queue: {gauges.get('asr_queue_depth', 0)}",
+        f"LLM queue: {gauges.get('scheduler_queue_depth', 0)}",
+        f"Tokens/s: {gauges.get('llm_tokens_per_second', 0)}",
+        f"Cache hit rate: {counters.get('answer_cache_hits', 0) / lookups if lookups else 0:.0%}",
+    ]
+    drafts = counters.get("speculation_started", 0)
+    if drafts:
+        details.append(f"Drafts kept: {counters.get('speculation_adopted', 0)}/{drafts} "
+                       f"({counters.get('speculation_wasted_chunks', 0)} tokens wasted)")
+    quick = counters.get("two_tier_drafts", 0)
+    if quick:
+        details.append(f"Quick drafts: {quick}")
+    with placeholder.container():
+        if snapshot["stages"]:
+            st.markdown("\n".join(lines))
+        else:
+            st.caption("No timings recorded yet.")
+        st.caption(" · ".join(details))
+
+def collect_screen_problems():
+    """Moves problems found by the screen watcher into the history and returns the new entries."""
+    texts = st.session_state.vision.get_watch_results()
+    entries = [st.session_state.transcript_history.append(text, source="screen", watched=True) for text in texts]
+    if texts:
+        st.session_state.answer_worker.submit(texts[-1], source="screen")
+    return entries
+
+def toggle_watching():
+    if st.session_state.watch_screen:
+        if not st.session_state.vision.start_watching(interval=st.session_state.watch_interval):
+            st.session_state.watch_screen = False
+    else:
+        st.session_state.vision.stop_watching()
+
 def capture_screen_action():
     text = st.session_state.vision.capture_and_read()
     if text:
-        st.session_state.transcript_history.append(f"**[Screen Capture]**: {text}")
-        answer = st.session_state.llm.get_answer(text)
-        st.session_state.latest_answer = answer
+        st.session_state.transcript_history.append(text, source="screen")
+        st.session_state.answer_worker.submit(text, source="screen")
 
 # Sidebar
 with st.sidebar:
@@ -50,13 +266,27 @@ with st.sidebar:
     st.subheader("Ollama Configuration")
     model_input = st.text_input("Model Name", value=os.getenv("OLLAMA_MODEL", "llama3.2"))
     host_input = st.text_input("Ollama Host", value=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+    draft_model_input = st.text_input("Draft Model", value=os.getenv("OLLAMA_DRAFT_MODEL", ""),
+                                      help="Small, fast model whose answer is shown until the main model's is ready. "
+                                           "Leave empty to use the main model only.")
     
     if st.button("Update LLM Settings"):
-        st.session_state.llm = LLMClient(model=model_input, host=host_input)
-        if st.session_state.llm._connected:
-            st.success("Connected to Ollama!")
-        else:
-            st.warning("Could not connect to Ollama. Running in Mock Mode.")
+        settings = (model_input, host_input, draft_model_input.strip() or None)
+        previous = st.session_state.llm
+        # Other settings get a connection of this session's own (the client creates it when given none);
+        # it connects and loads the model in the background, and the status below follows it
+        connection = shared_ollama_connection() if settings == configured_ollama_settings() else None
+        st.session_state.llm = LLMClient(model=settings[0], host=settings[1], draft_model=settings[2],
+                                         cache=st.session_state.answer_cache, context=st.session_state.conversation,
+                                         connection=connection, latency_budget=previous.latency_budget,
+                                         retriever=previous.retriever, retrieval_k=previous.retrieval_k)
+        st.session_state.answer_worker.llm = st.session_state.llm
+        # Stops the replaced connection's health checks if it was this session's own; the shared one stays open
+        previous.close()
+
+    st.toggle("Stream answers", key="stream_answers", help="Show the answer token by token as the model generates it.")
+    st.slider("Screen watch interval (s)", min_value=0.5, max_value=5.0, step=0.5, key="watch_interval",
+              help="How often the screen watcher samples the screen. Applies when watching starts.")
 
     st.divider()
 
@@ -66,10 +296,35 @@ with st.sidebar:
     else:
         st.success("Audio: Real Mode")
 
-    if st.session_state.llm._connected:
+    llm_status = st.session_state.llm.status
+    if llm_status == "ready":
         st.success(f"LLM: Connected ({st.session_state.llm.model})")
+    elif llm_status == "loading model":
+        st.info(f"LLM: Loading {st.session_state.llm.model}...")
+    elif llm_status == "connecting":
+        st.info("LLM: Connecting to Ollama...")
     else:
-        st.warning("LLM: Mock Mode (Ollama not running)")
+        st.warning("LLM: Mock Mode (Ollama not running, retrying in the background)")
+
+    conversation = st.session_state.conversation
+    st.caption(f"Conversation context: {len(conversation)} recent turns"
+               + (", older turns summarized" if conversation.summary else ""))
+    if st.button("Clear conversation context"):
+        conversation.clear()
+
+    cache_stats = st.session_state.answer_cache.stats()
+    st.caption(f"Answer cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+               f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['size']} entries)")
+
+    metrics_placeholder = None
+    if metrics.enabled:
+        with st.expander("Performance"):
+            metrics_placeholder = st.empty()
+            render_metrics(metrics_placeholder)
+            export_col1, export_col2 = st.columns(2)
+            export_col1.download_button("JSON", metrics.to_json(), file_name="metrics.json", mime="application/json")
+            export_col2.download_button("Prometheus", metrics.to_prometheus(), file_name="metrics.prom",
+                                        mime="text/plain")
 
 # Main Layout
 st.title("🦜 AI Interview Copilot")
@@ -92,34 +347,79 @@ with col1:
             capture_screen_action()
             st.rerun()
 
+    st.toggle("Watch screen for coding questions", key="watch_screen", on_change=toggle_watching,
+              help="Samples the screen in the background and answers new problem statements automatically.")
+    if st.session_state.vision.watch_error:
+        st.caption(f"⚠️ {st.session_state.vision.watch_error}")
+
+    # Taken before reading any data so nothing published during this run is missed
+    seen_version = st.session_state.notifier.version
+    listening_status = st.empty()
     if st.session_state.listening:
-        st.write("🔴 *Listening...*")
-
-        # Poll for new transcripts
-        new_text = st.session_state.transcriber.get_transcript()
-        if new_text:
-            for text in new_text:
-                st.session_state.transcript_history.append(f"**[Audio]**: {text}")
-                # Generate answer for the latest question automatically?
-                # Or wait for user trigger? Let's do auto for the latest one.
-                answer = st.session_state.llm.get_answer(text)
-                st.session_state.latest_answer = answer
-            st.rerun()
+        collect_transcripts()
+        speculate_answer()
+        render_listening_status(listening_status)
+    collect_screen_problems()
 
-    # Display History
-    chat_container = st.container(height=400)
-    with chat_container:
-        for line in st.session_state.transcript_history:
-            st.markdown(line)
+    # Display History (only the newest entries; older ones are in the session log)
+    with st.container(height=400):
+        transcript_placeholder = st.empty()
+    render_transcript(transcript_placeholder)
+
+    with st.expander("Session History"):
+        log_dir = os.path.dirname(st.session_state.transcript_history.log_path)
+        current_log = os.path.basename(st.session_state.transcript_history.log_path)
+        # Other sessions' logs may be other users' interviews; they are listed only when explicitly shared
+        suffix = ".jsonl" if os.getenv("SESSION_HISTORY_SHARED", "0") == "1" else f"-{st.session_state.session_id}.jsonl"
+        logs = sorted((name for name in os.listdir(log_dir) if name.endswith(suffix)), reverse=True)
+        chosen_log = st.selectbox("Session", logs, index=logs.index(current_log) if current_log in logs else 0)
+        if chosen_log == current_log:
+            browsed = st.session_state.transcript_history
+        else:
+            browsed = TranscriptHistory.load(os.path.join(log_dir, chosen_log))
+        query = st.text_input("Search transcript")
+        if query:
+            results = browsed.search(query)
+        else:
+            page = st.number_input("Page (0 = newest)", min_value=0, max_value=browsed.page_count() - 1, value=0)
+            results = browsed.page(page)
+        for entry in results:
+            st.markdown(format_entry(entry))
+        if browsed is not st.session_state.transcript_history:
+            browsed.close()
 
 with col2:
     st.header("AI Suggested Answer")
-    if st.session_state.latest_answer:
-        st.info(st.session_state.latest_answer)
-    else:
-        st.write("Waiting for questions...")
+    answer_placeholder = st.empty()
+    answer_status = st.empty()
+    answer_pending = render_answer(answer_placeholder, answer_status)
 
-# Auto-refresh loop for polling (Streamlit specific hack or using st.empty)
-if st.session_state.listening:
-    time.sleep(1)
-    st.rerun()
+# Event-driven refresh: sleep until the transcriber, screen watcher or answer worker publishes new data,
+# then redraw only the transcript and answer areas (and the performance panel, at most once a
+# second). The short wait timeout releases held
+# question fragments, and reading session state each pass lets Streamlit interrupt the
+# loop as soon as a widget is used.
+metrics_drawn_at = time.monotonic()
+while st.session_state.listening or st.session_state.vision.watching or answer_pending:
+    version = st.session_state.notifier.wait(seen_version, timeout=0.25)
+    # A queued answer is redrawn every pass so its position stays current
+    if version == seen_version and not st.session_state.question_detector.has_pending \
+            and not answer_queued(st.session_state.answer_worker.poll()):
+        continue
+    seen_version = version
+    with metrics.span("ui_refresh"):
+        new_entries = []
+        if st.session_state.listening:
+            new_entries = collect_transcripts()
+            speculate_answer()
+            render_listening_status(listening_status)
+        new_entries += collect_screen_problems()
+        # The panel is redrawn in place, so it never grows past VISIBLE_ENTRIES elements
+        if new_entries:
+            render_transcript(transcript_placeholder)
+        answer_pending = render_answer(answer_placeholder, answer_status)
+        if metrics_placeholder is not None and time.monotonic() - metrics_drawn_at >= 1.0:
+            render_metrics(metrics_placeholder)
+            metrics_drawn_at = time.monotonic()
+    # Let a burst of tokens accumulate into one redraw
+    time.sleep(0.05)
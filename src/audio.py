@@ -1,16 +1,542 @@
 import os
+import json
 import time
-import speech_recognition as sr
-from threading import Thread, Event
-from queue import Queue
+import numpy as np
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Thread, Event, Lock
+from queue import Queue, Empty, Full
+from typing import Optional, Tuple
+from lazy import lazy_import
+from metrics import metrics
+
+sr = lazy_import("speech_recognition")
+
+
+# Questions the mock listener "hears"; also part of the default answer bank
+MOCK_PHRASES = [
+    "Can you explain the difference between a process and a thread?",
+    "What is a REST API?",
+    "How do you handle dependency injection in Python?",
+    "Describe the CAP theorem.",
+    "Write a function to reverse a linked list."
+]
+
+
+class RecognizerBackend:
+    """
+    Base class for speech recognition backends.
+    Every backend recognizes complete segments. Backends with
+    supports_partials = True can also recognize a live stream of PCM
+    frames, reporting partial hypotheses while the speaker is talking.
+    """
+    name = "base"
+    supports_partials = False
+
+    def recognize(self, audio) -> Optional[str]:
+        """Returns the transcript of a complete sr.AudioData segment, or None if nothing was understood."""
+        raise NotImplementedError
+
+    def create_stream(self, sample_rate: int, sample_width: int) -> "RecognitionStream":
+        """Starts incremental recognition of 16-bit mono PCM frames."""
+        raise NotImplementedError(f"{self.name} backend does not support streaming recognition")
+
+
+class RecognitionStream:
+    """Incremental recognition session returned by RecognizerBackend.create_stream."""
+
+    def accept(self, pcm: bytes) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Feeds raw PCM frames. Returns (partial, final): partial is the current
+        hypothesis for the utterance in progress, final is set once the backend
+        has detected the end of an utterance.
+        """
+        raise NotImplementedError
+
+    def finish(self) -> Optional[str]:
+        """Flushes the utterance in progress and returns its final hypothesis."""
+        raise NotImplementedError
+
+
+class GoogleBackend(RecognizerBackend):
+    """Google Web Speech API via SpeechRecognition. Needs network access."""
+    name = "google"
+
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+
+    def recognize(self, audio):
+        try:
+            # Doesn't require an API key (limited use)
+            return self.recognizer.recognize_google(audio)
+        except sr.UnknownValueError:
+            return None # Could not understand audio
+        except sr.RequestError as e:
+            return f"[Error: {e}]"
+
+
+class MockBackend(RecognizerBackend):
+    """Offline stand-in that returns a placeholder transcript for each segment."""
+    name = "mock"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def recognize(self, audio):
+        if isinstance(audio, tuple) and audio[0] == "text":
+            return audio[1]
+        if self.latency:
+            time.sleep(self.latency)
+        duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        return f"[Mock transcript of {duration:.1f}s of audio]"
+
+
+class VoskStream(RecognitionStream):
+    def __init__(self, recognizer):
+        self._recognizer = recognizer
+
+    def accept(self, pcm):
+        if self._recognizer.AcceptWaveform(pcm):
+            return None, json.loads(self._recognizer.Result()).get("text") or None
+        return json.loads(self._recognizer.PartialResult()).get("partial") or None, None
+
+    def finish(self):
+        return json.loads(self._recognizer.FinalResult()).get("text") or None
+
+
+class VoskBackend(RecognizerBackend):
+    """
+    Local, offline recognition with Vosk (pip install vosk). Streams partial
+    hypotheses and detects the end of utterances itself.
+    Uses the model at VOSK_MODEL_PATH, or downloads the small English model.
+    """
+    name = "vosk"
+    supports_partials = True
+    SAMPLE_RATE = 16000
+
+    def __init__(self, model_path: Optional[str] = None):
+        import vosk
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        model_path = model_path or os.getenv("VOSK_MODEL_PATH")
+        self.model = vosk.Model(model_path) if model_path else vosk.Model(lang="en-us")
+
+    def recognize(self, audio):
+        recognizer = self._vosk.KaldiRecognizer(self.model, self.SAMPLE_RATE)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=self.SAMPLE_RATE, convert_width=2))
+        return json.loads(recognizer.FinalResult()).get("text") or None
+
+    def create_stream(self, sample_rate, sample_width):
+        if sample_width != 2:
+            raise ValueError("Vosk expects 16-bit PCM")
+        return VoskStream(self._vosk.KaldiRecognizer(self.model, sample_rate))
+
+
+def create_backend(name: Optional[str], recognizer) -> RecognizerBackend:
+    """
+    Builds the recognition backend called name ("google", "vosk" or "mock").
+    Defaults to the ASR_BACKEND environment variable, then "google".
+    Falls back to Google if the offline backend cannot be loaded.
+    """
+    name = (name or os.getenv("ASR_BACKEND", "google")).lower()
+    if name == "vosk":
+        try:
+            return VoskBackend()
+        except Exception as e:
+            print(f"Vosk backend not available ({e}). Falling back to Google recognition.")
+            return GoogleBackend(recognizer)
+    if name == "mock":
+        return MockBackend()
+    if name != "google":
+        print(f"Unknown ASR backend '{name}'. Using Google recognition.")
+    return GoogleBackend(recognizer)
+
+
+class VoiceActivityDetector:
+    """
+    Energy-based voice activity detector over raw 16-bit mono PCM.
+    Frame energies are computed with NumPy and compared against an adaptive
+    noise floor, so segments end as soon as the speaker pauses for
+    hangover_ms instead of waiting for a fixed phrase time limit.
+    The first calibration_ms of audio only seeds the noise floor (like
+    adjust_for_ambient_noise), which then keeps tracking the room.
+    Segments longer than soft_limit_s are cut at the next short pause
+    (split_pause_ms); only a segment reaching max_segment_s without any
+    pause is cut at its quietest frame.
+    With output="range", segments are returned as (start, end) sample
+    offsets into everything fed so far and no audio is kept, for callers
+    that hold the PCM themselves (see PcmRingBuffer).
+    """
+
+    def __init__(self, sample_rate: int, frame_ms: int = 30, threshold_ratio: float = 3.0,
+                 min_threshold: float = 150.0, noise_adapt: float = 0.05, hangover_ms: int = 300,
+                 padding_ms: int = 150, min_speech_ms: int = 200, split_pause_ms: int = 120,
+                 soft_limit_s: float = 8.0, max_segment_s: float = 20.0, calibration_ms: int = 500,
+                 output: str = "bytes"):
+        self.sample_rate = sample_rate
+        self.frame_len = max(1, sample_rate * frame_ms // 1000)
+        self.threshold_ratio = threshold_ratio
+        self.min_threshold = min_threshold
+        self.noise_adapt = noise_adapt
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.padding_frames = padding_ms // frame_ms
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.split_pause_frames = max(1, split_pause_ms // frame_ms)
+        self.soft_limit_frames = int(soft_limit_s * 1000 / frame_ms)
+        self.max_segment_frames = int(max_segment_s * 1000 / frame_ms)
+        self.calibration_frames = calibration_ms // frame_ms
+        self.keep_audio = output == "bytes"
+
+        self.noise_floor = None
+        self._frames_seen = 0
+        self._remainder = np.zeros(0, dtype=np.int16)
+        self._preroll = deque(maxlen=self.padding_frames)
+        self._preroll_count = 0
+        self._start = 0  # index of the first frame of the segment in progress
+        self._length = 0  # frames in the segment in progress
+        self._frames = []  # its audio (output="bytes" only)
+        self._energies = []
+        self._speech_frames = 0
+        self._silence_run = 0
+
+    @property
+    def threshold(self) -> float:
+        floor = self.noise_floor if self.noise_floor is not None else 0.0
+        return max(floor * self.threshold_ratio, self.min_threshold)
+
+    @property
+    def in_speech(self) -> bool:
+        return self._length > 0
+
+    def process(self, pcm: bytes) -> list:
+        """Feeds raw PCM and returns the segments completed by it (usually none)."""
+        samples = np.concatenate((self._remainder, np.frombuffer(pcm, dtype=np.int16)))
+        n_frames = len(samples) // self.frame_len
+        self._remainder = samples[n_frames * self.frame_len:]
+        if n_frames == 0:
+            return []
+
+        frames = samples[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+        energies = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+
+        segments = []
+        for frame, energy in zip(frames, energies.tolist()):
+            segment = self._step(frame, energy)
+            if segment is not None:
+                segments.append(segment)
+        return segments
+
+    def flush(self):
+        """Ends the segment in progress, e.g. when listening stops."""
+        segment = self._finish(self._length) if self._speech_frames >= self.min_speech_frames else None
+        self._reset()
+        return segment
+
+    def _step(self, frame, energy):
+        index = self._frames_seen
+        self._frames_seen += 1
+        if self.noise_floor is None:
+            self.noise_floor = energy
+        if self._frames_seen <= self.calibration_frames:
+            # Running mean of the ambient energy
+            self.noise_floor += (energy - self.noise_floor) / self._frames_seen
+            self._push_preroll(frame)
+            return None
+        is_speech = energy > self.threshold
+
+        if not self._length:
+            if is_speech:
+                self._start = index - self._preroll_count
+                self._length = self._preroll_count + 1
+                if self.keep_audio:
+                    self._frames = list(self._preroll) + [frame]
+                self._energies = [0.0] * self._preroll_count + [energy]
+                self._preroll.clear()
+                self._preroll_count = 0
+                self._speech_frames = 1
+                self._silence_run = 0
+            else:
+                # Track the noise floor between utterances; drop quickly, rise slowly
+                if energy < self.noise_floor:
+                    self.noise_floor = energy
+                else:
+                    self.noise_floor += self.noise_adapt * (energy - self.noise_floor)
+                self._push_preroll(frame)
+            return None
+
+        self._length += 1
+        if self.keep_audio:
+            self._frames.append(frame)
+        self._energies.append(energy)
+        if is_speech:
+            self._speech_frames += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+
+        length = self._length
+        if self._silence_run >= self.hangover_frames or (
+                length >= self.soft_limit_frames and self._silence_run >= self.split_pause_frames):
+            # End of utterance (or a natural pause in a long monologue)
+            if self._speech_frames < self.min_speech_frames:
+                self._reset()
+                return None
+            keep = length - self._silence_run + min(self._silence_run, self.padding_frames)
+            segment = self._finish(keep)
+            self._reset()
+            return segment
+
+        if length >= self.max_segment_frames:
+            # No pause at all: cut at the quietest frame in the second half
+            half = length // 2
+            cut = half + int(np.argmin(self._energies[half:])) + 1
+            segment = self._finish(cut)
+            self._start += cut
+            self._length -= cut
+            self._frames = self._frames[cut:]
+            self._energies = self._energies[cut:]
+            self._speech_frames = sum(1 for e in self._energies if e > self.threshold)
+            return segment
+        return None
+
+    def _push_preroll(self, frame):
+        if self.padding_frames:
+            self._preroll_count = min(self._preroll_count + 1, self.padding_frames)
+            if self.keep_audio:
+                self._preroll.append(frame)
+
+    def _finish(self, n_frames):
+        if not self.keep_audio:
+            return self._start * self.frame_len, (self._start + n_frames) * self.frame_len
+        return np.concatenate(self._frames[:n_frames]).tobytes()
+
+    def _reset(self):
+        self._length = 0
+        self._frames = []
+        self._energies = []
+        self._speech_frames = 0
+        self._silence_run = 0
+
+
+class AudioNormalizer:
+    """
+    Converts captured PCM of any sample width (1 to 4 bytes), channel count
+    and rate to 16-bit mono at target_rate, chunk by chunk, before it is
+    buffered, segmented and recognized. Downsampling low-pass filters with
+    a windowed-sinc FIR and then interpolates linearly; the filter history
+    and resampling phase carry over between chunks, so chunk boundaries
+    leave no seams. PCM already in the target format passes through as is.
+    """
+
+    def __init__(self, sample_rate: int, sample_width: int = 2, channels: int = 1, target_rate: int = 16000,
+                 taps: int = 63):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+        self.target_rate = target_rate
+        self.passthrough = sample_rate == target_rate and sample_width == 2 and channels == 1
+        self._step = sample_rate / target_rate
+        self._filter = None
+        if sample_rate > target_rate:
+            # Cutoff a little under the new Nyquist frequency, in cycles per input sample
+            cutoff = 0.45 * target_rate / sample_rate
+            h = 2 * cutoff * np.sinc(2 * cutoff * (np.arange(taps) - (taps - 1) / 2)) * np.hamming(taps)
+            self._filter = (h / h.sum()).astype(np.float32)
+            self._history = np.zeros(taps - 1, dtype=np.float32)
+        self._previous = np.float32(0.0)
+        # Where the next output sample falls, in input samples from the start of the next chunk
+        self._position = 0.0
+
+    def process(self, pcm) -> bytes:
+        """Converts one chunk of captured PCM."""
+        if self.passthrough:
+            return pcm
+        samples = self.to_mono(pcm)
+        if self._step != 1:
+            if self._filter is not None:
+                padded = np.concatenate((self._history, samples))
+                self._history = padded[len(padded) - len(self._history):]
+                samples = np.convolve(padded, self._filter, mode="valid")
+            samples = self._resample(samples)
+        return np.clip(np.rint(samples), -32768, 32767).astype(np.int16).tobytes()
+
+    def to_mono(self, pcm) -> np.ndarray:
+        """The samples of pcm as float32 on the 16-bit scale, channels averaged."""
+        width = self.sample_width
+        if width == 3:
+            raw = np.frombuffer(pcm, dtype=np.uint8)
+            raw = raw[:len(raw) // 3 * 3].reshape(-1, 3).astype(np.int32)
+            raw = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+            raw = np.where(raw >= 1 << 23, raw - (1 << 24), raw)
+        else:
+            # 8-bit PCM is signed here, as in sr.AudioData
+            raw = np.frombuffer(pcm, dtype={1: np.int8, 2: np.int16, 4: np.int32}[width])
+        samples = raw.astype(np.float32) * np.float32(32768.0 / 2 ** (8 * width - 1))
+        if self.channels > 1:
+            samples = samples[:len(samples) // self.channels * self.channels].reshape(-1, self.channels).mean(axis=1)
+        return samples
+
+    def _resample(self, samples: np.ndarray) -> np.ndarray:
+        n = len(samples)
+        if n == 0 or self._position > n - 1:
+            self._position -= n
+            return samples[:0]
+        count = int((n - 1 - self._position) // self._step) + 1
+        # Index 0 of extended is the previous chunk's last sample
+        extended = np.concatenate(([self._previous], samples))
+        t = self._position + 1 + self._step * np.arange(count)
+        left = t.astype(np.int64)
+        frac = (t - left).astype(np.float32)
+        right = np.minimum(left + 1, n)
+        self._position += self._step * count - n
+        self._previous = samples[-1]
+        return extended[left] * (1 - frac) + extended[right] * frac
+
+
+def trim_silence(samples: np.ndarray, threshold: float, frame_len: int, keep_frames: int = 0) -> Tuple[int, int]:
+    """
+    Sample range of samples without the silence at either end: from
+    keep_frames frames before the first frame whose RMS exceeds threshold
+    to keep_frames frames after the last. The whole range if none does.
+    """
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return 0, len(samples)
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    loud = np.flatnonzero(np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1)) > threshold)
+    if not len(loud):
+        return 0, len(samples)
+    start = max(0, int(loud[0]) - keep_frames) * frame_len
+    end = min(n_frames, int(loud[-1]) + 1 + keep_frames) * frame_len
+    # Keep the partial frame at the end along with the last full one
+    return start, len(samples) if end == n_frames * frame_len else end
+
+
+class PcmRingBuffer:
+    """
+    Fixed-size buffer holding the most recent capacity bytes of captured PCM.
+    Positions are absolute byte offsets since the buffer was created. Every
+    byte is stored twice (the buffer is mirrored), so any span of up to
+    capacity bytes can be returned as one contiguous memoryview without
+    copying. A span is only valid until the writer laps it; check valid()
+    after reading.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = bytearray(2 * capacity)
+        self._view = memoryview(self._buffer)
+        self.written = 0
+
+    def write(self, data) -> int:
+        """Appends PCM and returns the absolute position it starts at."""
+        data = memoryview(data).cast("B")
+        position = self.written
+        if len(data) > self.capacity:
+            # Only the newest capacity bytes can be kept
+            skipped = len(data) - self.capacity
+            data = data[skipped:]
+            self.written += skipped
+        offset = self.written % self.capacity
+        first = min(len(data), self.capacity - offset)
+        for start in (offset, offset + self.capacity):
+            self._view[start:start + first] = data[:first]
+        rest = len(data) - first
+        if rest:
+            self._view[:rest] = data[first:]
+            self._view[self.capacity:self.capacity + rest] = data[first:]
+        self.written += len(data)
+        return position
+
+    def valid(self, start: int) -> bool:
+        """True if the bytes from start onwards have not been overwritten yet."""
+        return start >= self.written - self.capacity
+
+    def view(self, start: int, end: int) -> memoryview:
+        """Zero-copy view of the absolute span [start, end)."""
+        if end - start > self.capacity or not self.valid(start) or end > self.written:
+            raise ValueError(f"Span {start}-{end} is not in the buffer")
+        offset = start % self.capacity
+        return self._view[offset:offset + end - start]
+
+
+class PcmSegment:
+    """An utterance as a span of the capture ring buffer, handed to recognition without copying."""
+
+    __slots__ = ("ring", "start", "end", "sample_rate", "sample_width")
+
+    def __init__(self, ring: PcmRingBuffer, start: int, end: int, sample_rate: int, sample_width: int):
+        self.ring = ring
+        self.start = start
+        self.end = end
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+
+    @property
+    def valid(self) -> bool:
+        return self.ring.valid(self.start)
+
+    def audio_data(self):
+        return sr.AudioData(self.ring.view(self.start, self.end), self.sample_rate, self.sample_width)
+
+    def merge(self, later: "PcmSegment") -> "PcmSegment":
+        """One segment spanning this one, the gap after it and the later one."""
+        return PcmSegment(self.ring, self.start, later.end, self.sample_rate, self.sample_width)
+
+    def trim(self, threshold: float, frame_ms: int = 10, keep_ms: int = 100) -> "PcmSegment":
+        """A narrower span of the ring without the silence at either end (see trim_silence)."""
+        if self.sample_width != 2 or not self.valid:
+            return self
+        samples = np.frombuffer(self.ring.view(self.start, self.end), dtype=np.int16)
+        frame_len = max(1, self.sample_rate * frame_ms // 1000)
+        first, last = trim_silence(samples, threshold, frame_len, keep_ms // frame_ms)
+        if first == 0 and last == len(samples):
+            return self
+        metrics.incr("asr_trimmed_bytes", (len(samples) - (last - first)) * 2)
+        return PcmSegment(self.ring, self.start + first * 2, self.start + last * 2, self.sample_rate, 2)
+
 
 class AudioTranscriber:
-    def __init__(self, mock_mode=False):
+    def __init__(self, mock_mode=False, recognition_workers=3, backend=None, vad_options=None, notifier=None,
+                 ring_seconds=60.0, max_backlog=8, backpressure="merge", target_rate=16000, trim=True):
         self.mock_mode = mock_mode
+        # Optional UpdateNotifier, published to whenever new text or partials are available
+        self.notifier = notifier
+        # Keyword arguments for VoiceActivityDetector (hangover_ms, padding_ms, ...)
+        self.vad_options = vad_options or {}
         self.recognizer = sr.Recognizer()
-        self.audio_queue = Queue()
+        # Captured audio lives in a fixed ring buffer (ring_seconds long); the queue only
+        # carries small PcmSegment spans of it, so memory stays flat however long the session.
+        self.ring_seconds = ring_seconds
+        self.ring = None
+        # Microphone audio is converted to 16-bit mono at target_rate (None keeps the device's rate)
+        # as it is captured, and with trim each segment loses the silence at either end before queueing
+        self.target_rate = target_rate
+        self.trim = trim
+        self.audio_queue = Queue(maxsize=64)
+        # When more than max_backlog segments wait for recognition, "merge" joins the new
+        # segment with the last waiting one; "drop_oldest" discards the oldest waiting one.
+        self.max_backlog = max_backlog
+        self.backpressure = backpressure
+        self.overruns = 0  # segments overwritten in the ring before they were recognized
+        self.dropped_segments = 0
+        self.merged_segments = 0
         self.stop_event = Event()
         self.is_recording = False
+        # Hypothesis for the utterance currently being spoken (streaming backends and mock mode)
+        self._partial_transcript = ""
+
+        # backend can be a RecognizerBackend or a backend name
+        if isinstance(backend, RecognizerBackend):
+            self.backend = backend
+        else:
+            self.backend = create_backend(backend, self.recognizer)
+
+        # Recognition runs on a worker pool; futures are kept in utterance order
+        # so results come back in the order they were spoken.
+        self._executor = ThreadPoolExecutor(max_workers=recognition_workers, thread_name_prefix="asr-worker")
+        self._pending = deque()
+        self._dispatch_lock = Lock()
 
         # Check if we are in a headless environment (simple heuristic)
         if not self.mock_mode:
@@ -22,6 +548,20 @@ class AudioTranscriber:
                 self.mock_mode = True
                 self.pyaudio_available = False
 
+    @property
+    def partial_transcript(self):
+        return self._partial_transcript
+
+    @partial_transcript.setter
+    def partial_transcript(self, text):
+        if text != self._partial_transcript:
+            self._partial_transcript = text
+            self._notify()
+
+    def _notify(self, *_):
+        if self.notifier is not None:
+            self.notifier.publish()
+
     def start_listening(self):
         """Starts a background thread to listen for audio."""
         if self.is_recording:
@@ -40,6 +580,8 @@ class AudioTranscriber:
                     print("No microphone found. Falling back to Mock Mode.")
                     self.mock_mode = True
                     self.thread = Thread(target=self._mock_listen_loop)
+                elif self.backend.supports_partials:
+                    self.thread = Thread(target=self._stream_listen_loop)
                 else:
                     self.thread = Thread(target=self._listen_loop)
             except Exception as e:
@@ -48,6 +590,8 @@ class AudioTranscriber:
                 self.thread = Thread(target=self._mock_listen_loop)
 
         self.thread.start()
+        self.dispatch_thread = Thread(target=self._dispatch_loop, daemon=True)
+        self.dispatch_thread.start()
 
     def stop_listening(self):
         """Stops the listening thread."""
@@ -55,61 +599,219 @@ class AudioTranscriber:
         self.stop_event.set()
         if hasattr(self, 'thread'):
             self.thread.join()
+        if hasattr(self, 'dispatch_thread'):
+            self.dispatch_thread.join()
 
     def _listen_loop(self):
-        """Real listening loop using SpeechRecognition."""
+        """
+        Real listening loop: writes microphone frames into the ring buffer, segments them
+        with the VAD and queues each utterance as a span of the ring.
+        """
         with sr.Microphone() as source:
-            self.recognizer.adjust_for_ambient_noise(source)
+            normalizer = self.normalizer(source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+            rate, width = normalizer.target_rate, 2
+            self.ring = ring = PcmRingBuffer(int(self.ring_seconds * rate) * width)
+            vad = VoiceActivityDetector(rate, output="range", **self.vad_options)
             while not self.stop_event.is_set():
                 try:
-                    # Listen for a short phrase (non-blocking logic effectively handled by short phrase_time_limit or just iterating)
-                    # We use a short timeout to check stop_event frequently
-                    try:
-                        audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=10)
-                        self.audio_queue.put(audio)
-                    except sr.WaitTimeoutError:
-                        continue
+                    data = source.stream.read(source.CHUNK)
+                except Exception as e:
+                    print(f"Error in listen loop: {e}")
+                    break
+                with metrics.span("normalize"):
+                    data = normalizer.process(data)
+                ring.write(data)
+                with metrics.span("vad"):
+                    spans = vad.process(data)
+                for start, end in spans:
+                    self._queue_segment(PcmSegment(ring, start * width, end * width, rate, width), vad.threshold)
+            span = vad.flush()
+            if span:
+                self._queue_segment(PcmSegment(ring, span[0] * width, span[1] * width, rate, width), vad.threshold)
+
+    def _stream_listen_loop(self):
+        """Listening loop for streaming backends: feeds raw frames and publishes partials as they come."""
+        with sr.Microphone() as source:
+            normalizer = self.normalizer(source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+            stream = self.backend.create_stream(normalizer.target_rate, 2)
+            # Only used to notice pauses; the backend has the audio
+            vad = VoiceActivityDetector(normalizer.target_rate, output="range", **self.vad_options)
+            while not self.stop_event.is_set():
+                try:
+                    data = normalizer.process(source.stream.read(source.CHUNK))
+                    with metrics.span("asr_stream"):
+                        partial, final = stream.accept(data)
+                    utterance_ended = bool(vad.process(data))
+                    # The VAD usually notices the pause before the backend's own endpointer
+                    if final is None and utterance_ended:
+                        final = stream.finish()
                 except Exception as e:
                     print(f"Error in listen loop: {e}")
                     break
+                if final:
+                    self._publish_final(final)
+                elif partial is not None:
+                    self.partial_transcript = partial
+            final = stream.finish()
+            if final:
+                self._publish_final(final)
+        self.partial_transcript = ""
+
+    def normalizer(self, sample_rate: int, sample_width: int, channels: int = 1) -> AudioNormalizer:
+        """The AudioNormalizer for captured audio in the given format."""
+        return AudioNormalizer(sample_rate, sample_width, channels, target_rate=self.target_rate or sample_rate)
+
+    def _queue_segment(self, segment, threshold=None):
+        if self.trim and threshold is not None:
+            segment = segment.trim(threshold)
+        try:
+            self.audio_queue.put_nowait(segment)
+        except Full:
+            # The dispatcher is stuck; the capture thread must never block
+            self.dropped_segments += 1
+            metrics.incr("asr_dropped_segments")
+
+    def _publish_final(self, text):
+        """Queues an already recognized utterance; it skips the recognition pool."""
+        self.partial_transcript = ""
+        self.audio_queue.put(("text", text))
 
     def _mock_listen_loop(self):
         """Simulates listening by generating dummy text periodically."""
-        mock_phrases = [
-            "Can you explain the difference between a process and a thread?",
-            "What is a REST API?",
-            "How do you handle dependency injection in Python?",
-            "Describe the CAP theorem.",
-            "Write a function to reverse a linked list."
-        ]
         import random
+        # Simulate pause between questions
+        while not self.stop_event.wait(5):
+            phrase = random.choice(MOCK_PHRASES)
+            # Simulate the speaker talking, with partial hypotheses like a streaming backend
+            words = phrase.split()
+            for i in range(1, len(words)):
+                if self.stop_event.wait(0.15):
+                    break
+                self.partial_transcript = " ".join(words[:i])
+            else:
+                self._publish_final(phrase)
+        self.partial_transcript = ""
+
+    def _dispatch_loop(self):
+        """Hands captured items to the recognition pool as soon as they arrive."""
         while not self.stop_event.is_set():
-            time.sleep(5)  # Simulate pause between questions
-            phrase = random.choice(mock_phrases)
-            self.audio_queue.put(("text", phrase)) # Special tuple for mock text
+            # The lock makes this the only consumer of audio_queue, which keeps _pending in order
+            with self._dispatch_lock:
+                try:
+                    item = self.audio_queue.get(timeout=0.2)
+                except Empty:
+                    continue
+                self._dispatch(item)
+
+    def _dispatch(self, item):
+        if isinstance(item, tuple) and item[0] == "text":
+            # Mock text and streaming finals need no recognition
+            future = Future()
+            future.set_result(item[1])
+        else:
+            if isinstance(item, PcmSegment):
+                item = self._apply_backpressure(item)
+            future = self._executor.submit(self._recognize, item)
+            future.segment = item
+        self._pending.append(future)
+        metrics.set_gauge("asr_queue_depth", len(self._pending))
+        # Added after queueing so a woken UI always finds the finished future
+        future.add_done_callback(self._notify)
+
+    def _apply_backpressure(self, segment):
+        """Keeps at most max_backlog segments waiting for recognition. Returns the segment to submit."""
+        backlog = sum(1 for future in self._pending if not future.done())
+        if backlog < self.max_backlog:
+            return segment
+        if self.backpressure == "merge" and self._pending:
+            last = self._pending[-1]
+            previous = getattr(last, "segment", None)
+            if isinstance(previous, PcmSegment) and not last.done() \
+                    and segment.end - previous.start <= segment.ring.capacity and last.cancel():
+                self._pending.pop()
+                self.merged_segments += 1
+                metrics.incr("asr_merged_segments")
+                return previous.merge(segment)
+        # Drop the oldest segment that has not started recognition yet
+        for future in self._pending:
+            if not future.done() and isinstance(getattr(future, "segment", None), PcmSegment) and future.cancel():
+                self.dropped_segments += 1
+                metrics.incr("asr_dropped_segments")
+                break
+        return segment
+
+    def _recognize(self, audio):
+        """Recognizes a single audio segment. Runs on the worker pool."""
+        segment = audio if isinstance(audio, PcmSegment) else None
+        try:
+            if segment is not None:
+                if not segment.valid:
+                    return self._overrun()
+                audio = segment.audio_data()
+            with metrics.span("asr"):
+                text = self.backend.recognize(audio)
+            if segment is not None and not segment.valid:
+                # The capture lapped the ring while this was being read
+                return self._overrun()
+            return text
+        except Exception as e:
+            print(f"Error recognizing audio: {e}")
+            return None
+
+    def _overrun(self):
+        self.overruns += 1
+        metrics.incr("asr_ring_overruns")
+        return None
+
+    def oldest_pending_start(self) -> Optional[int]:
+        """Ring position where the oldest segment not yet recognized starts (None if there is none)."""
+        segments = [item for item in list(self.audio_queue.queue) if isinstance(item, PcmSegment)]
+        segments += [future.segment for future in list(self._pending)
+                     if not future.done() and isinstance(getattr(future, "segment", None), PcmSegment)]
+        return min((segment.start for segment in segments), default=None)
+
+    @property
+    def backlog(self) -> int:
+        """Items queued or being recognized whose results have not been collected yet."""
+        return len(self._pending) + self.audio_queue.qsize()
 
     def get_transcript(self):
         """
-        Process the queue and return new text.
-        Returns a list of strings (newly transcribed segments).
+        Return newly finished transcriptions without blocking.
+        Returns a list of strings (newly transcribed segments), in utterance order.
+        Segments still being recognized are returned by a later call.
         """
-        new_transcripts = []
-        while not self.audio_queue.empty():
-            item = self.audio_queue.get()
+        return [text for _, text in self.get_transcript_segments()]
 
-            if isinstance(item, tuple) and item[0] == "text":
-                # Mock text
-                new_transcripts.append(item[1])
-            else:
-                # Real audio
-                try:
-                    # Using Google Speech Recognition as it doesn't require API key (limited use)
-                    # or could use Whisper if installed.
-                    text = self.recognizer.recognize_google(item)
-                    new_transcripts.append(text)
-                except sr.UnknownValueError:
-                    pass # Could not understand audio
-                except sr.RequestError as e:
-                    new_transcripts.append(f"[Error: {e}]")
+    def get_transcript_segments(self):
+        """
+        Like get_transcript, but returns (segment, text) pairs so callers can
+        tell where in the audio each text came from. segment is the PcmSegment
+        (or sr.AudioData) that was recognized, or None for text items.
+        """
+        # Pick up anything the dispatcher has not (e.g. when not listening)
+        if self._dispatch_lock.acquire(blocking=False):
+            try:
+                while True:
+                    try:
+                        self._dispatch(self.audio_queue.get_nowait())
+                    except Empty:
+                        break
+            finally:
+                self._dispatch_lock.release()
+
+        new_transcripts = []
+        # Stop at the first unfinished segment so later ones never overtake it
+        while self._pending and self._pending[0].done():
+            future = self._pending.popleft()
+            # Cancelled futures are segments dropped or merged by backpressure
+            text = None if future.cancelled() else future.result()
+            if text:
+                new_transcripts.append((getattr(future, "segment", None), text))
+        metrics.set_gauge("asr_queue_depth", self.backlog)
 
         return new_transcripts
+
+    def get_partial(self):
+        """Returns the hypothesis for the utterance still being spoken ("" if none)."""
+        return self.partial_transcript
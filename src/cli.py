@@ -0,0 +1,370 @@
+"""
+Headless batch processing of recorded interviews and screenshot sets.
+
+Transcribes every audio file (WAV, AIFF, FLAC) and OCRs every image under the
+given paths with the same AudioTranscriber, ScreenCapturer and LLMClient the
+app uses, and answers the questions it finds. Files are spread over a process
+pool and read as fast as recognition allows, not in real time. Results are
+appended to a JSONL file as each file finishes, and a checkpoint next to it
+lets an interrupted run pick up where it stopped.
+
+    python src/cli.py recordings/ -o results.jsonl
+    python src/cli.py recordings/ screenshots/ -o results.jsonl --workers 8 --asr vosk
+    python src/cli.py recordings/ -o transcripts.jsonl --no-answers
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from lazy import lazy_import
+from audio import AudioTranscriber, PcmRingBuffer, PcmSegment, VoiceActivityDetector
+from llm import AnswerCache, ConversationContext, LLMClient
+from questions import QuestionDetector, looks_like_problem
+from vision import ScreenCapturer
+
+sr = lazy_import("speech_recognition")
+Image = lazy_import("PIL.Image")
+
+AUDIO_EXTENSIONS = (".wav", ".aif", ".aiff", ".flac")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+
+def find_inputs(paths):
+    """Returns the supported audio and image files in paths (files or directories, searched recursively)."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                found.extend(os.path.join(root, name) for name in names)
+        else:
+            found.append(path)
+    supported = AUDIO_EXTENSIONS + IMAGE_EXTENSIONS
+    return sorted({os.path.abspath(p) for p in found if p.lower().endswith(supported) and os.path.isfile(p)})
+
+
+class Checkpoint:
+    """
+    Append-only log of the input files whose results are complete in the
+    output file, with the output's size after each one. A file changed since
+    it was processed (size or mtime) is processed again. Resuming truncates
+    the output back to the last recorded size, which drops results a crash
+    left half written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self._done = set()
+        self._file = None
+        valid_bytes = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn last line from a crash
+                    self._done.add((entry["file"], entry["size"], entry["mtime_ns"]))
+                    self.offset = entry["offset"]
+                    valid_bytes += len(line)
+        self._valid_bytes = valid_bytes
+
+    @staticmethod
+    def _key(path):
+        stat = os.stat(path)
+        return path, stat.st_size, stat.st_mtime_ns
+
+    def is_done(self, path: str) -> bool:
+        return self._key(path) in self._done
+
+    def mark(self, path: str, offset: int):
+        """Records that path's results end at offset in the output. Durable once this returns."""
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            self._file.truncate(self._valid_bytes)
+        key = self._key(path)
+        entry = {"file": key[0], "size": key[1], "mtime_ns": key[2], "offset": offset}
+        self._file.write((json.dumps(entry) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._done.add(key)
+        self.offset = offset
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BatchProcessor:
+    """
+    Turns one input file into JSONL records. Each pool process builds one and
+    reuses its recognizer, OCR caches and Ollama connection for every file
+    it is given. Parallelism comes from the pool, so OCR runs in-process and
+    recognition only uses a few threads.
+    """
+
+    def __init__(self, asr=None, answers=True, model=None, host=None, cache_path=None, asr_threads=2,
+                 max_backlog=4, chunk_seconds=0.5, context_tokens=1500, vad_options=None):
+        self.chunk_seconds = chunk_seconds
+        self.context_tokens = context_tokens
+        self.max_backlog = max_backlog
+        vad_options = vad_options or {}
+        # The ring must hold every segment waiting for recognition plus the one in progress
+        max_segment_s = vad_options.get("max_segment_s", 20.0)
+        self.transcriber = AudioTranscriber(mock_mode=True, recognition_workers=asr_threads, backend=asr,
+                                            vad_options=vad_options, ring_seconds=(max_backlog + 2) * max_segment_s,
+                                            max_backlog=max_backlog + 1)
+        self.capturer = ScreenCapturer(ocr_workers=1)
+        self.llm = None
+        if answers:
+            self.llm = LLMClient(model=model, host=host, cache=AnswerCache(path=cache_path) if cache_path else None)
+
+    def close(self):
+        if self.llm is not None:
+            self.llm.close()
+
+    def process(self, path: str):
+        """Returns (records, stats) for one file."""
+        started = time.perf_counter()
+        if path.lower().endswith(AUDIO_EXTENSIONS):
+            records, duration = self.process_audio(path)
+        else:
+            records, duration = self.process_image(path), 0.0
+        return records, {"duration": duration, "elapsed": time.perf_counter() - started}
+
+    def process_audio(self, path: str):
+        """
+        Reads the file in chunks through the same ring buffer, VAD and
+        recognition pool as the microphone loop, without waiting between
+        chunks. Returns (records, audio duration in seconds).
+        """
+        transcriber = self.transcriber
+        detector = QuestionDetector()
+        context = ConversationContext(max_tokens=self.context_tokens)
+        records = []
+        held = []  # (start, end) of the fragments the detector is holding
+
+        def add(detected, start, end):
+            record = {"file": path, "kind": "transcript", "start": round(start, 2), "end": round(end, 2),
+                      "text": detected.text, "is_question": detected.is_question,
+                      "confidence": round(detected.confidence, 2)}
+            if detected.is_question:
+                answer = self._answer(detected.text, context)
+                if answer is not None:
+                    record["answer"] = answer
+            records.append(record)
+
+        def collect():
+            for segment, text in transcriber.get_transcript_segments():
+                start = segment.start / (segment.sample_rate * segment.sample_width)
+                end = segment.end / (segment.sample_rate * segment.sample_width)
+                # Fragments whose merge window passed before this one was spoken
+                for detected in detector.flush(now=end):
+                    add(detected, held[0][0], held[-1][1])
+                    held.clear()
+                held.append((start, end))
+                for detected in detector.feed(text, now=end):
+                    add(detected, held[0][0], held[-1][1])
+                    held.clear()
+
+        with sr.AudioFile(path) as source:
+            # Converted to 16-bit mono at the transcriber's target rate, like microphone audio
+            normalizer = transcriber.normalizer(source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+            rate = normalizer.target_rate
+            chunk_frames = max(1, int(self.chunk_seconds * source.SAMPLE_RATE))
+            ring = PcmRingBuffer(int(transcriber.ring_seconds * rate) * 2)
+            vad = VoiceActivityDetector(rate, output="range", **transcriber.vad_options)
+            frames = 0
+            while True:
+                data = source.stream.read(chunk_frames)
+                if not data:
+                    break
+                data = normalizer.process(data)
+                # Reading waits for recognition rather than overwrite a segment it has not finished
+                while True:
+                    oldest = transcriber.oldest_pending_start()
+                    if oldest is None or ring.written + len(data) - ring.capacity <= oldest:
+                        break
+                    collect()
+                    time.sleep(0.002)
+                frames += len(data) // 2
+                ring.write(data)
+                for start, end in vad.process(data):
+                    # Keep no more than max_backlog segments waiting, so none is overwritten in the ring
+                    while transcriber.backlog >= self.max_backlog:
+                        collect()
+                        time.sleep(0.002)
+                    transcriber.audio_queue.put(PcmSegment(ring, start * 2, end * 2, rate, 2).trim(vad.threshold))
+                collect()
+            span = vad.flush()
+            if span:
+                transcriber.audio_queue.put(PcmSegment(ring, span[0] * 2, span[1] * 2, rate, 2).trim(vad.threshold))
+            while transcriber.backlog:
+                collect()
+                time.sleep(0.002)
+        for detected in detector.flush(force=True):
+            add(detected, held[0][0], held[-1][1])
+        return records, frames / rate
+
+    def process_image(self, path: str):
+        if not self.capturer.tesseract_available:
+            raise RuntimeError("Tesseract OCR not installed on system. Cannot read screenshots.")
+        rgb = np.asarray(Image.open(path).convert("RGB"))
+        # ScreenCapturer reads BGRA frames, the layout mss captures in
+        frame = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+        frame[:, :, :3] = rgb[:, :, ::-1]
+        frame[:, :, 3] = 255
+        text = self.capturer.read_frame(frame)
+        record = {"file": path, "kind": "screen", "text": text, "is_problem": looks_like_problem(text)}
+        if record["is_problem"]:
+            answer = self._answer(text, ConversationContext(max_tokens=self.context_tokens))
+            if answer is not None:
+                record["answer"] = answer
+        return [record]
+
+    def _answer(self, question, context):
+        """Answers with Ollama, or returns None if answers are off or Ollama is unreachable (no mock answers)."""
+        if self.llm is None or not self.llm.connection.wait_checked():
+            return None
+        self.llm.context = context
+        return self.llm.get_answer(question)
+
+
+# One BatchProcessor per pool process, built by the pool's initializer
+_processor = None
+
+
+def _init_worker(options):
+    global _processor
+    _processor = BatchProcessor(**options)
+
+
+def _process_file(path):
+    return _processor.process(path)
+
+
+def _process_all(paths, options, workers):
+    """Yields (path, (records, stats)) as files finish, or (path, exception) for files that failed."""
+    if workers == 0:
+        # In this process, for debugging
+        processor = BatchProcessor(**options)
+        try:
+            for path in paths:
+                try:
+                    yield path, processor.process(path)
+                except Exception as e:
+                    yield path, e
+        finally:
+            processor.close()
+        return
+
+    # spawn rather than fork, like the OCR pool: the parent may already run threads
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(options,))
+    try:
+        futures = {executor.submit(_process_file, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run(args) -> int:
+    files = find_inputs(args.inputs)
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    if args.restart:
+        for path in (args.output, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+    elif os.path.exists(args.output) and os.path.getsize(args.output) and not os.path.exists(checkpoint_path):
+        print(f"{args.output} exists but has no checkpoint ({checkpoint_path}); use --restart to overwrite it.",
+              file=sys.stderr)
+        return 2
+
+    checkpoint = Checkpoint(checkpoint_path)
+    todo = [path for path in files if not checkpoint.is_done(path)]
+    if len(todo) < len(files):
+        print(f"Resuming: {len(files) - len(todo)} of {len(files)} files already done.")
+    # Longest recordings first, so no long file starts last and holds up the end of the run
+    todo.sort(key=os.path.getsize, reverse=True)
+
+    options = {
+        "asr": args.asr,
+        "answers": not args.no_answers,
+        "model": args.model,
+        "host": args.host,
+        "cache_path": args.cache,
+        "asr_threads": args.asr_threads,
+    }
+    failed = 0
+    audio_seconds = 0.0
+    started = time.perf_counter()
+    with open(args.output, "ab") as out:
+        # Drop anything written after the last checkpointed file
+        out.truncate(checkpoint.offset)
+
+        def write(path, records, stats, done):
+            nonlocal audio_seconds
+            for record in records:
+                out.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            out.flush()
+            os.fsync(out.fileno())
+            checkpoint.mark(path, out.tell())
+            audio_seconds += stats["duration"]
+            speed = f", {stats['duration'] / stats['elapsed']:.1f}x real time" if stats["duration"] else ""
+            print(f"[{done}/{len(todo)}] {path}: {len(records)} records{speed}")
+
+        results = _process_all(todo, options, args.workers)
+        try:
+            for done, (path, outcome) in enumerate(results, 1):
+                if isinstance(outcome, Exception):
+                    # Not checkpointed, so the next run retries it
+                    failed += 1
+                    print(f"[{done}/{len(todo)}] {path}: failed: {outcome}", file=sys.stderr)
+                    continue
+                write(path, *outcome, done)
+        except KeyboardInterrupt:
+            print("Interrupted; run the same command again to resume.", file=sys.stderr)
+            return 130
+        finally:
+            results.close()
+            checkpoint.close()
+
+    elapsed = time.perf_counter() - started
+    summary = f"Processed {len(todo) - failed} files in {elapsed:.1f}s"
+    if audio_seconds:
+        summary += f" ({audio_seconds / 3600:.2f} h of audio, {audio_seconds / elapsed:.1f}x real time)"
+    print(summary + (f"; {failed} failed" if failed else ""))
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe and answer recorded interviews and screenshots in bulk.")
+    parser.add_argument("inputs", nargs="+", help="Audio/image files or directories to process (recursively)")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to append results to")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Discard earlier results and checkpoint and start over")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes to run files on (0 = in this process)")
+    parser.add_argument("--asr", help="Recognizer backend: google, vosk or mock (default: ASR_BACKEND or google)")
+    parser.add_argument("--asr-threads", type=int, default=2, help="Recognition threads per process")
+    parser.add_argument("--no-answers", action="store_true", help="Only transcribe and OCR; do not ask Ollama")
+    parser.add_argument("--model", help="Ollama model (default: OLLAMA_MODEL or llama3.2)")
+    parser.add_argument("--host", help="Ollama host (default: OLLAMA_HOST or http://localhost:11434)")
+    parser.add_argument("--cache", default=os.getenv("ANSWER_CACHE_PATH"),
+                        help="SQLite answer cache shared by the workers (default: ANSWER_CACHE_PATH)")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+from threading import Condition
+from typing import Optional
+
+
+class UpdateNotifier:
+    """
+    Version counter shared between background producers (transcriber,
+    answer worker) and the UI. Producers call publish() whenever they have
+    new data; the UI blocks in wait() instead of polling on a timer.
+    """
+
+    def __init__(self):
+        self._condition = Condition()
+        self.version = 0
+
+    def publish(self):
+        with self._condition:
+            self.version += 1
+            self._condition.notify_all()
+
+    def wait(self, since: int, timeout: Optional[float] = None) -> int:
+        """Blocks until the version differs from since (or timeout) and returns the current version."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != since, timeout)
+            return self.version
@@ -0,0 +1,120 @@
+import json
+import os
+import time
+from array import array
+from collections import deque
+from typing import List, Optional
+
+
+class TranscriptHistory:
+    """
+    Transcript entries for one session.
+    Only the newest max_entries are kept in memory (a ring buffer) for
+    rendering. When log_path is set, every entry is also appended to a JSONL
+    session log, which keeps the full session for paging, searching and
+    reloading later. Entries are dicts with at least seq, time, source and text.
+    """
+
+    def __init__(self, max_entries: int = 200, log_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.log_path = log_path
+        self.total = 0
+        self._entries = deque(maxlen=max_entries)
+        # Byte offset of every entry in the log, so any page is one seek away
+        self._offsets = array("q")
+        self._log = None
+        if log_path:
+            directory = os.path.dirname(log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._log = open(log_path, "a+b")
+            self._index_log()
+
+    @classmethod
+    def load(cls, log_path: str, max_entries: int = 200) -> "TranscriptHistory":
+        """Reopens a session log; its newest entries are loaded into memory."""
+        return cls(max_entries=max_entries, log_path=log_path)
+
+    def append(self, text: str, source: str = "audio", **fields) -> dict:
+        entry = {"seq": self.total, "time": time.time(), "source": source, "text": text}
+        entry.update(fields)
+        if self._log is not None:
+            self._log.seek(0, os.SEEK_END)
+            self._offsets.append(self._log.tell())
+            self._log.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._log.flush()
+        self._entries.append(entry)
+        self.total += 1
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def tail(self, n: int) -> List[dict]:
+        """Returns the newest n entries (at most max_entries)."""
+        if n <= 0:
+            return []
+        start = max(0, len(self._entries) - n)
+        return [self._entries[i] for i in range(start, len(self._entries))]
+
+    def page(self, page: int, page_size: int = 50) -> List[dict]:
+        """
+        Returns one page of the whole session, oldest first within the page.
+        Page 0 is the newest. Pages that are no longer in memory are read from the log.
+        """
+        end = self.total - page * page_size
+        start = max(0, end - page_size)
+        if end <= 0:
+            return []
+        oldest_in_memory = self.total - len(self._entries)
+        if start >= oldest_in_memory:
+            return [self._entries[i - oldest_in_memory] for i in range(start, end)]
+        if self._log is None:
+            # Without a log, paged-out entries are gone
+            start = max(start, oldest_in_memory)
+            return [self._entries[i - oldest_in_memory] for i in range(start, end)]
+        return self._read_log(start, end)
+
+    def page_count(self, page_size: int = 50) -> int:
+        available = self.total if self._log is not None else len(self._entries)
+        return max(1, -(-available // page_size))
+
+    def search(self, query: str, limit: int = 50) -> List[dict]:
+        """Case-insensitive search over the whole session, newest matches first."""
+        query = query.lower()
+        if self._log is None:
+            return [entry for entry in reversed(self._entries) if query in entry["text"].lower()][:limit]
+        # Stream the log so memory stays bounded by limit, not by session length
+        matches = deque(maxlen=limit)
+        self._log.flush()
+        self._log.seek(0)
+        for line in self._log:
+            if query in line.decode("utf-8").lower():
+                entry = json.loads(line)
+                if query in entry["text"].lower():
+                    matches.append(entry)
+        return list(reversed(matches))
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _read_log(self, start: int, end: int) -> List[dict]:
+        self._log.flush()
+        self._log.seek(self._offsets[start])
+        return [json.loads(self._log.readline()) for _ in range(end - start)]
+
+    def _index_log(self):
+        """Indexes an existing log and loads its newest entries into memory."""
+        self._log.seek(0)
+        offset = 0
+        for line in self._log:
+            if line.strip():
+                self._offsets.append(offset)
+                self._entries.append(json.loads(line))
+            offset += len(line)
+        self.total = len(self._offsets)
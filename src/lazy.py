@@ -0,0 +1,24 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name: str):
+    """
+    Returns module name without executing it yet: the module body runs on
+    the first attribute access. Used for heavy dependencies (ollama,
+    pytesseract, ...) so importing our modules, and the app's first paint,
+    does not pay for libraries a session may never use.
+    Raises ImportError right away if the module is not installed.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
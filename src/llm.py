@@ -1,44 +1,619 @@
+import hashlib
 import os
-import ollama
-from typing import Optional
+import re
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from threading import Event, Lock, Thread
+from typing import Callable, Iterator, Optional
+from lazy import lazy_import
+from metrics import metrics
+from questions import looks_like_problem
 
-class LLMClient:
-    def __init__(self, model: Optional[str] = None, host: Optional[str] = None):
+ollama = lazy_import("ollama")
+
+SYSTEM_PROMPT = "You are a helpful assistant for job interviews. Keep answers concise and to the point. Structure them clearly."
+
+
+class AnswerCache:
+    """
+    LRU cache of generated answers keyed by model and normalized question text.
+    Entries expire after ttl seconds (None keeps them forever). When path is
+    given, entries are also written to a SQLite file so they survive restarts;
+    the in-memory LRU sits in front of it.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = 7 * 24 * 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (answer, created_at)
+        self._lock = Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, created_at REAL)")
+            self._db.commit()
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Lowercases, drops punctuation and collapses whitespace so trivial variations share an entry."""
+        return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+    def key(self, model: str, question: str) -> str:
+        return f"{model}\n{self.normalize(question)}"
+
+    def get(self, model: str, question: str) -> Optional[str]:
+        key = self.key(model, question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT answer, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._store(key, entry)
+            if entry is not None and self.ttl is not None and now - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                if self._db is not None:
+                    self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    self._db.commit()
+                entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.incr("answer_cache_misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.incr("answer_cache_hits")
+            return entry[0]
+
+    def put(self, model: str, question: str, answer: str):
+        key = self.key(model, question)
+        entry = (answer, time.time())
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?)", (key, entry[0], entry[1]))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answers")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Words that make a question depend on what was said before ("and how would you scale that?")
+FOLLOW_UP_WORDS = {"that", "this", "it", "those", "these", "them", "they", "its", "there", "same", "else", "also"}
+FOLLOW_UP_STARTS = ("and ", "but ", "so ", "what about", "how about", "why not", "then ", "also ")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+class ConversationContext:
+    """
+    Recent questions and answers sent along with each new question.
+    Turns are kept whole while they fit in max_tokens; older turns are
+    folded into a short extractive summary, evict_batch turns at a time.
+    Messages are ordered system prompt, summary, turns, question, and the
+    summary only changes when a batch is evicted, so consecutive requests
+    share a byte-identical prefix that Ollama can reuse from its prompt cache.
+    """
+
+    def __init__(self, max_tokens: int = 1500, summary_tokens: int = 300, evict_batch: int = 2):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.evict_batch = evict_batch
+        self._turns = deque()  # (question, answer, tokens)
+        self._turn_tokens = 0
+        self._summary = deque()  # one line per evicted turn
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._turns)
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self._summary)
+
+    def add(self, question: str, answer: str):
+        """Records a finished turn, summarizing the oldest ones if the budget is exceeded."""
+        tokens = estimate_tokens(question) + estimate_tokens(answer)
+        with self._lock:
+            self._turns.append((question, answer, tokens))
+            self._turn_tokens += tokens
+            # Evict whole batches so the summary (part of the cached prefix) changes rarely
+            while self._turn_tokens > self.max_tokens and len(self._turns) > 1:
+                for _ in range(min(self.evict_batch, len(self._turns) - 1)):
+                    old_question, old_answer, old_tokens = self._turns.popleft()
+                    self._turn_tokens -= old_tokens
+                    self._summary.append(self._summarize(old_question, old_answer))
+            while len(self._summary) > 1 and estimate_tokens(self.summary) > self.summary_tokens:
+                self._summary.popleft()
+
+    def clear(self):
+        with self._lock:
+            self._turns.clear()
+            self._turn_tokens = 0
+            self._summary.clear()
+
+    def is_follow_up(self, question: str) -> bool:
+        """True if the question probably refers back to earlier turns."""
+        if not self._turns and not self._summary:
+            return False
+        lowered = question.lower().strip()
+        words = set(re.findall(r"[a-z']+", lowered))
+        return lowered.startswith(FOLLOW_UP_STARTS) or bool(words & FOLLOW_UP_WORDS)
+
+    def messages(self, question: str) -> list:
+        """Builds the chat messages for a question: stable prefix first, the new question last."""
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        with self._lock:
+            if self._summary:
+                messages.append({"role": "system", "content": "Earlier in this interview:\n" + self.summary})
+            for old_question, old_answer, _ in self._turns:
+                messages.append({"role": "user", "content": old_question})
+                messages.append({"role": "assistant", "content": old_answer})
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    @staticmethod
+    def _summarize(question: str, answer: str) -> str:
+        """One line per turn: the question and the first sentence of its answer, both truncated."""
+        first_sentence = re.split(r"(?<=[.!?])\s|\n", answer.strip(), maxsplit=1)[0]
+        return f"- Q: {question.strip()[:120]} A: {first_sentence[:160]}"
+
+
+class OllamaConnection:
+    """
+    A reusable connection to one Ollama server and model. The HTTP client is
+    created once; a background thread checks the server (backing off while
+    it is down), loads the model with keep_alive so the first question does
+    not pay for it, and notices as soon as the server comes back. One
+    connection can be shared by many LLMClients (e.g. every app session).
+    An optional draft_model (a small, fast model on the same server) is
+    loaded alongside the main one.
+    """
+
+    def __init__(self, model: Optional[str] = None, host: Optional[str] = None, keep_alive: Optional[str] = None,
+                 health_interval: float = 30.0, max_backoff: float = 60.0, connect_timeout: float = 2.0,
+                 draft_model: Optional[str] = None):
         self.model = model or os.getenv("OLLAMA_MODEL", "llama3.2")
+        self.draft_model = draft_model
         self.host = host or os.getenv("OLLAMA_HOST", "http://localhost:11434")
-        self.client = None
-        self._connected = False
-        
+        # How long Ollama keeps the model loaded after a request (e.g. "30m", "-1m" for forever)
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self.health_interval = health_interval
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.connected = False
+        self.warmed = False
+        self.last_error = None
+        self.failures = 0
+        # Smoothed time to first token per model, shared by every client of this connection
+        self._first_token = {}
+        self._checked = Event()
+        self._wake = Event()
+        self._stop = Event()
+
         try:
             self.client = ollama.Client(host=self.host)
-            # Test connection by listing models
-            self.client.list()
-            self._connected = True
         except Exception as e:
-            print(f"Could not connect to Ollama at {self.host}. LLM will run in Mock Mode. Error: {e}")
-            self._connected = False
+            print(f"Could not create Ollama client for {self.host}. LLM will run in Mock Mode. Error: {e}")
+            self.client = None
+            self._checked.set()
+            return
+        self._health_thread = Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def wait_checked(self) -> bool:
+        """Connection state for request paths; waits (up to connect_timeout) for the first health check."""
+        self._checked.wait(self.connect_timeout)
+        return self.connected
+
+    @property
+    def status(self) -> str:
+        """Non-blocking connection state for display: connecting, loading model, ready or offline."""
+        if not self._checked.is_set():
+            return "connecting"
+        if not self.connected:
+            return "offline"
+        return "ready" if self.warmed else "loading model"
+
+    def check_now(self):
+        """Runs a health check right away instead of waiting for the next interval or backoff."""
+        self._wake.set()
+
+    def record_first_token(self, model: str, seconds: float, weight: float = 0.3):
+        previous = self._first_token.get(model)
+        self._first_token[model] = seconds if previous is None else previous + weight * (seconds - previous)
+
+    def expected_first_token(self, model: str) -> Optional[float]:
+        """Recent time to first token for model in seconds, or None before its first answer."""
+        return self._first_token.get(model)
+
+    def close(self):
+        """Stops the health check thread."""
+        self._stop.set()
+        self._wake.set()
+
+    def connection_lost(self, error: Exception):
+        """Called when a request fails to reach the server; falls back to mock mode until it is back."""
+        if isinstance(error, ConnectionError):
+            self.connected = False
+            self.warmed = False
+            self.last_error = str(error)
+            self.check_now()
+
+    def _health_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.client.list()
+                if not self.connected and self.failures:
+                    print(f"Reconnected to Ollama at {self.host}.")
+                self.connected = True
+                self.failures = 0
+                self.last_error = None
+            except Exception as e:
+                if self.connected or not self.failures:
+                    print(f"Could not connect to Ollama at {self.host}. LLM will run in Mock Mode. Error: {e}")
+                self.connected = False
+                self.warmed = False
+                self.failures += 1
+                self.last_error = str(e)
+            self._checked.set()
+
+            if self.connected and not self.warmed:
+                self._warm_up()
+            if self.connected:
+                delay = self.health_interval
+            else:
+                delay = min(self.max_backoff, 2 ** (self.failures - 1))
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _warm_up(self):
+        """Loads the model(s) into memory with an empty prompt, which Ollama answers without generating."""
+        try:
+            self.client.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+            self.warmed = True
+        except Exception as e:
+            # The model may still be pulling or the name may be wrong; retried on the next check
+            self.last_error = f"Could not load model {self.model}: {e}"
+            print(self.last_error)
+            return
+        if self.draft_model:
+            try:
+                self.client.generate(model=self.draft_model, prompt="", keep_alive=self.keep_alive)
+            except Exception as e:
+                # Answers still work without drafts; stream_draft reports the failure again
+                print(f"Could not load draft model {self.draft_model}: {e}")
+
+
+class LLMClient:
+    """
+    Answers questions with an Ollama model, or with mock answers while Ollama
+    is unreachable. The server connection (see OllamaConnection) is created
+    here unless a shared one is passed in; the cache and conversation
+    context belong to this client.
+    With a draft model on the connection, route() sends questions that
+    are not coding problems to both tiers: the draft model's quick answer
+    (stream_draft) is shown until the main model's answer is complete. When
+    the main model has recently started answering within latency_budget
+    seconds, the draft is skipped.
+    """
+
+    def __init__(self, model: Optional[str] = None, host: Optional[str] = None, cache: Optional[AnswerCache] = None,
+                 context: Optional[ConversationContext] = None, keep_alive: Optional[str] = None,
+                 health_interval: float = 30.0, max_backoff: float = 60.0, connect_timeout: float = 2.0,
+                 connection: Optional[OllamaConnection] = None, retriever=None, retrieval_k: int = 3,
+                 draft_model: Optional[str] = None, latency_budget: Optional[float] = None):
+        self.cache = cache
+        # Optional ConversationContext; answered questions are added to it and sent with later ones
+        self.context = context
+        # Optional retrieval.VectorIndex; the retrieval_k chunks most relevant to a question are sent with it
+        self.retriever = retriever
+        self.retrieval_k = retrieval_k
+        self._owns_connection = connection is None
+        if connection is None:
+            connection = OllamaConnection(model=model, host=host, keep_alive=keep_alive,
+                                          health_interval=health_interval, max_backoff=max_backoff,
+                                          connect_timeout=connect_timeout, draft_model=draft_model)
+        self.connection = connection
+        self.model = connection.model
+        self.draft_model = connection.draft_model
+        self.host = connection.host
+        # Seconds the main model may take to start answering before a draft is shown; None always drafts
+        self.latency_budget = latency_budget
+
+    @property
+    def client(self):
+        return self.connection.client
 
-    def get_answer(self, question: str) -> str:
+    @property
+    def keep_alive(self):
+        return self.connection.keep_alive
+
+    @property
+    def connected(self) -> bool:
+        return self.connection.connected
+
+    @property
+    def _connected(self) -> bool:
+        return self.connection.wait_checked()
+
+    @property
+    def status(self) -> str:
+        return self.connection.status
+
+    @property
+    def last_error(self):
+        return self.connection.last_error
+
+    def check_now(self):
+        self.connection.check_now()
+
+    def close(self):
+        """Stops the connection's health checks, unless the connection is shared."""
+        if self._owns_connection:
+            self.connection.close()
+
+    def _connection_lost(self, error: Exception):
+        self.connection.connection_lost(error)
+
+    def get_answer(self, question: str, fallback: bool = True) -> str:
         """
         Generates an answer for the given question.
+        With fallback=False, failures raise (ConnectionError while Ollama is
+        unreachable) instead of returning a mock answer or an error message,
+        for callers that keep answers (see answer_bank.build).
         """
         if not question:
             return ""
 
         if not self._connected:
+            if not fallback:
+                raise ConnectionError(f"Cannot reach Ollama at {self.host}: {self.last_error}")
             return self._mock_answer(question)
 
+        notes = self.retrieve(question)
+        cached = self._cached_answer(question, notes)
+        if cached is not None:
+            self.remember(question, cached)
+            return cached
+
+        try:
+            with metrics.span("llm_answer"):
+                response = self.client.chat(
+                    model=self.model,
+                    messages=self._build_messages(question, notes),
+                    keep_alive=self.keep_alive
+                )
+            answer = response['message']['content'].strip()
+        except Exception as e:
+            self._connection_lost(e)
+            if not fallback:
+                raise
+            return f"Error contacting Ollama: {e}"
+        self.store_answer(question, answer, notes)
+        return answer
+
+    def stream_answer(self, question: str, on_complete: Optional[Callable[[str], None]] = None,
+                      notes: Optional[str] = None) -> Iterator[str]:
+        """
+        Generates an answer for the given question, yielding text chunks as
+        the model produces them. Joining the chunks gives the full answer.
+        A model answer is normally cached and added to the conversation once
+        complete; with on_complete it is passed to on_complete instead (used
+        for speculative drafts that may turn out to answer the wrong question).
+        notes are the question's retrieved notes (see retrieve()); by default
+        they are retrieved here.
+        """
+        if not question:
+            return
+
+        if not self._connected:
+            # Emit the mock answer word by word so callers exercise the same path
+            words = self._mock_answer(question).split(" ")
+            yield words[0]
+            for word in words[1:]:
+                yield " " + word
+            return
+
+        if notes is None:
+            notes = self.retrieve(question)
+        cached = self._cached_answer(question, notes)
+        if cached is not None:
+            if on_complete is None:
+                self.remember(question, cached)
+            yield cached
+            if on_complete is not None:
+                on_complete(cached)
+            return
+
+        parts = []
+        started = time.perf_counter()
+        first_token_at = None
         try:
-            response = self.client.chat(
+            stream = self.client.chat(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant for job interviews. Keep answers concise and to the point. Structure them clearly."},
-                    {"role": "user", "content": question}
-                ]
+                messages=self._build_messages(question, notes),
+                stream=True,
+                keep_alive=self.keep_alive
             )
-            return response['message']['content'].strip()
+            for chunk in stream:
+                content = chunk['message']['content']
+                if content:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        metrics.observe("llm_first_token", first_token_at - started)
+                        self.connection.record_first_token(self.model, first_token_at - started)
+                    parts.append(content)
+                    yield content
         except Exception as e:
-            return f"Error contacting Ollama: {e}"
+            self._connection_lost(e)
+            yield f"Error contacting Ollama: {e}"
+            return
+        # Only reached when the stream ran to completion (not on errors or early close)
+        finished = time.perf_counter()
+        metrics.observe("llm_answer", finished - started)
+        if len(parts) > 1 and finished > first_token_at:
+            # Ollama streams roughly one token per chunk
+            metrics.set_gauge("llm_tokens_per_second", round((len(parts) - 1) / (finished - first_token_at), 2))
+        answer = "".join(parts).strip()
+        if on_complete is None:
+            self.store_answer(question, answer, notes)
+        else:
+            on_complete(answer)
+
+    def route(self, question: str, source: str = "audio") -> str:
+        """
+        Picks the tier for a question: "draft" to show the draft model's answer
+        while the main model works on its own, or "strong" for the main model
+        alone. Coding problems (and anything read from the screen) always go
+        straight to the main model.
+        """
+        if not self.draft_model or self.draft_model == self.model or not self.connected:
+            return "strong"
+        # Spoken coding questions are short, so fewer keywords are needed than for screen text
+        if source == "screen" or looks_like_problem(question, min_hits=2, min_length=0):
+            return "strong"
+        expected = self.connection.expected_first_token(self.model)
+        if self.latency_budget is not None and expected is not None and expected <= self.latency_budget:
+            return "strong"
+        return "draft"
+
+    def stream_draft(self, question: str, notes: Optional[str] = None) -> Iterator[str]:
+        """
+        Streams a quick answer from the draft model. Drafts are never cached or
+        added to the conversation, and a failure just ends the stream: the main
+        model's answer, generated alongside, reports errors.
+        """
+        if not question or not self.draft_model:
+            return
+        if notes is None:
+            notes = self.retrieve(question)
+        started = time.perf_counter()
+        first = True
+        try:
+            stream = self.client.chat(
+                model=self.draft_model,
+                messages=self._build_messages(question, notes),
+                stream=True,
+                keep_alive=self.keep_alive
+            )
+            for chunk in stream:
+                content = chunk['message']['content']
+                if content:
+                    if first:
+                        first = False
+                        metrics.observe("llm_draft_first_token", time.perf_counter() - started)
+                    yield content
+        except Exception as e:
+            print(f"Draft model {self.draft_model} failed: {e}")
+
+    def _cached_answer(self, question: str, notes: str) -> Optional[str]:
+        # A follow-up's answer depends on the conversation, so it is neither looked up nor stored
+        if self.cache is None or (self.context is not None and self.context.is_follow_up(question)):
+            return None
+        return self.cache.get(self._answer_model(notes), question)
+
+    def store_answer(self, question: str, answer: str, notes: Optional[str] = None):
+        """
+        Caches a finished answer (unless it is a follow-up) and adds the turn to the conversation.
+        notes are the ones the answer was generated with; by default they are retrieved again.
+        """
+        if not answer:
+            return
+        if self.cache is not None and not (self.context is not None and self.context.is_follow_up(question)):
+            if notes is None:
+                notes = self.retrieve(question)
+            self.cache.put(self._answer_model(notes), question, answer)
+        self.remember(question, answer)
+
+    def remember(self, question: str, answer: str):
+        """Adds a finished turn to the conversation context, if there is one."""
+        if self.context is not None:
+            self.context.add(question, answer)
+
+    def coalesce_key(self, question: str, notes: Optional[str] = None) -> Optional[str]:
+        """
+        Key under which identical concurrent questions can share one generation; None for follow-ups.
+        The shared answer is prompted with the starting session's conversation, so a non-empty
+        conversation adds a digest of it: only sessions with identical conversations share.
+        """
+        if self.context is not None and self.context.is_follow_up(question):
+            return None
+        if notes is None:
+            notes = self.retrieve(question)
+        key = f"{self._answer_model(notes)}\n{AnswerCache.normalize(question)}"
+        if self.context is not None and (len(self.context) or self.context.summary):
+            prefix = "".join(f"{m['role']}:{m['content']}\n" for m in self.context.messages("")[:-1])
+            key += "\n" + hashlib.sha1(prefix.encode("utf-8")).hexdigest()[:16]
+        return key
+
+    def _answer_model(self, notes: str) -> str:
+        """
+        The model name answers are cached and coalesced under. With retrieved
+        notes, their digest is appended, so answers grounded in different
+        notes (or in none) are kept apart.
+        """
+        if not notes:
+            return self.model
+        return f"{self.model}+notes:{hashlib.sha1(notes.encode('utf-8')).hexdigest()[:16]}"
+
+    def _build_messages(self, question: str, notes: Optional[str] = None) -> list:
+        """Builds the chat messages sent to Ollama for a question, with its retrieved notes."""
+        if self.context is not None:
+            messages = self.context.messages(question)
+        else:
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": question}
+            ]
+        if notes is None:
+            notes = self.retrieve(question)
+        if notes:
+            # Right before the question, so the conversation prefix stays cacheable
+            messages.insert(len(messages) - 1, {"role": "system", "content": notes})
+        return messages
+
+    def retrieve(self, question: str) -> str:
+        """
+        The chunks of the candidate's documents most relevant to the question,
+        formatted for the prompt ("" without a retriever or a match). Searching
+        costs a few milliseconds, so callers retrieve once per question and pass
+        the notes on to stream_answer, coalesce_key and store_answer.
+        """
+        if self.retriever is None or self.retrieval_k <= 0:
+            return ""
+        chunks = self.retriever.search(question, k=self.retrieval_k)
+        if not chunks:
+            return ""
+        notes = "\n\n".join(f"[{os.path.basename(chunk.source)}]\n{chunk.text}" for chunk in chunks)
+        return "From the candidate's own notes and resume (use what is relevant, do not invent details):\n\n" + notes
 
     def _mock_answer(self, question: str) -> str:
         """Mock answer generator."""
@@ -0,0 +1,169 @@
+import json
+import os
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Optional
+
+import numpy as np
+
+
+class _NullSpan:
+    """Returned by span() while metrics are disabled, so instrumented code costs one attribute check."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class Metrics:
+    """
+    Process-wide timings, counters and gauges for the pipeline stages.
+    Durations are kept per stage as a total count and sum plus a window of
+    the most recent samples for percentiles. When disabled, span() returns a
+    shared no-op context manager and every other call returns immediately.
+    """
+
+    def __init__(self, enabled: bool = True, window: int = 512):
+        self.enabled = enabled
+        self.window = window
+        self._lock = Lock()
+        self._stages = {}  # name -> [count, sum, deque of recent durations]
+        self._counters = {}
+        self._gauges = {}
+
+    def span(self, name: str):
+        """Times a block: with metrics.span("ocr"): ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = [0, 0.0, deque(maxlen=self.window)]
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2].append(seconds)
+
+    def incr(self, name: str, amount: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float):
+        if not self.enabled:
+            return
+        self._gauges[name] = value
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def snapshot(self) -> dict:
+        """Returns all metrics; stage durations are in milliseconds."""
+        with self._lock:
+            stages = {name: (count, total, np.asarray(recent)) for name, (count, total, recent) in self._stages.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        summary = {}
+        for name, (count, total, recent) in stages.items():
+            p50, p95, p99 = np.percentile(recent, (50, 95, 99)) * 1000
+            summary[name] = {
+                "count": count,
+                "mean_ms": total / count * 1000,
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "last_ms": float(recent[-1]) * 1000,
+            }
+        return {"stages": summary, "counters": counters, "gauges": gauges}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = "copilot") -> str:
+        """Renders the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        if snapshot["stages"]:
+            name = f"{prefix}_stage_duration_seconds"
+            lines += [f"# HELP {name} Duration of pipeline stages (quantiles over recent samples).",
+                      f"# TYPE {name} summary"]
+            for stage, values in sorted(snapshot["stages"].items()):
+                for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                    lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {values[key] / 1000:.6f}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {values["mean_ms"] * values["count"] / 1000:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {values["count"]}')
+        for counter, value in sorted(snapshot["counters"].items()):
+            lines += [f"# TYPE {prefix}_{counter}_total counter", f"{prefix}_{counter}_total {value}"]
+        for gauge, value in sorted(snapshot["gauges"].items()):
+            lines += [f"# TYPE {prefix}_{gauge} gauge", f"{prefix}_{gauge} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every module; set METRICS_ENABLED=0 to turn instrumentation off
+metrics = Metrics(enabled=os.getenv("METRICS_ENABLED", "1") != "0")
+
+_server = None
+
+
+def serve(port: int, host: str = "127.0.0.1", registry: Optional[Metrics] = None) -> ThreadingHTTPServer:
+    """
+    Serves /metrics (Prometheus text) and /metrics.json on a background
+    thread. Only one server runs per process; later calls return it.
+    """
+    global _server
+    if _server is not None:
+        return _server
+    registry = registry or metrics
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = registry.to_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    _server = ThreadingHTTPServer((host, port), Handler)
+    _server.daemon_threads = True
+    Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
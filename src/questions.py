@@ -0,0 +1,161 @@
+import difflib
+import re
+import time
+from typing import List, Optional
+
+# Words that start a direct question
+INTERROGATIVES = {
+    "what", "why", "how", "when", "where", "which", "who", "whom", "whose",
+    "can", "could", "would", "will", "do", "does", "did", "is", "are", "was", "were",
+    "should", "have", "has", "shall", "may", "might",
+}
+
+# Phrases that ask for an answer without being phrased as a question
+PROMPTS = (
+    "explain", "describe", "tell me", "tell us", "walk me through", "walk us through", "write",
+    "implement", "design", "compare", "give me", "give an example", "define", "talk about",
+    "talk me through", "show me", "list", "name", "what about", "how about",
+)
+
+# Small talk and acknowledgements that never need an answer
+FILLERS = {
+    "hmm", "hm", "mm", "mhm", "uh", "um", "uhm", "ah", "oh", "okay", "ok", "right", "yeah", "yes",
+    "no", "so", "well", "great", "cool", "nice", "thanks", "thank", "you", "alright", "sure", "good",
+    "got", "it", "i", "see", "perfect", "fine", "and", "let", "me", "think",
+}
+
+# Lead-ins skipped before looking for the question word ("so, what is ...")
+LEAD_INS = {"so", "okay", "ok", "well", "alright", "right", "and", "um", "uh", "hmm", "now", "next", "then", "great"}
+
+# A fragment ending in one of these is most likely cut off mid-sentence
+DANGLING = {
+    "and", "or", "but", "the", "a", "an", "of", "to", "between", "with", "for", "in", "on", "about",
+    "how", "what", "why", "is", "are", "your", "which", "explain", "describe", "through",
+    "would", "could", "can", "if", "when", "from", "into", "by",
+}
+
+# Phrases typical of coding problem statements (LeetCode-style prompts, take-home tasks)
+PROBLEM_KEYWORDS = (
+    "given", "return", "input", "output", "example", "constraints", "write a function", "implement",
+    "find the", "array", "string", "integer", "linked list", "binary tree", "graph", "o(n",
+    "time complexity", "def ", "class ", "function", "algorithm", "design a",
+)
+
+
+def looks_like_problem(text: str, min_hits: int = 3, min_length: int = 60) -> bool:
+    """Returns True if OCR'd screen text reads like a coding problem statement."""
+    if len(text) < min_length:
+        return False
+    lowered = text.lower()
+    return sum(1 for keyword in PROBLEM_KEYWORDS if keyword in lowered) >= min_hits
+
+
+def question_similarity(a: str, b: str) -> float:
+    """Word-level similarity of two transcripts (0 to 1), ignoring case and punctuation."""
+    words_a = re.findall(r"[a-z0-9']+", a.lower())
+    words_b = re.findall(r"[a-z0-9']+", b.lower())
+    if not words_a and not words_b:
+        return 1.0
+    return difflib.SequenceMatcher(None, words_a, words_b, autojunk=False).ratio()
+
+
+class DetectedSegment:
+    """A transcript segment (possibly several merged fragments) with its question confidence."""
+
+    def __init__(self, text: str, confidence: float, is_question: bool, fragments: int = 1):
+        self.text = text
+        self.confidence = confidence
+        self.is_question = is_question
+        self.fragments = fragments
+
+    def __repr__(self):
+        return f"DetectedSegment({self.text!r}, confidence={self.confidence:.2f}, is_question={self.is_question})"
+
+
+class QuestionDetector:
+    """
+    Lightweight, local question detection for transcript segments.
+    Fragments that look cut off (e.g. "Can you explain the") are held for up
+    to merge_window seconds and merged with the next segment, so a question
+    split by a pause reaches the LLM once, whole. Every segment gets a
+    confidence score; only those at or above threshold count as questions.
+    """
+
+    def __init__(self, threshold: float = 0.5, merge_window: float = 2.5):
+        self.threshold = threshold
+        self.merge_window = merge_window
+        self._pending = []
+        self._pending_since = None
+
+    @property
+    def has_pending(self) -> bool:
+        """True while a cut-off fragment is being held for merging."""
+        return bool(self._pending)
+
+    @staticmethod
+    def score(text: str) -> float:
+        """Returns how likely text is a question or request that needs an answer (0 to 1)."""
+        words = re.findall(r"[a-z']+", text.lower())
+        if not words:
+            return 0.0
+        if all(word in FILLERS for word in words):
+            return 0.0
+
+        lowered = " ".join(words)
+        start = 0
+        while start < len(words) - 1 and words[start] in LEAD_INS:
+            start += 1
+        score = 0.1
+        if text.rstrip().endswith("?"):
+            score += 0.5
+        # Recognizers often drop punctuation, so a question word alone has to be enough
+        if words[start] in INTERROGATIVES:
+            score += 0.45
+        if any(lowered.startswith(p) or f" {p} " in f" {lowered} " for p in PROMPTS):
+            score += 0.45
+        if len(words) < 3 and not text.rstrip().endswith("?"):
+            score *= 0.5
+        return min(score, 1.0)
+
+    @staticmethod
+    def looks_incomplete(text: str) -> bool:
+        stripped = text.rstrip()
+        if not stripped or stripped[-1] in "?.!":
+            return False
+        if stripped.endswith(",") or stripped.endswith("..."):
+            return True
+        words = re.findall(r"[a-z']+", stripped.lower())
+        return bool(words) and words[-1] in DANGLING
+
+    def feed(self, text: str, now: Optional[float] = None) -> List[DetectedSegment]:
+        """
+        Adds a transcript segment. Returns the segments that are complete,
+        which may include earlier held fragments merged with this one.
+        """
+        now = time.monotonic() if now is None else now
+        results = self.flush(now)
+        text = text.strip()
+        if not text:
+            return results
+
+        self._pending.append(text)
+        if self._pending_since is None:
+            self._pending_since = now
+        if not self.looks_incomplete(text):
+            results.append(self._emit())
+        return results
+
+    def flush(self, now: Optional[float] = None, force: bool = False) -> List[DetectedSegment]:
+        """Emits held fragments whose merge window has passed (or all of them with force)."""
+        now = time.monotonic() if now is None else now
+        if self._pending and (force or now - self._pending_since >= self.merge_window):
+            return [self._emit()]
+        return []
+
+    def _emit(self) -> DetectedSegment:
+        text = " ".join(self._pending)
+        fragments = len(self._pending)
+        self._pending = []
+        self._pending_since = None
+        confidence = self.score(text)
+        return DetectedSegment(text, confidence, confidence >= self.threshold, fragments)
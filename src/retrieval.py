@@ -0,0 +1,372 @@
+"""
+Local retrieval over personal documents (resume, project notes, study material).
+
+Documents are split into chunks of about a paragraph, embedded with a
+hashing embedder and stored in a memory-mapped vector index. Ingesting
+again only re-embeds files that changed. LLMClient adds the few chunks most
+relevant to each question to its prompt instead of whole documents.
+
+    python src/retrieval.py ingest resume.md notes/ -o knowledge/
+    python src/retrieval.py query knowledge/ "tell me about your last project"
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from collections import Counter
+from threading import RLock
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from metrics import metrics
+
+TEXT_EXTENSIONS = (".txt", ".md", ".markdown", ".rst", ".org", ".tex", ".csv", ".json", ".yaml", ".yml")
+
+# Too common to say anything about what a chunk is about
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "at", "for", "with", "by", "from", "as", "is",
+    "are", "was", "were", "be", "been", "it", "its", "this", "that", "these", "those", "i", "you", "we", "he",
+    "she", "they", "me", "my", "your", "our", "their", "do", "does", "did", "have", "has", "had", "can", "could",
+    "would", "will", "should", "what", "how", "why", "when", "where", "which", "who", "about", "so", "if", "then",
+    "than", "not", "no", "yes", "there", "here", "into", "also", "just", "tell", "explain", "describe",
+}
+
+
+class HashingEmbedder:
+    """
+    Embeds text without a model: words and word pairs (minus stopwords) are
+    hashed into dim buckets with a random sign, weighted 1 + log(count), and
+    the vector is L2-normalized, so a dot product is a cosine similarity of
+    the vocabulary two texts share. Fast enough to embed a question in
+    microseconds and stable across runs and processes.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    @staticmethod
+    def features(text: str) -> Counter:
+        words = [w.rstrip("s") if len(w) > 3 else w for w in re.findall(r"[a-z0-9+#]+", text.lower())]
+        words = [w for w in words if w not in STOPWORDS]
+        return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+    def embed(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = self.features(text)
+            if not counts:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in counts), dtype=np.uint32, count=len(counts))
+            weights = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+            signs = np.where(hashes & 0x80000000, np.float32(-1.0), np.float32(1.0))
+            np.add.at(vectors[row], hashes % self.dim, signs * weights)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def chunk_text(text: str, chunk_words: int = 120, overlap: int = 20) -> List[str]:
+    """
+    Packs paragraphs into chunks of up to chunk_words words. A paragraph
+    longer than that is cut into windows that overlap by overlap words.
+    """
+    chunks = []
+    current = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if len(words) > chunk_words:
+            if current:
+                chunks.append(" ".join(current))
+                current = []
+            step = max(1, chunk_words - overlap)
+            for start in range(0, len(words) - overlap, step):
+                chunks.append(" ".join(words[start:start + chunk_words]))
+            continue
+        if len(current) + len(words) > chunk_words:
+            chunks.append(" ".join(current))
+            current = []
+        current.extend(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def read_document(path: str) -> Optional[str]:
+    """Returns a document's text, or None if its format is not supported."""
+    lowered = path.lower()
+    if lowered.endswith(".pdf"):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            print(f"Skipping {path}: install pypdf to index PDF files.")
+            return None
+        return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    if lowered.endswith(TEXT_EXTENSIONS):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+    return None
+
+
+class Chunk:
+    """A retrieved passage with its source document and similarity score."""
+
+    def __init__(self, source: str, text: str, score: float):
+        self.source = source
+        self.text = text
+        self.score = score
+
+    def __repr__(self):
+        return f"Chunk({os.path.basename(self.source)!r}, score={self.score:.2f}, {self.text[:40]!r})"
+
+
+class VectorIndex:
+    """
+    Chunk embeddings in a directory: vectors.f32 (rows of dim float32,
+    memory-mapped for search), chunks.jsonl (source and text of each row)
+    and manifest.json (row count, indexed files and deleted rows).
+    Updates only append: a changed file's old rows are marked deleted and
+    its new chunks are added at the end, and the manifest is replaced last,
+    so a reader (or a crash) never sees half an update. compact() rewrites
+    the files without deleted rows. Search reloads the index when another
+    process has updated it.
+    """
+
+    def __init__(self, path: str, dim: int = 384, embedder: Optional[HashingEmbedder] = None):
+        self.path = path
+        self._manifest_path = os.path.join(path, "manifest.json")
+        self._manifest_version = None
+        # Sessions search from several threads while a reload swaps the arrays
+        self._lock = RLock()
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self._manifest_path):
+            self._load()
+            dim = self.manifest["dim"]
+        else:
+            self.manifest = {"dim": dim, "rows": 0, "chunks_bytes": 0, "sources": {}, "deleted": []}
+            self._texts, self._sources = [], []
+            self._vectors = np.zeros((0, dim), dtype=np.float32)
+            self._live = np.zeros(0, dtype=bool)
+        self.embedder = embedder or HashingEmbedder(dim)
+        if self.embedder.dim != dim:
+            raise ValueError(f"Index at {path} has dim {dim}, embedder has {self.embedder.dim}")
+
+    def __len__(self):
+        return int(self._live.sum())
+
+    @property
+    def sources(self) -> List[str]:
+        return sorted(self.manifest["sources"])
+
+    def fingerprint(self) -> str:
+        """Digest of the indexed files and their versions; changes whenever a document is added, changed or removed."""
+        self.refresh()
+        sources = {source: [entry.get("size"), entry.get("mtime_ns"), len(entry["rows"])]
+                   for source, entry in self.manifest["sources"].items()}
+        return hashlib.sha1(json.dumps(sources, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _load(self):
+        with self._lock:
+            self._read()
+
+    def _read(self):
+        self._manifest_version = self._version()
+        with open(self._manifest_path) as f:
+            self.manifest = manifest = json.load(f)
+        rows, dim = manifest["rows"], manifest["dim"]
+        if rows:
+            self._vectors = np.memmap(os.path.join(self.path, "vectors.f32"), dtype=np.float32, mode="r",
+                                      shape=(rows, dim))
+        else:
+            self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._texts, self._sources = [], []
+        if rows:
+            with open(os.path.join(self.path, "chunks.jsonl"), "rb") as f:
+                # Bytes past chunks_bytes belong to an update that never finished
+                for line in f.read(manifest["chunks_bytes"]).splitlines():
+                    entry = json.loads(line)
+                    self._sources.append(entry["source"])
+                    self._texts.append(entry["text"])
+        self._live = np.ones(rows, dtype=bool)
+        self._live[manifest["deleted"]] = False
+
+    def refresh(self):
+        """Reloads the index if the manifest changed on disk."""
+        try:
+            version = self._version()
+        except FileNotFoundError:
+            return
+        if version != self._manifest_version:
+            self._load()
+
+    def _version(self):
+        # Every update renames a new manifest into place, so the inode changes even within one mtime tick
+        stat = os.stat(self._manifest_path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def add_document(self, source: str, text: str, stat: Optional[os.stat_result] = None) -> int:
+        """Indexes text under source, replacing whatever was indexed for it before. Returns the chunk count."""
+        self.refresh()
+        chunks = chunk_text(text)
+        vectors = self.embedder.embed(chunks)
+        deleted = self.manifest["sources"].get(source, {}).get("rows", [])
+        rows = self.manifest["rows"]
+        vectors_path = os.path.join(self.path, "vectors.f32")
+        chunks_path = os.path.join(self.path, "chunks.jsonl")
+        with open(vectors_path, "ab") as f:
+            # Drop anything an interrupted update appended after the last manifest
+            f.truncate(rows * self.manifest["dim"] * 4)
+            f.write(vectors.tobytes())
+        with open(chunks_path, "ab") as f:
+            f.truncate(self.manifest["chunks_bytes"])
+            for chunk in chunks:
+                f.write((json.dumps({"source": source, "text": chunk}, ensure_ascii=False) + "\n").encode("utf-8"))
+            chunks_bytes = f.tell()
+
+        manifest = dict(self.manifest)
+        manifest["rows"] = rows + len(chunks)
+        manifest["chunks_bytes"] = chunks_bytes
+        manifest["deleted"] = sorted(set(manifest["deleted"]) | set(deleted))
+        manifest["sources"] = dict(manifest["sources"])
+        entry = {"rows": list(range(rows, rows + len(chunks)))}
+        if stat is not None:
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        manifest["sources"][source] = entry
+        self._write_manifest(manifest)
+        return len(chunks)
+
+    def remove(self, source: str):
+        self.refresh()
+        if source not in self.manifest["sources"]:
+            return
+        manifest = dict(self.manifest)
+        manifest["sources"] = dict(manifest["sources"])
+        rows = manifest["sources"].pop(source)["rows"]
+        manifest["deleted"] = sorted(set(manifest["deleted"]) | set(rows))
+        self._write_manifest(manifest)
+
+    def ingest(self, paths: Iterable[str], prune: bool = False) -> dict:
+        """
+        Indexes the documents at paths (files or directories, searched
+        recursively). Files unchanged since they were indexed are skipped.
+        With prune, indexed files that no longer exist are removed.
+        Returns counts of added, updated, unchanged and removed files and chunks.
+        """
+        self.refresh()
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "chunks": 0}
+        for path in _walk(paths):
+            source = os.path.abspath(path)
+            stat = os.stat(source)
+            known = self.manifest["sources"].get(source)
+            if known is not None and known.get("size") == stat.st_size and known.get("mtime_ns") == stat.st_mtime_ns:
+                stats["unchanged"] += 1
+                continue
+            text = read_document(source)
+            if text is None:
+                continue
+            stats["chunks"] += self.add_document(source, text, stat)
+            stats["updated" if known is not None else "added"] += 1
+        if prune:
+            for source in list(self.manifest["sources"]):
+                if not os.path.exists(source):
+                    self.remove(source)
+                    stats["removed"] += 1
+        if len(self.manifest["deleted"]) > max(1000, self.manifest["rows"] // 4):
+            self.compact()
+        return stats
+
+    def compact(self):
+        """Rewrites the index without deleted rows."""
+        self.refresh()
+        keep = np.flatnonzero(self._live)
+        vectors = np.asarray(self._vectors[keep], dtype=np.float32)
+        new_rows = {int(old): new for new, old in enumerate(keep)}
+        with open(os.path.join(self.path, "vectors.f32.tmp"), "wb") as f:
+            f.write(vectors.tobytes())
+        with open(os.path.join(self.path, "chunks.jsonl.tmp"), "wb") as f:
+            for old in keep:
+                entry = {"source": self._sources[old], "text": self._texts[old]}
+                f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            chunks_bytes = f.tell()
+        manifest = dict(self.manifest, rows=len(keep), chunks_bytes=chunks_bytes, deleted=[])
+        manifest["sources"] = {
+            source: dict(entry, rows=[new_rows[row] for row in entry["rows"]])
+            for source, entry in self.manifest["sources"].items()
+        }
+        # Readers that still have the old files mapped keep reading them until they reload
+        for name in ("vectors.f32", "chunks.jsonl"):
+            os.replace(os.path.join(self.path, name + ".tmp"), os.path.join(self.path, name))
+        self._write_manifest(manifest)
+
+    def _write_manifest(self, manifest: dict):
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path)
+        self._load()
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.1) -> List[Chunk]:
+        """Returns up to k chunks most similar to query, best first, skipping those below min_score."""
+        with self._lock, metrics.span("retrieval"):
+            self.refresh()
+            if not len(self._vectors):
+                return []
+            scores = self._vectors @ self.embedder.embed([query])[0]
+            scores[~self._live] = -1.0
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [Chunk(self._sources[i], self._texts[i], float(scores[i])) for i in top if scores[i] >= min_score]
+
+
+def _walk(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index personal documents for grounded answers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="Add or update documents in the index")
+    ingest_parser.add_argument("paths", nargs="+", help="Files or directories (searched recursively)")
+    ingest_parser.add_argument("-o", "--index", default=os.getenv("KNOWLEDGE_INDEX_PATH", "knowledge"),
+                               help="Index directory (default: KNOWLEDGE_INDEX_PATH or knowledge)")
+    ingest_parser.add_argument("--prune", action="store_true", help="Remove indexed files that no longer exist")
+    ingest_parser.add_argument("--compact", action="store_true", help="Rewrite the index without deleted chunks")
+    query_parser = commands.add_parser("query", help="Show the chunks retrieved for a question")
+    query_parser.add_argument("index", help="Index directory")
+    query_parser.add_argument("question")
+    query_parser.add_argument("-k", type=int, default=3, help="Chunks to retrieve")
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        index = VectorIndex(args.index)
+        start = time.perf_counter()
+        chunks = index.search(args.question, k=args.k, min_score=0.0)
+        print(f"{len(index)} chunks searched in {(time.perf_counter() - start) * 1000:.2f} ms")
+        for chunk in chunks:
+            print(f"\n{chunk.score:.2f} {chunk.source}\n{chunk.text}")
+        return 0
+
+    index = VectorIndex(args.index)
+    stats = index.ingest(args.paths, prune=args.prune)
+    if args.compact:
+        index.compact()
+    print(f"{stats['added']} added, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+          f"{stats['removed']} removed ({stats['chunks']} new chunks, {len(index)} in the index)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
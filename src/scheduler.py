@@ -0,0 +1,232 @@
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Event
+from typing import Callable, Iterator, Optional
+
+from metrics import metrics
+
+
+class _Flight:
+    """One generation, possibly shared by several tickets asking the same question."""
+
+    def __init__(self, session_id: str, key: Optional[str], generate: Callable[[], Iterator[str]]):
+        self.session_id = session_id
+        self.key = key
+        self.generate = generate
+        self.chunks = []
+        self.subscribers = 0
+        self.started = False
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.queued_at = time.monotonic()
+
+
+class Ticket:
+    """A session's place in the scheduler. Iterate stream() for the answer chunks."""
+
+    def __init__(self, scheduler: "InferenceScheduler", flight: _Flight, session_id: str, joined: bool,
+                 cancel_event: Optional[Event]):
+        self._scheduler = scheduler
+        self._flight = flight
+        self.session_id = session_id
+        # True if this ticket was coalesced into a generation another ticket started
+        self.joined = joined
+        self.cancel_event = cancel_event or Event()
+        self._released = False
+
+    @property
+    def started(self) -> bool:
+        return self._flight.started
+
+    def position(self) -> Optional[int]:
+        """Generations that will start before this one (0 = next), or None once it has started."""
+        return self._scheduler.position(self)
+
+    def expected_wait(self) -> float:
+        """Rough seconds until this generation starts, from recent generation times."""
+        return self._scheduler.expected_wait(self)
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.release()
+
+    def stream(self) -> Iterator[str]:
+        """Yields the generation's chunks as they arrive, starting from the first one."""
+        flight = self._flight
+        condition = self._scheduler._condition
+        index = 0
+        try:
+            while True:
+                with condition:
+                    # The timeout lets a cancel_event set from elsewhere be noticed while queued
+                    condition.wait_for(lambda: len(flight.chunks) > index or flight.done or self.cancel_event.is_set(),
+                                       timeout=0.2)
+                    if self.cancel_event.is_set():
+                        return
+                    chunks = flight.chunks[index:]
+                    done = flight.done
+                index += len(chunks)
+                yield from chunks
+                if done and index >= len(flight.chunks):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            self.release()
+
+    def release(self):
+        """Stops waiting for the answer; safe to call more than once."""
+        if not self._released:
+            self._released = True
+            self._scheduler._unsubscribe(self._flight)
+
+
+class InferenceScheduler:
+    """
+    Process-wide gate in front of the LLM, shared by all app sessions.
+    At most max_concurrent generations run at once. Sessions take turns
+    (round robin), and within a session the newest question goes first.
+    Questions submitted with the same key while a generation for it is
+    queued or running share that generation (single-flight) instead of
+    starting another one. A generation nobody is waiting for any more is
+    dropped from the queue, or stopped if it is running.
+    """
+
+    def __init__(self, max_concurrent: int = 2):
+        self.max_concurrent = max_concurrent
+        self._condition = Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="llm-scheduler")
+        self._queues = OrderedDict()  # session_id -> deque of queued flights, newest last
+        self._flights = {}  # key -> queued or running flight
+        self.running = 0
+        self.coalesced = 0
+        # Moving average of generation time, for expected waits
+        self.average_duration = 5.0
+
+    def submit(self, session_id: str, generate: Callable[[], Iterator[str]], key: Optional[str] = None,
+               cancel_event: Optional[Event] = None) -> Ticket:
+        """
+        Queues generate (a callable returning a chunk iterator) for session_id.
+        key identifies identical questions for coalescing; None never coalesces.
+        """
+        with self._condition:
+            flight = self._flights.get(key) if key is not None else None
+            joined = flight is not None and not flight.cancelled
+            if joined:
+                self.coalesced += 1
+                metrics.incr("scheduler_coalesced")
+            else:
+                flight = _Flight(session_id, key, generate)
+                if key is not None:
+                    self._flights[key] = flight
+                self._queues.setdefault(session_id, deque()).append(flight)
+            flight.subscribers += 1
+            ticket = Ticket(self, flight, session_id, joined, cancel_event)
+            self._dispatch()
+        return ticket
+
+    def position(self, ticket: Ticket) -> Optional[int]:
+        with self._condition:
+            if ticket._flight.started or ticket._flight.done:
+                return None
+            for position, flight in enumerate(self._dispatch_order()):
+                if flight is ticket._flight:
+                    return position
+            return None
+
+    def expected_wait(self, ticket: Ticket) -> float:
+        position = self.position(ticket)
+        if position is None:
+            return 0.0
+        with self._condition:
+            free = self.max_concurrent - self.running
+            if position < free:
+                return 0.0
+            rounds = (position - free) // self.max_concurrent + 1
+            return rounds * self.average_duration
+
+    def queue_depth(self) -> int:
+        with self._condition:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def shutdown(self):
+        with self._condition:
+            for queue in self._queues.values():
+                for flight in queue:
+                    flight.cancelled = True
+                    flight.done = True
+            self._queues.clear()
+            self._condition.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch_order(self):
+        """Queued flights in the order they would start: sessions in turn, newest question first."""
+        queues = [list(queue) for queue in self._queues.values()]
+        order = []
+        depth = 1
+        while any(len(queue) >= depth for queue in queues):
+            order.extend(queue[-depth] for queue in queues if len(queue) >= depth)
+            depth += 1
+        return order
+
+    def _dispatch(self):
+        """Starts queued flights while slots are free. Called with the condition held."""
+        while self.running < self.max_concurrent and self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            flight = queue.pop()
+            # The session moves to the back of the line (or leaves it if it has nothing else queued)
+            del self._queues[session_id]
+            if queue:
+                self._queues[session_id] = queue
+            flight.started = True
+            self.running += 1
+            metrics.observe("scheduler_wait", time.monotonic() - flight.queued_at)
+            self._executor.submit(self._run, flight)
+        metrics.set_gauge("scheduler_queue_depth", sum(len(queue) for queue in self._queues.values()))
+
+    def _run(self, flight: _Flight):
+        started = time.monotonic()
+        try:
+            stream = flight.generate()
+            try:
+                for chunk in stream:
+                    if flight.cancelled:
+                        break
+                    with self._condition:
+                        flight.chunks.append(chunk)
+                        self._condition.notify_all()
+            finally:
+                if hasattr(stream, "close"):
+                    stream.close()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._condition:
+                self.running -= 1
+                if not flight.cancelled:
+                    self.average_duration = 0.8 * self.average_duration + 0.2 * (time.monotonic() - started)
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+                flight.done = True
+                self._condition.notify_all()
+                self._dispatch()
+
+    def _unsubscribe(self, flight: _Flight):
+        with self._condition:
+            flight.subscribers -= 1
+            if flight.subscribers > 0 or flight.done:
+                return
+            # Nobody wants this answer any more
+            flight.cancelled = True
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            if not flight.started:
+                queue = self._queues.get(flight.session_id)
+                if queue is not None and flight in queue:
+                    queue.remove(flight)
+                    if not queue:
+                        del self._queues[flight.session_id]
+                flight.done = True
+            self._condition.notify_all()
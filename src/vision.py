@@ -1,23 +1,153 @@
-import mss
-import mss.tools
-from PIL import Image
-import pytesseract
+import hashlib
+import multiprocessing
+import shutil
+from functools import lru_cache
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from threading import Event, Lock, Thread
 import platform
 import os
+from lazy import lazy_import
+from metrics import metrics
+from questions import looks_like_problem
+
+# Loaded on first use: pytesseract alone pulls in pandas
+mss = lazy_import("mss")
+pytesseract = lazy_import("pytesseract")
+Image = lazy_import("PIL.Image")
+
+# Process pool shared by all ScreenCapturers in this process, created on first use
+_ocr_pool = None
+
+
+def _get_ocr_pool():
+    global _ocr_pool
+    if _ocr_pool is None:
+        # spawn rather than fork: the app process runs many threads
+        _ocr_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 2,
+                                        mp_context=multiprocessing.get_context("spawn"))
+    return _ocr_pool
+
+
+def preprocess(frame, scale=None):
+    """
+    Turns a BGRA frame (height, width, 4) into a binary image for OCR:
+    dark text (0) on a white background (255), whatever the screen's theme.
+    Works on channel views of the capture buffer, so the only full-size
+    copies are the grayscale and binary images themselves.
+    scale is an integer downscale factor; by default frames wider than
+    2560 px (4K, retina) are halved, which Tesseract reads just as well.
+    """
+    if scale is None:
+        scale = 2 if frame.shape[1] > 2560 else 1
+
+    # Integer luma (ITU-R BT.601 weights / 256) straight from the B, G, R channel views.
+    # dtype widens the products to 16 bits whatever NumPy's scalar casting rules (1.x keeps uint8 and wraps)
+    gray = np.multiply(frame[:, :, 0], 29, dtype=np.uint16)
+    gray += np.multiply(frame[:, :, 1], 150, dtype=np.uint16)
+    gray += np.multiply(frame[:, :, 2], 77, dtype=np.uint16)
+    gray >>= 8
+    if scale > 1:
+        height = gray.shape[0] // scale * scale
+        width = gray.shape[1] // scale * scale
+        gray = gray[:height, :width].reshape(height // scale, scale, width // scale, scale).mean(axis=(1, 3))
+    gray = gray.astype(np.uint8)
+
+    # Otsu threshold from the histogram
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_low = np.cumsum(hist)
+    weight_high = weight_low[-1] - weight_low
+    mean_low = np.cumsum(hist * levels) / np.maximum(weight_low, 1)
+    mean_high = ((hist * levels).sum() - np.cumsum(hist * levels)) / np.maximum(weight_high, 1)
+    threshold = int(np.argmax(weight_low * weight_high * (mean_low - mean_high) ** 2))
+
+    light = gray > threshold
+    # The background is whichever class covers most of the screen; text is the other
+    if np.count_nonzero(light) >= light.size / 2:
+        ink = ~light
+    else:
+        ink = light
+    return np.where(ink, np.uint8(0), np.uint8(255))
+
+
+def _runs(mask, min_gap):
+    """Returns (start, end) runs of True in a 1-D mask, merging runs separated by fewer than min_gap Falses."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    runs = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if runs and start - runs[-1][1] < min_gap:
+            runs[-1] = (runs[-1][0], int(end))
+        else:
+            runs.append((int(start), int(end)))
+    return runs
+
+
+def find_text_blocks(binary, row_gap=12, col_gap=40, pad=4, min_height=6):
+    """
+    Finds text blocks in a binary image using ink projections: rows are split
+    into bands at blank gaps of at least row_gap pixels, then each band into
+    blocks at blank column gaps of at least col_gap (wider than word spacing).
+    Returns (top, left, bottom, right) boxes in reading order.
+    """
+    ink = binary == 0
+    height, width = ink.shape
+    blocks = []
+    for top, bottom in _runs(ink.any(axis=1), row_gap):
+        if bottom - top < min_height:
+            continue
+        for left, right in _runs(ink[top:bottom].any(axis=0), col_gap):
+            blocks.append((max(0, top - pad), max(0, left - pad), min(height, bottom + pad), min(width, right + pad)))
+    return blocks
+
+
+@lru_cache(maxsize=None)
+def tesseract_available() -> bool:
+    """Whether the tesseract binary is on PATH. Probed once per process."""
+    return shutil.which("tesseract") is not None
+
+
+def _ocr_block(block):
+    """OCRs one binary block. Module level so it can run in the process pool."""
+    return pytesseract.image_to_string(Image.fromarray(block, "L")).strip()
+
 
 class ScreenCapturer:
-    def __init__(self):
-        # Check if tesseract is available
-        self.tesseract_available = False
-        try:
-            # Simple check if tesseract is in path or callable
-            # We assume it is if installed.
-            # In a real app we might want to shutil.which("tesseract")
-            import shutil
-            if shutil.which("tesseract"):
-                self.tesseract_available = True
-        except Exception:
-            pass
+    def __init__(self, cache_size=64, ocr_workers=None, scale=None, ocr_executor=None, notifier=None):
+        self.tesseract_available = tesseract_available()
+
+        # Frames are binarized and split into text blocks, which are OCR'd in
+        # parallel and reassembled in reading order. OCR results are cached by
+        # content fingerprint for whole frames and for blocks: an unchanged screen
+        # is answered from the cache and only blocks that changed since an earlier
+        # capture are re-OCR'd.
+        self.cache_size = cache_size
+        self.ocr_workers = ocr_workers if ocr_workers is not None else (os.cpu_count() or 1)
+        self.scale = scale
+        # Defaults to the shared process pool
+        self._ocr_executor = ocr_executor
+        self._frame_cache = OrderedDict()
+        self._block_cache = OrderedDict()
+        self._previous_blocks = set()
+        # Boxes of the text blocks that differed from the previous OCR'd capture
+        self.changed_blocks = []
+        self.frame_cache_hits = 0
+        self.blocks_reused = 0
+        self.blocks_ocrd = 0
+        # read_frame is shared by manual captures and the watch thread
+        self._ocr_lock = Lock()
+
+        # Watch mode
+        # Optional UpdateNotifier, published to when the watcher finds a new problem
+        self.notifier = notifier
+        self.watching = False
+        self.watch_error = None
+        self._watch_stop = Event()
+        self._watch_results = deque(maxlen=10)
+        self.watch_samples = 0
+        self.watch_ocr_runs = 0
 
     def capture_and_read(self):
         """
@@ -31,15 +161,176 @@ class ScreenCapturer:
             with mss.mss() as sct:
                 # Capture the primary monitor
                 monitor = sct.monitors[1]
-                screenshot = sct.grab(monitor)
-
-                # Convert to PIL Image
-                img = Image.frombytes("RGB", screenshot.size, screenshot.bgra, "raw", "BGRX")
+                with metrics.span("screen_grab"):
+                    screenshot = sct.grab(monitor)
 
                 if self.tesseract_available:
-                    text = pytesseract.image_to_string(img)
-                    return text.strip()
+                    # View the BGRA buffer as an array (height, width, 4) without copying
+                    width, height = screenshot.size
+                    frame = np.frombuffer(screenshot.bgra, dtype=np.uint8).reshape(height, width, 4)
+                    return self.read_frame(frame)
                 else:
                     return "[Error] Tesseract OCR not installed on system. Cannot read screen text."
         except Exception as e:
             return f"[Error] Screen capture failed: {e}"
+
+    def start_watching(self, interval=1.0, stable_samples=2, change_threshold=1.5, sample_step=8,
+                       is_problem=looks_like_problem):
+        """
+        Starts watching the screen in the background. Every interval seconds a
+        downscaled sample (every sample_step-th pixel of one channel) is compared
+        with the previous one. OCR only runs once the screen has changed and then
+        stayed stable for stable_samples samples; new text that is_problem accepts
+        is queued for get_watch_results. Returns False if watching is impossible.
+        """
+        if self.watching:
+            return True
+        if platform.system() == "Linux" and not os.environ.get("DISPLAY"):
+            self.watch_error = "Cannot watch screen: No DISPLAY environment variable found (Headless Mode)."
+            return False
+        if not self.tesseract_available:
+            self.watch_error = "Tesseract OCR not installed on system. Cannot read screen text."
+            return False
+
+        self.watch_error = None
+        self.watching = True
+        self._watch_stop.clear()
+        self._watch_thread = Thread(
+            target=self._watch_loop, args=(interval, stable_samples, change_threshold, sample_step, is_problem),
+            daemon=True)
+        self._watch_thread.start()
+        return True
+
+    def stop_watching(self):
+        self.watching = False
+        self._watch_stop.set()
+        if hasattr(self, '_watch_thread'):
+            self._watch_thread.join()
+
+    def get_watch_results(self):
+        """Returns problem texts found by the watcher since the last call, without blocking."""
+        results = []
+        while self._watch_results:
+            results.append(self._watch_results.popleft())
+        return results
+
+    def _watch_loop(self, interval, stable_samples, change_threshold, sample_step, is_problem):
+        previous = None
+        settling = True  # the screen changed and has not been OCR'd since
+        stable = 0
+        last_text = ""
+        try:
+            with mss.mss() as sct:
+                monitor = sct.monitors[1]
+                while not self._watch_stop.wait(interval):
+                    with metrics.span("screen_grab"):
+                        screenshot = sct.grab(monitor)
+                    width, height = screenshot.size
+                    frame = np.frombuffer(screenshot.bgra, dtype=np.uint8).reshape(height, width, 4)
+                    self.watch_samples += 1
+
+                    # Only this small sample is kept between iterations
+                    sample = frame[::sample_step, ::sample_step, 1].astype(np.int16)
+                    changed = previous is None or previous.shape != sample.shape or \
+                        float(np.abs(sample - previous).mean()) > change_threshold
+                    previous = sample
+                    if changed:
+                        settling = True
+                        stable = 0
+                        continue
+                    if not settling:
+                        continue
+                    stable += 1
+                    if stable < stable_samples:
+                        continue
+
+                    settling = False
+                    self.watch_ocr_runs += 1
+                    text = self.read_frame(frame)
+                    if text and text != last_text and is_problem(text):
+                        last_text = text
+                        self._watch_results.append(text)
+                        if self.notifier is not None:
+                            self.notifier.publish()
+        except Exception as e:
+            self.watch_error = f"Screen watch failed: {e}"
+            print(self.watch_error)
+        finally:
+            self.watching = False
+
+    def read_frame(self, frame):
+        """
+        Returns the OCR text of a BGRA frame (height, width, 4), reusing cached
+        results for an identical frame or for blocks that have not changed.
+        """
+        with self._ocr_lock, metrics.span("ocr"):
+            return self._read_frame(frame)
+
+    def _read_frame(self, frame):
+        fingerprint = self._fingerprint(frame)
+        cached = self._cache_get(self._frame_cache, fingerprint)
+        if cached is not None:
+            self.frame_cache_hits += 1
+            metrics.incr("ocr_frame_cache_hits")
+            return cached
+
+        with metrics.span("ocr_preprocess"):
+            binary = preprocess(frame, self.scale)
+        texts = []
+        missing = {}  # block fingerprint -> (block pixels, indexes into texts)
+        blocks = set()
+        self.changed_blocks = []
+        for box in find_text_blocks(binary):
+            top, left, bottom, right = box
+            block = binary[top:bottom, left:right]
+            block_fingerprint = self._fingerprint(block)
+            blocks.add(block_fingerprint)
+            if block_fingerprint not in self._previous_blocks:
+                self.changed_blocks.append(box)
+            text = self._cache_get(self._block_cache, block_fingerprint)
+            if text is None:
+                missing.setdefault(block_fingerprint, (block, []))[1].append(len(texts))
+            else:
+                self.blocks_reused += 1
+                metrics.incr("ocr_blocks_reused")
+            texts.append(text)
+
+        if missing:
+            keys = list(missing)
+            pixels = [np.ascontiguousarray(missing[key][0]) for key in keys]
+            for key, text in zip(keys, self._ocr_blocks(pixels)):
+                self._cache_put(self._block_cache, key, text, self.cache_size * 16)
+                for index in missing[key][1]:
+                    texts[index] = text
+            self.blocks_ocrd += len(keys)
+            metrics.incr("ocr_blocks_ocrd", len(keys))
+
+        self._previous_blocks = blocks
+        text = "\n".join(t for t in texts if t).strip()
+        self._cache_put(self._frame_cache, fingerprint, text, self.cache_size)
+        return text
+
+    def _ocr_blocks(self, blocks):
+        if len(blocks) == 1 or self.ocr_workers <= 1:
+            return [_ocr_block(block) for block in blocks]
+        executor = self._ocr_executor or _get_ocr_pool()
+        # Largest blocks first so the slowest work starts earliest
+        order = sorted(range(len(blocks)), key=lambda i: blocks[i].size, reverse=True)
+        futures = {i: executor.submit(_ocr_block, blocks[i]) for i in order}
+        return [futures[i].result() for i in range(len(blocks))]
+
+    @staticmethod
+    def _fingerprint(pixels):
+        return hashlib.blake2b(np.ascontiguousarray(pixels).data, digest_size=16).digest()
+
+    def _cache_get(self, cache, key):
+        text = cache.get(key)
+        if text is not None:
+            cache.move_to_end(key)
+        return text
+
+    def _cache_put(self, cache, key, text, max_size):
+        cache[key] = text
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
@@ -0,0 +1,336 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from typing import Optional
+
+from metrics import metrics
+from questions import QuestionDetector, question_similarity
+
+
+class AnswerJob:
+    """A single answer generation. Text grows as chunks arrive from the LLM."""
+
+    def __init__(self, generation: int, question: str, speculative: bool = False):
+        self.generation = generation
+        self.question = question
+        # A draft started from a partial transcript, until a final question adopts it
+        self.speculative = speculative
+        self.adopted_question = None
+        self.draft_answer = None
+        self.chunks = 0
+        self.text = ""
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self.cancel_event = Event()
+        self.done_event = Event()
+        # Scheduler ticket while the job waits for (or shares) a generation
+        self.ticket = None
+        # BankMatch whose precomputed answer is shown while a fresh one is generated
+        self.bank_match = None
+        # "draft" while the draft model's quick answer is shown until the main model's replaces it
+        self.route = "strong"
+        # Notes retrieved for the question, sent with all of its generations and stored with its answer
+        self.notes = None
+
+    @property
+    def done(self) -> bool:
+        return self.done_event.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+
+class AnswerWorker:
+    """
+    Generates answers on a background thread pool owned by the session.
+    Only the newest question matters: submitting a question cancels any
+    generation still running for an older one, and the UI only reads the
+    current job (when notified, if a notifier is given).
+    With a scheduler, generations go through the process-wide
+    InferenceScheduler under session_id instead of straight to the LLM.
+    With speculative=True, speculate() starts a draft answer from a partial
+    transcript that already reads like a question. When the final question
+    is submitted, the draft is kept if the two match by at least match_ratio
+    (word-level difflib ratio) and cancelled and replaced otherwise. Drafts
+    that are thrown away are counted so the thresholds can be tuned.
+    With an AnswerBank, a question matching a precomputed answer shows it
+    at once; with refine_bank_answers a fresh answer is generated alongside
+    and replaces it when complete.
+    Questions the LLM routes to its draft model work the same way: the
+    draft model's answer streams in while the main model generates its own,
+    which replaces the draft when complete.
+    """
+
+    def __init__(self, llm, max_workers: int = 2, notifier=None, scheduler=None, session_id: str = "default",
+                 speculative: bool = False, speculation_threshold: float = 0.5, match_ratio: float = 0.8,
+                 min_speculation_words: int = 4, bank=None, refine_bank_answers: bool = True):
+        self.llm = llm
+        self.bank = bank
+        self.refine_bank_answers = refine_bank_answers
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.speculative = speculative
+        self.speculation_threshold = speculation_threshold
+        self.match_ratio = match_ratio
+        self.min_speculation_words = min_speculation_words
+        self.speculations = 0
+        self.speculation_hits = 0
+        self.speculation_misses = 0
+        self.wasted_chunks = 0
+        # Optional UpdateNotifier, published to on every new chunk and when a job finishes
+        self.notifier = notifier
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="answer-worker")
+        self._lock = Lock()
+        self._generation = 0
+        self._current: Optional[AnswerJob] = None
+        self.cancelled_count = 0
+        # Seconds to wait for a draft to finish when the main model's answer failed
+        self.draft_timeout = 30.0
+
+    def submit(self, question: str, source: str = "audio") -> AnswerJob:
+        """
+        Starts generating an answer for the question, superseding any older one.
+        Returns the running draft instead if it was speculated from a close enough partial.
+        source is "audio" or "screen" and lets the LLM route coding problems to its main model.
+        """
+        adopted = draft = None
+        with self._lock:
+            current = self._current
+            if current is not None and current.speculative:
+                if not current.cancelled and current.error is None \
+                        and question_similarity(question, current.question) >= self.match_ratio:
+                    current.speculative = False
+                    current.adopted_question = question
+                    current.submitted_at = time.monotonic()
+                    self.speculation_hits += 1
+                    metrics.incr("speculation_adopted")
+                    adopted, draft = current, current.draft_answer
+                else:
+                    self._discard_draft(current)
+            if adopted is None:
+                self._generation += 1
+                if current is not None and not current.done and not current.cancelled:
+                    current.cancel_event.set()
+                    self.cancelled_count += 1
+                job = AnswerJob(self._generation, question)
+                if self.bank is not None:
+                    job.bank_match = self.bank.lookup(question)
+                    if job.bank_match is not None:
+                        job.text = job.bank_match.answer
+                if job.bank_match is None:
+                    job.route = self.llm.route(question, source)
+                self._current = job
+        if adopted is not None:
+            if draft is not None:
+                # The draft finished before the interviewer did
+                self.llm.store_answer(question, draft, adopted.notes)
+            if adopted.done:
+                metrics.observe("answer_job", 0.0)
+            self._notify()
+            return adopted
+        if job.bank_match is not None and not self.refine_bank_answers:
+            self.llm.remember(question, job.text)
+            metrics.observe("answer_job", 0.0)
+            job.finished_at = time.monotonic()
+            job.done_event.set()
+            self._notify()
+            return job
+        self._executor.submit(self._run, job)
+        return job
+
+    def speculate(self, partial: str) -> Optional[AnswerJob]:
+        """
+        Starts a draft answer for a partial transcript if it already reads like
+        a complete question. Returns the draft being generated, or None.
+        A draft for a similar partial keeps running; a different one replaces it.
+        An answer to a question that has already been submitted is never cancelled.
+        """
+        if not self.speculative or len(partial.split()) < self.min_speculation_words:
+            return None
+        if QuestionDetector.looks_incomplete(partial) or QuestionDetector.score(partial) < self.speculation_threshold:
+            return None
+        with self._lock:
+            current = self._current
+            if current is not None and not current.speculative and not current.done:
+                return None
+            if current is not None and current.speculative:
+                if not current.cancelled and question_similarity(partial, current.question) >= self.match_ratio:
+                    return current
+                self._discard_draft(current)
+            self._generation += 1
+            job = AnswerJob(self._generation, partial, speculative=True)
+            self._current = job
+            self.speculations += 1
+        metrics.incr("speculation_started")
+        self._executor.submit(self._run, job)
+        return job
+
+    def _discard_draft(self, job: AnswerJob):
+        """Cancels a draft nobody adopted and counts it as waste. Called with the lock held."""
+        job.cancel_event.set()
+        self.speculation_misses += 1
+        self.wasted_chunks += job.chunks
+        metrics.incr("speculation_wasted")
+        metrics.incr("speculation_wasted_chunks", job.chunks)
+
+    def _draft_finished(self, job: AnswerJob, answer: str):
+        """Called when a draft's model answer is complete; stores it once a question has adopted it."""
+        with self._lock:
+            job.draft_answer = answer
+            question = job.adopted_question
+        if question is not None:
+            self.llm.store_answer(question, answer, job.notes)
+
+    def poll(self) -> Optional[AnswerJob]:
+        """Returns the job for the newest question (finished or still streaming), if any."""
+        return self._current
+
+    @property
+    def busy(self) -> bool:
+        job = self._current
+        return job is not None and not job.done
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[AnswerJob]:
+        """Blocks until the newest job has finished. Mostly useful for scripts and tests."""
+        job = self._current
+        if job is not None:
+            job.done_event.wait(timeout)
+        return job
+
+    def shutdown(self):
+        """Cancels the running job and stops the worker threads."""
+        with self._lock:
+            if self._current is not None:
+                self._current.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: AnswerJob):
+        # Guards job.text while a draft model thread streams into it
+        draft_lock = Lock()
+        # Stops the draft model's generation, queued or running, once it is no longer needed
+        draft_stop = Event()
+        try:
+            # Dropped before it even started: a newer question is already queued
+            if job.cancelled:
+                return
+            llm = self.llm
+            speculative = job.speculative
+            # Retrieved once, so the prompt, the coalescing key and the cache entry agree on the notes
+            job.notes = notes = llm.retrieve(job.question)
+            # A bank answer (or the draft model's) is showing; the fresh one replaces it only if it completes
+            two_tier = job.route == "draft"
+            refining = job.bank_match is not None or two_tier
+            refined = []
+            # The main model's chunks, kept to report its error if there is no draft to fall back on
+            strong_chunks = []
+            drafting = None
+            if two_tier:
+                metrics.incr("two_tier_drafts")
+                if self.scheduler is not None:
+                    # Submitted first, so a single free slot goes to the quick draft; never coalesced
+                    draft_ticket = self.scheduler.submit(self.session_id, lambda: llm.stream_draft(job.question, notes),
+                                                         key=None, cancel_event=draft_stop)
+                    draft_stream = draft_ticket.stream()
+                else:
+                    draft_stream = llm.stream_draft(job.question, notes)
+                drafting = Thread(target=self._stream_draft, args=(job, draft_stream, draft_lock),
+                                  name="answer-draft", daemon=True)
+                drafting.start()
+            if speculative:
+                # The draft's answer is only stored once a final question adopts it
+                def generate():
+                    return llm.stream_answer(job.question, on_complete=lambda answer: self._draft_finished(job, answer),
+                                             notes=notes)
+            elif refining:
+                def generate():
+                    return llm.stream_answer(job.question, on_complete=refined.append, notes=notes)
+            else:
+                def generate():
+                    return llm.stream_answer(job.question, notes=notes)
+            if self.scheduler is not None:
+                # Drafts and refinements never share a generation: theirs is not stored like a normal answer
+                key = None if speculative or refining else llm.coalesce_key(job.question, notes)
+                job.ticket = self.scheduler.submit(self.session_id, generate, key=key, cancel_event=job.cancel_event)
+                # Lets the UI show the queue position
+                self._notify()
+                stream = job.ticket.stream()
+            else:
+                stream = generate()
+            try:
+                for chunk in stream:
+                    if job.cancelled:
+                        break
+                    job.chunks += 1
+                    if not refining:
+                        job.text += chunk
+                        self._notify()
+                    elif two_tier:
+                        strong_chunks.append(chunk)
+            finally:
+                # Closing the generator closes the HTTP stream so Ollama stops generating
+                stream.close()
+                if job.ticket is not None:
+                    job.ticket.release()
+                if job.cancelled or refined:
+                    draft_stop.set()
+            if two_tier and not job.cancelled:
+                if refined:
+                    with draft_lock:
+                        # Stops the draft; its thread closes the stream at its next chunk
+                        job.route = "strong"
+                        job.text = refined[0]
+                    llm.store_answer(job.question, job.text, notes)
+                else:
+                    # The main model failed: the draft stands once it is complete
+                    drafting.join(timeout=self.draft_timeout)
+                    with draft_lock:
+                        finished = not drafting.is_alive()
+                        draft_stop.set()
+                        job.route = "strong"
+                        drafted = bool(job.text.strip())
+                        if not drafted:
+                            job.text = "".join(strong_chunks)
+                    # A draft cut short by the timeout is shown but not added to the conversation
+                    if drafted and finished:
+                        llm.remember(job.question, job.text)
+            elif refining and not job.cancelled:
+                if refined:
+                    job.text = refined[0]
+                    llm.store_answer(job.question, job.text, notes)
+                else:
+                    # Ollama is unreachable or failed: the bank answer stands
+                    llm.remember(job.question, job.text)
+            job.text = job.text.strip()
+            if job.ticket is not None and job.ticket.joined and not job.cancelled and llm.connected:
+                # The shared generation was started by another session's client
+                llm.remember(job.question, job.text)
+            if not job.cancelled and not job.speculative:
+                metrics.observe("answer_job", time.monotonic() - job.submitted_at)
+        except Exception as e:
+            draft_stop.set()
+            with draft_lock:
+                job.route = "strong"
+                job.error = str(e)
+                job.text = f"Error generating answer: {e}"
+        finally:
+            job.finished_at = time.monotonic()
+            job.done_event.set()
+            self._notify()
+
+    def _stream_draft(self, job: AnswerJob, stream, lock: Lock):
+        """Streams the draft model's answer into the job until the main model's answer replaces it."""
+        try:
+            for chunk in stream:
+                with lock:
+                    if job.cancelled or job.route != "draft":
+                        break
+                    job.text += chunk
+                self._notify()
+        finally:
+            stream.close()
+
+    def _notify(self):
+        if self.notifier is not None:
+            self.notifier.publish()
@@ -2,13 +2,35 @@ import unittest
 from unittest.mock import MagicMock, patch, Mock
 import sys
 import os
+import time
+import tempfile
+import io
+import json
+import contextlib
+import threading
+import numpy as np
 
 # Add src to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
 
-from audio import AudioTranscriber
-from llm import LLMClient
-from vision import ScreenCapturer
+from audio import (AudioNormalizer, AudioTranscriber, GoogleBackend, MockBackend, PcmRingBuffer, PcmSegment,
+                   VoskBackend, VoiceActivityDetector, create_backend)
+from llm import AnswerCache, ConversationContext, LLMClient, OllamaConnection
+from vision import ScreenCapturer, find_text_blocks, preprocess, tesseract_available
+from events import UpdateNotifier
+from metrics import Metrics
+from lazy import lazy_import
+from history import TranscriptHistory
+from questions import QuestionDetector, looks_like_problem
+from worker import AnswerWorker
+from scheduler import InferenceScheduler
+from answer_bank import AnswerBank, DEFAULT_QUESTIONS, build as build_answer_bank
+from retrieval import VectorIndex, chunk_text
+from fake_ollama import FakeOllamaServer
+from run import compare, percentiles
+from fixtures import synth_utterance, write_wav
+import cli
 
 
 class TestAudioTranscriber(unittest.TestCase):
@@ -71,6 +93,47 @@ class TestAudioTranscriber(unittest.TestCase):
         transcriber.stop_listening()
         self.assertFalse(transcriber.is_recording)
 
+    def test_recognition_is_concurrent_and_ordered(self):
+        """Test that segments are recognized in parallel but returned in utterance order."""
+        transcriber = AudioTranscriber(mock_mode=True, recognition_workers=3)
+        delays = {"first": 0.3, "second": 0.1, "third": 0.0}
+
+        def fake_recognize(audio):
+            time.sleep(delays[audio])
+            return audio.upper()
+
+        transcriber.recognizer.recognize_google = MagicMock(side_effect=fake_recognize)
+        for name in ["first", "second", "third"]:
+            transcriber.audio_queue.put(name)
+
+        start = time.monotonic()
+        # The first segment is still being recognized, so nothing can be returned yet
+        self.assertEqual(transcriber.get_transcript(), [])
+        self.assertLess(time.monotonic() - start, 0.1)
+
+        results = []
+        while len(results) < 3 and time.monotonic() - start < 5:
+            results.extend(transcriber.get_transcript())
+            time.sleep(0.01)
+        self.assertEqual(results, ["FIRST", "SECOND", "THIRD"])
+        # Run concurrently, the total is close to the slowest segment rather than the sum
+        self.assertLess(time.monotonic() - start, 0.39)
+
+    def test_unrecognized_audio_is_skipped(self):
+        """Test that segments the recognizer cannot understand produce no text."""
+        import speech_recognition as sr
+        transcriber = AudioTranscriber(mock_mode=True)
+        transcriber.recognizer.recognize_google = MagicMock(side_effect=sr.UnknownValueError())
+        transcriber.audio_queue.put("noise")
+        transcriber.audio_queue.put(("text", "What is a REST API?"))
+        results = []
+        for _ in range(100):
+            results.extend(transcriber.get_transcript())
+            if results:
+                break
+            time.sleep(0.01)
+        self.assertEqual(results, ["What is a REST API?"])
+
     def test_auto_fallback_to_mock_when_pyaudio_unavailable(self):
         """Test automatic fallback to mock mode when PyAudio is unavailable."""
         with patch.dict('sys.modules', {'pyaudio': None}):
@@ -82,6 +145,287 @@ class TestAudioTranscriber(unittest.TestCase):
                 self.assertIsNotNone(transcriber)
 
 
+class TestRecognizerBackends(unittest.TestCase):
+    """Tests for the pluggable speech recognition backends."""
+
+    def _fake_vosk(self, partials, finals):
+        """Builds a stand-in vosk module whose recognizer replays canned results."""
+        fake_vosk = MagicMock()
+        recognizer = fake_vosk.KaldiRecognizer.return_value
+        recognizer.AcceptWaveform.side_effect = [f is not None for f in finals]
+        recognizer.PartialResult.side_effect = ['{"partial": "%s"}' % p for p in partials]
+        recognizer.Result.side_effect = ['{"text": "%s"}' % f for f in finals if f is not None]
+        recognizer.FinalResult.return_value = '{"text": ""}'
+        return fake_vosk
+
+    def test_default_backend_is_google(self):
+        """Test that Google recognition is used unless configured otherwise."""
+        with patch.dict(os.environ, {}, clear=True):
+            transcriber = AudioTranscriber(mock_mode=True)
+            self.assertIsInstance(transcriber.backend, GoogleBackend)
+            self.assertIs(transcriber.backend.recognizer, transcriber.recognizer)
+
+    def test_backend_selected_by_name_and_env(self):
+        """Test selecting a backend by argument or ASR_BACKEND."""
+        self.assertIsInstance(AudioTranscriber(mock_mode=True, backend="mock").backend, MockBackend)
+        with patch.dict(os.environ, {'ASR_BACKEND': 'mock'}):
+            self.assertIsInstance(AudioTranscriber(mock_mode=True).backend, MockBackend)
+        backend = MockBackend()
+        self.assertIs(AudioTranscriber(mock_mode=True, backend=backend).backend, backend)
+
+    def test_vosk_unavailable_falls_back_to_google(self):
+        """Test that a missing vosk install falls back to Google recognition."""
+        with patch.dict('sys.modules', {'vosk': None}):
+            backend = create_backend("vosk", MagicMock())
+            self.assertIsInstance(backend, GoogleBackend)
+
+    def test_mock_backend_describes_audio(self):
+        """Test that the mock backend returns a placeholder for real audio segments."""
+        import speech_recognition as sr
+        audio = sr.AudioData(b'\x00\x00' * 16000, 16000, 2)
+        self.assertEqual(MockBackend().recognize(audio), "[Mock transcript of 1.0s of audio]")
+        self.assertEqual(MockBackend().recognize(("text", "hello")), "hello")
+
+    def test_vosk_stream_reports_partials_then_final(self):
+        """Test that the Vosk stream yields partial hypotheses and a final result."""
+        fake_vosk = self._fake_vosk(partials=["what is", "what is a rest"], finals=[None, None, "what is a rest api"])
+        with patch.dict('sys.modules', {'vosk': fake_vosk}):
+            backend = create_backend("vosk", MagicMock())
+        self.assertIsInstance(backend, VoskBackend)
+        self.assertTrue(backend.supports_partials)
+
+        stream = backend.create_stream(16000, 2)
+        self.assertEqual(stream.accept(b'\x00' * 100), ("what is", None))
+        self.assertEqual(stream.accept(b'\x00' * 100), ("what is a rest", None))
+        self.assertEqual(stream.accept(b'\x00' * 100), (None, "what is a rest api"))
+        self.assertIsNone(stream.finish())
+
+    def test_published_finals_skip_recognition(self):
+        """Test that finals from a streaming backend reach get_transcript and clear the partial."""
+        transcriber = AudioTranscriber(mock_mode=True, backend=MockBackend())
+        transcriber.partial_transcript = "what is a"
+        self.assertEqual(transcriber.get_partial(), "what is a")
+        transcriber._publish_final("what is a REST API")
+        self.assertEqual(transcriber.get_partial(), "")
+        self.assertEqual(transcriber.get_transcript(), ["what is a REST API"])
+
+
+def synth_pcm(parts, sample_rate=16000, seed=0):
+    """Builds 16-bit PCM from (kind, seconds) parts: "speech" is a loud tone, "silence" is low noise."""
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for kind, seconds in parts:
+        n = int(sample_rate * seconds)
+        noise = rng.normal(0, 30, n)
+        if kind == "speech":
+            t = np.arange(n) / sample_rate
+            chunks.append(noise + 4000 * np.sin(2 * np.pi * 220 * t))
+        else:
+            chunks.append(noise)
+    return np.concatenate(chunks).astype(np.int16).tobytes()
+
+
+def feed_vad(vad, pcm, chunk_bytes=2048):
+    """Feeds PCM to the VAD in microphone-sized chunks, returning (segment, end_offset_seconds) pairs."""
+    results = []
+    for offset in range(0, len(pcm), chunk_bytes):
+        for segment in vad.process(pcm[offset:offset + chunk_bytes]):
+            results.append((segment, (offset + chunk_bytes) / 2 / vad.sample_rate))
+    return results
+
+
+class TestVoiceActivityDetector(unittest.TestCase):
+    """Tests for the NumPy voice activity detector used to segment utterances."""
+
+    def test_segments_end_shortly_after_speaker_pauses(self):
+        """Test that each utterance is cut within the hangover after speech stops."""
+        pcm = synth_pcm([("silence", 0.5), ("speech", 1.0), ("silence", 0.6), ("speech", 0.6), ("silence", 1.0)])
+        vad = VoiceActivityDetector(16000, hangover_ms=300, padding_ms=150)
+        results = feed_vad(vad, pcm)
+
+        self.assertEqual(len(results), 2)
+        first, first_end = results[0]
+        # Speech stopped at 1.5s; the cut comes after the 300ms hangover, not seconds later
+        self.assertLess(first_end - 1.5, 0.45)
+        # Segment holds the utterance plus a little padding on both sides
+        self.assertAlmostEqual(len(first) / 2 / 16000, 1.0 + 0.3, delta=0.1)
+        self.assertIsNone(vad.flush())
+
+    def test_noise_floor_adapts_to_background(self):
+        """Test that steady background noise raises the threshold instead of triggering speech."""
+        rng = np.random.default_rng(1)
+        noisy = (rng.normal(0, 400, 16000 * 2)).astype(np.int16).tobytes()
+        vad = VoiceActivityDetector(16000)
+        self.assertEqual(feed_vad(vad, noisy), [])
+        self.assertFalse(vad.in_speech)
+        self.assertGreater(vad.threshold, 400)
+
+    def test_short_clicks_are_ignored(self):
+        """Test that bursts shorter than min_speech_ms do not produce segments."""
+        pcm = synth_pcm([("silence", 0.5), ("speech", 0.06), ("silence", 1.0)])
+        vad = VoiceActivityDetector(16000, min_speech_ms=200)
+        self.assertEqual(feed_vad(vad, pcm), [])
+
+    def test_long_monologue_split_at_natural_pause(self):
+        """Test that a long monologue is cut at a short pause once past the soft limit."""
+        pcm = synth_pcm([("silence", 0.5), ("speech", 3.0), ("silence", 0.15), ("speech", 6.0),
+                         ("silence", 0.15), ("speech", 2.0), ("silence", 1.0)])
+        vad = VoiceActivityDetector(16000, soft_limit_s=5.0, split_pause_ms=120, hangover_ms=300)
+        results = feed_vad(vad, pcm)
+        lengths = [len(segment) / 2 / 16000 for segment, _ in results]
+        # The first short pause (3s into speech) is before the soft limit, the second (9.15s in) splits
+        self.assertEqual(len(lengths), 2)
+        self.assertAlmostEqual(lengths[0], 9.15 + 0.15 + 0.12, delta=0.1)
+
+    def test_max_segment_cut_without_pause(self):
+        """Test that continuous speech is cut once it reaches max_segment_s."""
+        pcm = synth_pcm([("silence", 0.5), ("speech", 5.0)])
+        vad = VoiceActivityDetector(16000, soft_limit_s=1.0, max_segment_s=2.0)
+        results = feed_vad(vad, pcm)
+        self.assertGreaterEqual(len(results), 2)
+        for segment, _ in results:
+            self.assertLessEqual(len(segment) / 2 / 16000, 2.0)
+        self.assertIsNotNone(vad.flush())
+
+
+class TestPcmRingBuffer(unittest.TestCase):
+    """Tests for the capture ring buffer and the zero-copy segments handed to recognition."""
+
+    def test_views_are_contiguous_across_the_wrap(self):
+        """Test that a span crossing the end of the buffer comes back whole and uncopied."""
+        ring = PcmRingBuffer(10)
+        ring.write(b"abcdefgh")
+        self.assertEqual(ring.write(b"ijklmn"), 8)
+        view = ring.view(6, 14)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(bytes(view), b"ghijklmn")
+        self.assertFalse(ring.valid(3))
+        self.assertTrue(ring.valid(4))
+        with self.assertRaises(ValueError):
+            ring.view(0, 5)
+
+    def test_oversized_write_keeps_newest_bytes(self):
+        """Test that a write larger than the buffer keeps only its tail."""
+        ring = PcmRingBuffer(4)
+        ring.write(b"0123456789")
+        self.assertEqual(ring.written, 10)
+        self.assertEqual(bytes(ring.view(6, 10)), b"6789")
+
+    def test_vad_ranges_match_vad_bytes(self):
+        """Test that range output points at exactly the audio the bytes output returns."""
+        pcm = synth_pcm([("silence", 0.5), ("speech", 1.0), ("silence", 0.8), ("speech", 0.6), ("silence", 0.8)])
+        byte_segments = [segment for segment, _ in feed_vad(VoiceActivityDetector(16000), pcm)]
+        range_vad = VoiceActivityDetector(16000, output="range")
+        ranges = [span for span, _ in feed_vad(range_vad, pcm)]
+        self.assertEqual(len(ranges), 2)
+        self.assertEqual([pcm[start * 2:end * 2] for start, end in ranges], byte_segments)
+        self.assertEqual(range_vad._frames, [])
+
+    def _segments(self, ring, count, seconds=0.5, rate=16000):
+        size = int(seconds * rate) * 2
+        segments = []
+        for _ in range(count):
+            start = ring.write(bytes(size))
+            segments.append(PcmSegment(ring, start, start + size, rate, 2))
+        return segments
+
+    def test_backpressure_merges_waiting_segments(self):
+        """Test that with recognition behind, new segments are merged into the last waiting one."""
+        transcriber = AudioTranscriber(mock_mode=True, recognition_workers=1, backend=MockBackend(latency=0.1),
+                                       max_backlog=2, backpressure="merge")
+        ring = PcmRingBuffer(16000 * 2 * 30)
+        for segment in self._segments(ring, 6):
+            transcriber._dispatch(segment)
+        self.assertGreaterEqual(transcriber.merged_segments, 3)
+        self.assertLessEqual(sum(1 for f in transcriber._pending if not f.done()), 2)
+
+        texts = []
+        deadline = time.monotonic() + 5
+        while len(texts) < 2 and time.monotonic() < deadline:
+            texts.extend(transcriber.get_transcript())
+            time.sleep(0.02)
+        # Nothing was lost: the merged segment spans all of the audio after the first
+        self.assertEqual(texts[0], "[Mock transcript of 0.5s of audio]")
+        self.assertEqual(texts[-1], "[Mock transcript of 2.5s of audio]")
+        self.assertEqual(transcriber.dropped_segments, 0)
+
+    def test_backpressure_drops_oldest_waiting_segment(self):
+        """Test the drop_oldest policy and its counter."""
+        transcriber = AudioTranscriber(mock_mode=True, recognition_workers=1, backend=MockBackend(latency=0.1),
+                                       max_backlog=2, backpressure="drop_oldest")
+        ring = PcmRingBuffer(16000 * 2 * 30)
+        for segment in self._segments(ring, 5):
+            transcriber._dispatch(segment)
+        self.assertEqual(transcriber.dropped_segments, 3)
+        texts = []
+        deadline = time.monotonic() + 5
+        while transcriber._pending and time.monotonic() < deadline:
+            texts.extend(transcriber.get_transcript())
+            time.sleep(0.02)
+        self.assertEqual(len(texts), 2)
+
+    def test_lapped_segment_counts_as_overrun(self):
+        """Test that audio overwritten before recognition is reported instead of recognized."""
+        transcriber = AudioTranscriber(mock_mode=True, backend=MockBackend())
+        ring = PcmRingBuffer(16000)
+        stale = self._segments(ring, 1, seconds=0.25)[0]
+        ring.write(bytes(16000))
+        self.assertIsNone(transcriber._recognize(stale))
+        self.assertEqual(transcriber.overruns, 1)
+
+
+class TestAudioNormalizer(unittest.TestCase):
+    """Tests for the capture normalization stage: mono 16 kHz 16-bit audio, trimmed segments."""
+
+    def convert(self, normalizer, pcm, chunk_bytes):
+        return np.frombuffer(b"".join(normalizer.process(pcm[i:i + chunk_bytes])
+                                      for i in range(0, len(pcm), chunk_bytes)), dtype=np.int16)
+
+    def test_resamples_and_downmixes(self):
+        """Test that stereo 24-bit 48 kHz audio becomes mono 16 kHz with the same tone, seamlessly across chunks."""
+        t = np.arange(48000) / 48000
+        tone = np.sin(2 * np.pi * 440 * t) * 0.3
+        # Left has the tone, right has it plus a 10 kHz whistle that must not alias into the output
+        stereo = np.stack((tone, tone + 0.3 * np.sin(2 * np.pi * 10000 * t)), axis=1).ravel()
+        samples = np.round(stereo * (2 ** 23 - 1)).astype(np.int32)
+        pcm = np.stack((samples & 0xFF, (samples >> 8) & 0xFF, (samples >> 16) & 0xFF), axis=1).astype(np.uint8)
+        pcm = pcm.tobytes()
+
+        out = self.convert(AudioNormalizer(48000, sample_width=3, channels=2), pcm, 1021 * 6)
+        self.assertEqual(len(out), 16000)
+        whole = self.convert(AudioNormalizer(48000, sample_width=3, channels=2), pcm, len(pcm))
+        self.assertLessEqual(np.abs(out.astype(int) - whole).max(), 1)
+        # The 63-tap filter delays the audio by 31 input samples
+        expected = np.sin(2 * np.pi * 440 * (np.arange(16000) / 16000 - 31 / 48000)) * 0.3 * 32768
+        self.assertLess(np.abs(out[100:] - expected[100:]).max(), 0.01 * 32768)
+
+        out = self.convert(AudioNormalizer(44100), np.round(np.sin(2 * np.pi * 440 * np.arange(44100) / 44100)
+                                                            * 10000).astype(np.int16).tobytes(), 2000)
+        self.assertAlmostEqual(len(out), 16000, delta=1)
+        pcm = bytes(range(256)) * 4
+        self.assertIs(AudioNormalizer(16000).process(pcm), pcm)
+
+    def test_segments_are_trimmed_before_queueing(self):
+        """Test that silence at either end of a segment is cut from its span without copying."""
+        pcm = synth_pcm([("silence", 1.0), ("speech", 1.0), ("silence", 1.0)])
+        ring = PcmRingBuffer(len(pcm))
+        ring.write(pcm)
+        segment = PcmSegment(ring, 0, len(pcm), 16000, 2)
+        trimmed = segment.trim(threshold=500, keep_ms=100)
+        self.assertIs(trimmed.ring, ring)
+        self.assertAlmostEqual(trimmed.start / 32000, 0.9, delta=0.02)
+        self.assertAlmostEqual(trimmed.end / 32000, 2.1, delta=0.02)
+        # A segment with nothing louder than the threshold is left alone
+        self.assertIs(segment.trim(threshold=1e6), segment)
+
+        transcriber = AudioTranscriber(mock_mode=True, backend=MockBackend())
+        transcriber._queue_segment(segment, threshold=500)
+        self.assertEqual(transcriber.audio_queue.get_nowait().start, trimmed.start)
+        transcriber.trim = False
+        transcriber._queue_segment(segment, threshold=500)
+        self.assertIs(transcriber.audio_queue.get_nowait(), segment)
+
+
 class TestLLMClient(unittest.TestCase):
     """Tests for the LLMClient class - handles AI-powered answer generation."""
 
@@ -159,6 +503,106 @@ class TestLLMClient(unittest.TestCase):
             
             self.assertIn("Error", answer)
 
+    def test_mock_llm_stream_matches_full_answer(self):
+        """Test that the mock stream yields chunks that join to the full mock answer."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_ollama.return_value.list.side_effect = Exception("Connection refused")
+            client = LLMClient()
+            chunks = list(client.stream_answer("What is Python?"))
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual("".join(chunks), client.get_answer("What is Python?"))
+            self.assertEqual(list(client.stream_answer("")), [])
+
+    def test_llm_stream_answer_with_real_client(self):
+        """Test that streamed chunks from Ollama are yielded as they arrive."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.return_value = iter([
+                {'message': {'content': 'This is '}},
+                {'message': {'content': ''}},
+                {'message': {'content': 'streamed.'}},
+            ])
+            mock_ollama.return_value = mock_client
+
+            client = LLMClient(model="llama3.2")
+            chunks = list(client.stream_answer("Test question"))
+
+            self.assertEqual(chunks, ['This is ', 'streamed.'])
+            self.assertTrue(mock_client.chat.call_args.kwargs['stream'])
+
+    def test_llm_stream_handles_api_error(self):
+        """Test that errors during streaming are reported as a final chunk."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.side_effect = Exception("API Error")
+            mock_ollama.return_value = mock_client
+
+            client = LLMClient()
+            chunks = list(client.stream_answer("Test question"))
+
+            self.assertEqual(len(chunks), 1)
+            self.assertIn("Error", chunks[0])
+
+    def test_llm_warms_model_with_keep_alive(self):
+        """Test that the model is loaded in the background and requests keep it loaded."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.return_value = {'message': {'content': 'Answer.'}}
+            mock_ollama.return_value = mock_client
+
+            client = LLMClient(model="llama3.2", keep_alive="10m")
+            self.assertTrue(client._connected)
+            deadline = time.monotonic() + 2
+            while client.status != "ready" and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(client.status, "ready")
+            mock_client.generate.assert_called_once_with(model="llama3.2", prompt="", keep_alive="10m")
+
+            client.get_answer("Test question")
+            self.assertEqual(mock_client.chat.call_args.kwargs['keep_alive'], "10m")
+            client.close()
+
+    def test_llm_reconnects_after_failed_start(self):
+        """Test that a client started while Ollama was down leaves mock mode once it is back."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.side_effect = [ConnectionError("refused"), {'models': []}]
+            mock_client.chat.return_value = {'message': {'content': 'Real answer.'}}
+            mock_ollama.return_value = mock_client
+
+            client = LLMClient()
+            self.assertFalse(client._connected)
+            self.assertEqual(client.status, "offline")
+            self.assertIn("[MOCK AI ANSWER]", client.get_answer("What is Python?"))
+
+            client.check_now()
+            deadline = time.monotonic() + 2
+            while not client.connected and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(client.get_answer("What is Python?"), "Real answer.")
+            # The HTTP client is created once and reused across reconnects
+            mock_ollama.assert_called_once()
+            client.close()
+
+    def test_llm_connection_error_falls_back_to_mock(self):
+        """Test that losing the server mid-session switches to mock mode and triggers a recheck."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.side_effect = ConnectionError("Failed to connect to Ollama")
+            mock_ollama.return_value = mock_client
+
+            client = LLMClient(health_interval=60)
+            self.assertTrue(client._connected)
+            mock_client.list.side_effect = ConnectionError("refused")
+            self.assertIn("Error", client.get_answer("Test question"))
+            self.assertFalse(client.connected)
+            self.assertIn("[MOCK AI ANSWER]", client.get_answer("Test question"))
+            client.close()
+
     def test_llm_reads_env_model(self):
         """Test that LLM client reads model from environment."""
         with patch.dict(os.environ, {'OLLAMA_MODEL': 'mistral'}):
@@ -185,6 +629,11 @@ class TestLLMClient(unittest.TestCase):
 class TestScreenCapturer(unittest.TestCase):
     """Tests for the ScreenCapturer class - handles screen capture and OCR."""
 
+    def setUp(self):
+        # The tesseract probe is cached per process; tests patch shutil.which
+        tesseract_available.cache_clear()
+        self.addCleanup(tesseract_available.cache_clear)
+
     def test_screen_capturer_initialization(self):
         """Test ScreenCapturer initializes correctly."""
         capturer = ScreenCapturer()
@@ -274,6 +723,1014 @@ class TestScreenCapturer(unittest.TestCase):
                             self.assertIn("Tesseract", result)
 
 
+class TestAnswerCache(unittest.TestCase):
+    """Tests for the AnswerCache class - caches answers by model and question."""
+
+    def test_normalized_questions_share_entry(self):
+        """Test that case, punctuation and spacing differences hit the same entry."""
+        cache = AnswerCache()
+        cache.put("llama3.2", "What is a REST API?", "answer")
+        self.assertEqual(cache.get("llama3.2", "  what is a rest   api "), "answer")
+        self.assertIsNone(cache.get("mistral", "What is a REST API?"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted past max_entries."""
+        cache = AnswerCache(max_entries=2)
+        cache.put("m", "q1", "a1")
+        cache.put("m", "q2", "a2")
+        cache.get("m", "q1")
+        cache.put("m", "q3", "a3")
+        self.assertIsNone(cache.get("m", "q2"))
+        self.assertEqual(cache.get("m", "q1"), "a1")
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_ttl_expiry(self):
+        """Test that entries older than the TTL are treated as misses."""
+        cache = AnswerCache(ttl=60)
+        with patch('llm.time.time', return_value=1000.0):
+            cache.put("m", "q", "a")
+        with patch('llm.time.time', return_value=1030.0):
+            self.assertEqual(cache.get("m", "q"), "a")
+        with patch('llm.time.time', return_value=1061.0):
+            self.assertIsNone(cache.get("m", "q"))
+
+    def test_disk_store_survives_restart(self):
+        """Test that answers written with a path are found by a new cache instance."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "answers.db")
+            AnswerCache(path=path).put("m", "Describe the CAP theorem.", "a")
+            self.assertEqual(AnswerCache(path=path).get("m", "describe the cap theorem"), "a")
+
+    def test_llm_client_uses_cache(self):
+        """Test that a repeated question is answered from the cache without calling Ollama."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.return_value = {'message': {'content': 'Cached answer.'}}
+            mock_ollama.return_value = mock_client
+
+            client = LLMClient(cache=AnswerCache())
+            self.assertEqual(client.get_answer("What is a REST API?"), "Cached answer.")
+            self.assertEqual(client.get_answer("what is a REST API"), "Cached answer.")
+            self.assertEqual(list(client.stream_answer("What is a REST API?")), ["Cached answer."])
+            mock_client.chat.assert_called_once()
+
+    def test_interrupted_stream_is_not_cached(self):
+        """Test that a stream closed before completion does not store a partial answer."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.return_value = iter([{'message': {'content': 'Part'}}, {'message': {'content': 'ial'}}])
+            mock_ollama.return_value = mock_client
+
+            cache = AnswerCache()
+            client = LLMClient(cache=cache)
+            stream = client.stream_answer("q")
+            next(stream)
+            stream.close()
+            self.assertEqual(cache.stats()["size"], 0)
+
+
+class TestSharedResources(unittest.TestCase):
+    """Tests for lazy imports and connections shared between clients."""
+
+    def test_lazy_import_defers_module_execution(self):
+        """Test that a lazily imported module only runs when an attribute is used."""
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "heavy_fixture_module.py"), "w") as f:
+                f.write("import os\nos.environ['HEAVY_FIXTURE_LOADED'] = '1'\nVALUE = 42\n")
+            sys.path.insert(0, tmp)
+            try:
+                module = lazy_import("heavy_fixture_module")
+                self.assertNotIn("HEAVY_FIXTURE_LOADED", os.environ)
+                self.assertEqual(module.VALUE, 42)
+                self.assertEqual(os.environ.pop("HEAVY_FIXTURE_LOADED"), "1")
+                self.assertIs(lazy_import("heavy_fixture_module"), module)
+            finally:
+                sys.path.remove(tmp)
+                sys.modules.pop("heavy_fixture_module", None)
+        with self.assertRaises(ImportError):
+            lazy_import("no_such_module_anywhere")
+
+    def test_clients_share_one_connection(self):
+        """Test that clients built on a shared connection reuse its HTTP client and keep their own context."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.return_value = {'message': {'content': 'Answer.'}}
+            mock_ollama.return_value = mock_client
+            connection = OllamaConnection(model="llama3.2", host="http://localhost:11434")
+
+            first = LLMClient(context=ConversationContext(), connection=connection)
+            second = LLMClient(context=ConversationContext(), connection=connection)
+            first.get_answer("What is a mutex?")
+            mock_ollama.assert_called_once()
+            self.assertIs(first.client, second.client)
+            self.assertEqual(len(first.context), 1)
+            self.assertEqual(len(second.context), 0)
+
+            # Closing a client does not stop a connection it does not own
+            first.close()
+            self.assertFalse(connection._stop.is_set())
+            connection.close()
+            self.assertTrue(connection._stop.is_set())
+
+
+class TestConversationContext(unittest.TestCase):
+    """Tests for ConversationContext - the rolling Q&A window sent with each question."""
+
+    def test_messages_keep_a_stable_prefix(self):
+        """Test that adding a turn only appends to the messages sent before it."""
+        context = ConversationContext()
+        context.add("What is a hash map?", "A hash map stores key-value pairs. It uses hashing.")
+        first = context.messages("How do you handle collisions?")
+        context.add("How do you handle collisions?", "Chaining or open addressing.")
+        second = context.messages("And how would you scale that?")
+
+        self.assertEqual(first[0]["role"], "system")
+        self.assertEqual(first[-1], {"role": "user", "content": "How do you handle collisions?"})
+        # Everything before the new question is unchanged, so the server can reuse its prompt cache
+        self.assertEqual(second[:len(first) - 1], first[:-1])
+        self.assertEqual(second[-1]["content"], "And how would you scale that?")
+
+    def test_old_turns_are_summarized_within_budget(self):
+        """Test that turns over the token budget are folded into a summary in batches."""
+        context = ConversationContext(max_tokens=100, evict_batch=2)
+        for i in range(6):
+            context.add(f"Question number {i}?", f"Answer {i} first sentence. " + "More detail. " * 10)
+
+        self.assertLess(len(context), 6)
+        self.assertGreaterEqual(len(context), 1)
+        self.assertIn("Question number 0?", context.summary)
+        self.assertIn("Answer 0 first sentence.", context.summary)
+        self.assertNotIn("More detail", context.summary)
+        messages = context.messages("Next?")
+        self.assertEqual(messages[1]["role"], "system")
+        self.assertIn("Earlier in this interview", messages[1]["content"])
+
+        context.clear()
+        self.assertEqual(len(context), 0)
+        self.assertEqual(context.summary, "")
+
+    def test_follow_up_detection(self):
+        """Test that only questions referring back count as follow-ups, and only with history."""
+        context = ConversationContext()
+        self.assertFalse(context.is_follow_up("And how would you scale that?"))
+        context.add("Design a URL shortener.", "Use a key-value store.")
+        self.assertTrue(context.is_follow_up("And how would you scale that?"))
+        self.assertTrue(context.is_follow_up("what about caching"))
+        self.assertFalse(context.is_follow_up("What is a binary search tree?"))
+
+    def test_llm_sends_context_and_skips_cache_for_follow_ups(self):
+        """Test that LLMClient includes earlier turns and does not cache context-dependent answers."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.side_effect = [
+                {'message': {'content': 'Use a key-value store.'}},
+                {'message': {'content': 'Shard by key.'}},
+            ]
+            mock_ollama.return_value = mock_client
+            cache = AnswerCache()
+            client = LLMClient(cache=cache, context=ConversationContext())
+
+            client.get_answer("Design a URL shortener.")
+            client.get_answer("How would you scale that?")
+
+            messages = mock_client.chat.call_args.kwargs['messages']
+            self.assertEqual([m["role"] for m in messages], ["system", "user", "assistant", "user"])
+            self.assertEqual(messages[2]["content"], "Use a key-value store.")
+            self.assertEqual(cache.stats()["size"], 1)
+            client.close()
+
+
+class TestQuestionDetector(unittest.TestCase):
+    """Tests for the QuestionDetector class - filters and merges segments before the LLM."""
+
+    def test_scores_questions_above_small_talk(self):
+        """Test that questions and prompts pass the threshold and small talk does not."""
+        detector = QuestionDetector()
+        for text in ["What is a REST API?", "how do you handle dependency injection in python",
+                     "Describe the CAP theorem.", "So tell me about yourself"]:
+            self.assertGreaterEqual(detector.score(text), detector.threshold, text)
+        for text in ["hmm, okay", "Great.", "I worked at a startup for three years.", ""]:
+            self.assertLess(detector.score(text), detector.threshold, text)
+
+    def test_small_talk_is_not_a_question(self):
+        """Test that filler segments are reported but not flagged as questions."""
+        detector = QuestionDetector()
+        [segment] = detector.feed("hmm, okay", now=0)
+        self.assertFalse(segment.is_question)
+        self.assertEqual(segment.confidence, 0.0)
+
+    def test_fragments_split_by_pause_are_merged(self):
+        """Test that a cut-off fragment is held and merged with the next segment."""
+        detector = QuestionDetector(merge_window=2.5)
+        self.assertEqual(detector.feed("Can you explain the difference between", now=0), [])
+        [segment] = detector.feed("a process and a thread", now=1.0)
+        self.assertEqual(segment.text, "Can you explain the difference between a process and a thread")
+        self.assertEqual(segment.fragments, 2)
+        self.assertTrue(segment.is_question)
+
+    def test_held_fragment_released_after_window(self):
+        """Test that a held fragment is emitted on its own once the merge window passes."""
+        detector = QuestionDetector(merge_window=2.5)
+        self.assertEqual(detector.feed("What is the", now=0), [])
+        self.assertEqual(detector.flush(now=1.0), [])
+        [segment] = detector.flush(now=3.0)
+        self.assertEqual(segment.text, "What is the")
+
+        # A late follow-up is treated as a new segment, not merged
+        detector.feed("What is the", now=10)
+        segments = detector.feed("Describe the CAP theorem.", now=20)
+        self.assertEqual([s.text for s in segments], ["What is the", "Describe the CAP theorem."])
+
+
+class TestTranscriptHistory(unittest.TestCase):
+    """Tests for the TranscriptHistory class - bounded transcript with an on-disk session log."""
+
+    def test_memory_window_is_bounded(self):
+        """Test that only the newest max_entries are kept in memory."""
+        history = TranscriptHistory(max_entries=3)
+        for i in range(10):
+            history.append(f"entry {i}")
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history.total, 10)
+        self.assertEqual([e["text"] for e in history.tail(2)], ["entry 8", "entry 9"])
+
+    def test_paged_out_entries_read_from_log(self):
+        """Test that pages older than the memory window come from the session log."""
+        with tempfile.TemporaryDirectory() as tmp:
+            history = TranscriptHistory(max_entries=5, log_path=os.path.join(tmp, "logs", "session.jsonl"))
+            for i in range(23):
+                history.append(f"entry {i}", source="audio", confidence=0.5)
+            self.assertEqual([e["text"] for e in history.page(0, page_size=5)],
+                             [f"entry {i}" for i in range(18, 23)])
+            self.assertEqual([e["text"] for e in history.page(3, page_size=5)],
+                             [f"entry {i}" for i in range(3, 8)])
+            self.assertEqual([e["text"] for e in history.page(4, page_size=5)], ["entry 0", "entry 1", "entry 2"])
+            self.assertEqual(history.page_count(page_size=5), 5)
+            self.assertEqual(history.page(0, page_size=5)[0]["confidence"], 0.5)
+            history.close()
+
+    def test_search_and_reload(self):
+        """Test searching the whole session and reopening the log later."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "session.jsonl")
+            history = TranscriptHistory(max_entries=2, log_path=path)
+            history.append("What is a REST API?")
+            history.append("Describe the CAP theorem.", source="screen")
+            history.append("hmm okay")
+            history.append("Is REST stateless?")
+            self.assertEqual([e["text"] for e in history.search("rest")], ["Is REST stateless?", "What is a REST API?"])
+            history.close()
+
+            reloaded = TranscriptHistory.load(path, max_entries=2)
+            self.assertEqual(reloaded.total, 4)
+            self.assertEqual([e["text"] for e in reloaded], ["hmm okay", "Is REST stateless?"])
+            self.assertEqual(reloaded.page(1, page_size=2)[1]["source"], "screen")
+            self.assertEqual(reloaded.append("Next question")["seq"], 4)
+            reloaded.close()
+
+
+class SlowStreamingLLM:
+    """Stand-in LLM that streams a few chunks per answer with a delay between them."""
+
+    def __init__(self, delay=0.05, chunks=5, draft_delay=None):
+        self.delay = delay
+        self.chunks = chunks
+        # With a draft delay, questions are routed to a (faster) draft model first
+        self.draft_delay = draft_delay
+        self.closed = []
+        self.stored = []
+        self.remembered = []
+
+    def route(self, question, source="audio"):
+        return "draft" if self.draft_delay is not None and source == "audio" else "strong"
+
+    def retrieve(self, question):
+        return ""
+
+    def stream_draft(self, question, notes=None):
+        for i in range(self.chunks):
+            time.sleep(self.draft_delay)
+            yield f"draft-{i} "
+
+    def stream_answer(self, question, on_complete=None, notes=None):
+        try:
+            for i in range(self.chunks):
+                time.sleep(self.delay)
+                yield f"{question}-{i} "
+            if on_complete is not None:
+                on_complete(" ".join(f"{question}-{i}" for i in range(self.chunks)))
+        finally:
+            self.closed.append(question)
+
+    def store_answer(self, question, answer, notes=None):
+        self.stored.append((question, answer))
+
+    def remember(self, question, answer):
+        self.remembered.append((question, answer))
+
+
+class TestAnswerWorker(unittest.TestCase):
+    """Tests for the AnswerWorker class - background answer generation."""
+
+    def test_worker_generates_answer_in_background(self):
+        """Test that a submitted question is answered without blocking the caller."""
+        worker = AnswerWorker(SlowStreamingLLM(delay=0.01, chunks=3))
+        job = worker.submit("q1")
+        self.assertTrue(worker.busy)
+        worker.wait(timeout=5)
+        self.assertTrue(job.done)
+        self.assertFalse(worker.busy)
+        self.assertEqual(job.text, "q1-0 q1-1 q1-2")
+        worker.shutdown()
+
+    def test_newer_question_cancels_stale_generation(self):
+        """Test that submitting a new question cancels the in-flight one."""
+        llm = SlowStreamingLLM(delay=0.05, chunks=10)
+        worker = AnswerWorker(llm)
+        first = worker.submit("old")
+        time.sleep(0.1)
+        second = worker.submit("new")
+        worker.wait(timeout=5)
+        first.done_event.wait(timeout=5)
+
+        self.assertTrue(first.cancelled)
+        self.assertNotIn("old-9", first.text)
+        self.assertIn("old", llm.closed)
+        self.assertIs(worker.poll(), second)
+        self.assertTrue(second.text.endswith("new-9"))
+        self.assertEqual(worker.cancelled_count, 1)
+        worker.shutdown()
+
+    def test_worker_reports_errors(self):
+        """Test that a failing LLM produces an error answer instead of raising."""
+        llm = MagicMock()
+        llm.stream_answer.side_effect = Exception("boom")
+        worker = AnswerWorker(llm)
+        worker.submit("q")
+        job = worker.wait(timeout=5)
+        self.assertTrue(job.done)
+        self.assertIn("boom", job.text)
+        worker.shutdown()
+
+
+class TestTwoTierRouting(unittest.TestCase):
+    """Tests for quick draft-model answers replaced by the main model's."""
+
+    def test_route(self):
+        """Test that coding problems, screen text and a fast enough main model skip the draft."""
+        connection = MagicMock(model="big", draft_model="small", connected=True)
+        connection.expected_first_token.return_value = None
+        llm = LLMClient(connection=connection, latency_budget=1.0)
+        self.assertEqual(llm.route("What is the CAP theorem?"), "draft")
+        self.assertEqual(llm.route("What is the CAP theorem?", source="screen"), "strong")
+        self.assertEqual(llm.route("Write a function to reverse a linked list in O(n) time."), "strong")
+        connection.expected_first_token.return_value = 0.4
+        self.assertEqual(llm.route("What is the CAP theorem?"), "strong")
+        connection.expected_first_token.return_value = 2.5
+        self.assertEqual(llm.route("What is the CAP theorem?"), "draft")
+        connection.expected_first_token.assert_called_with("big")
+        connection.connected = False
+        self.assertEqual(llm.route("What is the CAP theorem?"), "strong")
+        self.assertEqual(LLMClient(connection=MagicMock(model="big", draft_model=None)).route("Why?"), "strong")
+
+    def test_worker_replaces_draft(self):
+        """Test that the draft streams in first and the main model's answer replaces it and is stored."""
+        llm = SlowStreamingLLM(delay=0.05, chunks=4, draft_delay=0.001)
+        worker = AnswerWorker(llm)
+        job = worker.submit("What is a REST API?")
+        self.assertEqual(job.route, "draft")
+        deadline = time.monotonic() + 5
+        while "draft-3" not in job.text and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(job.text, "draft-0 draft-1 draft-2 draft-3 ")
+        self.assertFalse(job.done)
+        worker.wait(timeout=5)
+        answer = "What is a REST API?-0 What is a REST API?-1 What is a REST API?-2 What is a REST API?-3"
+        self.assertEqual(job.text, answer)
+        self.assertEqual(llm.stored, [("What is a REST API?", answer)])
+
+        job = worker.submit("Reverse a string", source="screen")
+        self.assertEqual(job.route, "strong")
+        worker.wait(timeout=5)
+        self.assertNotIn("draft", job.text)
+        worker.shutdown()
+
+    def test_draft_goes_through_scheduler(self):
+        """Test that the draft model's generation is scheduled like any other, and a stuck draft is not waited on forever."""
+        llm = SlowStreamingLLM(delay=0.02, chunks=3, draft_delay=0.001)
+        scheduler = InferenceScheduler(max_concurrent=2)
+        with patch.object(scheduler, "submit", wraps=scheduler.submit) as submit:
+            worker = AnswerWorker(llm, scheduler=scheduler, session_id="s1")
+            job = worker.submit("What is a REST API?")
+            worker.wait(timeout=5)
+        self.assertEqual([c.kwargs["key"] for c in submit.call_args_list], [None, None])
+        self.assertEqual(job.text, "What is a REST API?-0 What is a REST API?-1 What is a REST API?-2")
+        worker.shutdown()
+        scheduler.shutdown()
+
+        class FailingLLM(SlowStreamingLLM):
+            def stream_answer(self, question, on_complete=None, notes=None):
+                yield "Error contacting Ollama: boom"
+
+        llm = FailingLLM(chunks=1000, draft_delay=0.01)
+        worker = AnswerWorker(llm)
+        worker.draft_timeout = 0.1
+        job = worker.submit("What is a REST API?")
+        worker.wait(timeout=2)
+        self.assertTrue(job.done)
+        self.assertTrue(job.text.startswith("draft-0"))
+        self.assertEqual(llm.remembered, [])
+        worker.shutdown()
+
+    def test_both_tiers_share_one_host(self):
+        """Test that both models are warmed up and asked on the same server, and only the main answer is kept."""
+        with FakeOllamaServer(token_rate=1000, first_token_delay=0.05) as server:
+            context = ConversationContext()
+            llm = LLMClient(model="big", host=server.url, context=context, draft_model="small")
+            deadline = time.monotonic() + 5
+            while llm.status != "ready" and time.monotonic() < deadline:
+                time.sleep(0.01)
+            worker = AnswerWorker(llm)
+            job = worker.submit("What is a thread?")
+            self.assertEqual(job.route, "draft")
+            worker.wait(timeout=5)
+            worker.shutdown()
+            llm.close()
+        self.assertEqual(job.text, server.answer)
+        self.assertEqual(len(context), 1)
+        self.assertIsNotNone(llm.connection.expected_first_token("big"))
+        models = {(path, body["model"]) for path, body in server.requests}
+        self.assertTrue({("/api/generate", "big"), ("/api/generate", "small"),
+                         ("/api/chat", "big"), ("/api/chat", "small")} <= models)
+
+
+class TestSpeculativeAnswers(unittest.TestCase):
+    """Tests for answers drafted from partial transcripts."""
+
+    def test_matching_final_question_adopts_draft(self):
+        """Test that a close final transcript keeps the draft and stores it under the final question."""
+        with FakeOllamaServer(token_rate=1000, first_token_delay=0) as server:
+            context = ConversationContext()
+            llm = LLMClient(model="benchmark", host=server.url, context=context)
+            worker = AnswerWorker(llm, speculative=True)
+            draft = worker.speculate("Can you explain how REST APIs work")
+            self.assertIsNotNone(draft)
+            # A longer partial of the same question keeps the running draft
+            self.assertIs(worker.speculate("Can you explain how REST APIs work and"), None)
+            self.assertIs(worker.speculate("Can you explain how REST APIs work in practice"), draft)
+            draft.done_event.wait(timeout=5)
+            self.assertEqual(len(context), 0)  # nothing is remembered before the question is final
+
+            job = worker.submit("Can you explain how REST APIs work?")
+            self.assertIs(job, draft)
+            self.assertFalse(job.speculative)
+            self.assertEqual(job.text, server.answer)
+            self.assertIn({"role": "user", "content": "Can you explain how REST APIs work?"}, context.messages("next"))
+            self.assertEqual((worker.speculations, worker.speculation_hits, worker.speculation_misses), (1, 1, 0))
+            worker.shutdown()
+            llm.close()
+
+    def test_different_final_question_restarts(self):
+        """Test that a draft for the wrong question is cancelled, counted as waste and replaced."""
+        llm = SlowStreamingLLM(delay=0.05, chunks=10)
+        worker = AnswerWorker(llm, speculative=True)
+        draft = worker.speculate("What is the difference between TCP")
+        time.sleep(0.15)
+        job = worker.submit("What is the difference between TCP and UDP and when would you pick each one?")
+        worker.wait(timeout=5)
+        draft.done_event.wait(timeout=5)
+
+        self.assertIsNot(job, draft)
+        self.assertTrue(draft.cancelled)
+        self.assertEqual(worker.speculation_misses, 1)
+        self.assertGreater(worker.wasted_chunks, 0)
+        self.assertEqual(llm.stored, [])
+        self.assertTrue(job.text.endswith("pick each one?-9"))
+        worker.shutdown()
+
+    def test_speculation_needs_a_complete_looking_question(self):
+        """Test that fragments, small talk and running answers are left alone."""
+        llm = SlowStreamingLLM(delay=0.05, chunks=10)
+        worker = AnswerWorker(llm, speculative=True)
+        self.assertIsNone(worker.speculate("Can you explain the"))
+        self.assertIsNone(worker.speculate("okay great thanks for that"))
+        self.assertIsNone(AnswerWorker(llm).speculate("What is dependency injection in Python"))
+        answer = worker.submit("What is a REST API?")
+        self.assertIsNone(worker.speculate("What is dependency injection in Python"))
+        self.assertIs(worker.poll(), answer)
+        worker.shutdown()
+
+
+class TestAnswerBank(unittest.TestCase):
+    """Tests for the precomputed answer bank and its MinHash index."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.bank = AnswerBank.write(self.tmp.name, [(q, f"Answer to {q}") for q in DEFAULT_QUESTIONS])
+
+    def test_lookup_matches_rephrased_questions(self):
+        """Test that variations of a bank question find it and unrelated questions find nothing."""
+        bank = AnswerBank.load(self.tmp.name)
+        self.assertIsInstance(bank.signatures, np.memmap)
+        self.assertEqual(len(bank), len(DEFAULT_QUESTIONS))
+
+        match = bank.lookup("what's the difference between a process and a thread")
+        self.assertEqual(match.question, "Can you explain the difference between a process and a thread?")
+        self.assertEqual(match.answer, f"Answer to {match.question}")
+        self.assertEqual(bank.lookup("How do you handle dependency injection in Python?").score, 1.0)
+        self.assertIsNone(bank.lookup("What is the weather like today?"))
+
+        start = time.perf_counter()
+        for _ in range(100):
+            bank.lookup("explain the difference between tcp and udp")
+        self.assertLess((time.perf_counter() - start) / 100, 0.001)
+
+    def test_build_reuses_existing_answers(self):
+        """Test that rebuilding only asks the LLM about new questions."""
+        llm = MagicMock()
+        llm.model = "test"
+        llm.retriever = None
+        llm.get_answer.side_effect = lambda q, fallback=True: f"Fresh answer to {q}"
+        bank = build_answer_bank(DEFAULT_QUESTIONS[:2] + ["What is a monad?"], llm, self.tmp.name)
+        llm.get_answer.assert_called_once_with("What is a monad?", fallback=False)
+        self.assertEqual(len(bank), 3)
+        self.assertEqual(bank.lookup("what is a monad").answer, "Fresh answer to What is a monad?")
+
+    def test_build_never_stores_mock_answers(self):
+        """Test that an unreachable Ollama fails the build instead of filling the bank with mock answers."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_ollama.return_value.list.side_effect = ConnectionError("Connection refused")
+            llm = LLMClient(model="test")
+            with self.assertRaises(ConnectionError):
+                build_answer_bank(["What is a monad?"], llm, self.tmp.name)
+            llm.close()
+        bank = AnswerBank.load(self.tmp.name)
+        self.assertEqual(len(bank), len(DEFAULT_QUESTIONS))
+        self.assertNotIn("[MOCK AI ANSWER]", bank.answer(0))
+
+    def test_worker_shows_bank_answer_then_refines(self):
+        """Test that a bank match is shown at once and replaced by the refined answer."""
+        llm = SlowStreamingLLM(delay=0.02, chunks=3)
+        worker = AnswerWorker(llm, bank=self.bank)
+        job = worker.submit("What is a REST API")
+        self.assertEqual(job.text, "Answer to What is a REST API?")
+        self.assertFalse(job.done)
+        worker.wait(timeout=5)
+        self.assertEqual(job.text, "What is a REST API-0 What is a REST API-1 What is a REST API-2")
+        self.assertEqual(llm.stored, [("What is a REST API", job.text)])
+        worker.shutdown()
+
+        llm = MagicMock()
+        worker = AnswerWorker(llm, bank=self.bank, refine_bank_answers=False)
+        job = worker.submit("Describe the CAP theorem")
+        self.assertTrue(job.done)
+        self.assertEqual(job.text, "Answer to Describe the CAP theorem.")
+        llm.stream_answer.assert_not_called()
+        llm.remember.assert_called_once_with("Describe the CAP theorem", job.text)
+        worker.shutdown()
+
+
+class TestRetrieval(unittest.TestCase):
+    """Tests for the personal document index and retrieval-grounded prompts."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.docs = os.path.join(self.tmp.name, "docs")
+        os.makedirs(self.docs)
+        self.write("resume.md", "Led the migration of the payment service to Kubernetes at Acme.\n\n"
+                                "Built a Kafka event pipeline processing two million events a day.")
+        self.write("notes.txt", "Binary search runs in logarithmic time on sorted arrays.")
+        self.index = VectorIndex(os.path.join(self.tmp.name, "index"))
+        self.index.ingest([self.docs])
+
+    def write(self, name, text):
+        path = os.path.join(self.docs, name)
+        with open(path, "w") as f:
+            f.write(text)
+        # Make sure a rewrite within the same clock tick still looks changed
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + len(text)))
+
+    def test_search_ranks_relevant_chunks(self):
+        """Test that the chunk sharing a question's vocabulary comes first and chunking respects paragraphs."""
+        top = self.index.search("Tell me about your Kafka pipeline", k=1)
+        self.assertEqual(os.path.basename(top[0].source), "resume.md")
+        self.assertIn("Kafka", top[0].text)
+        self.assertEqual(self.index.search("What is the weather like?"), [])
+
+        chunks = chunk_text("one two three\n\nfour five", chunk_words=3)
+        self.assertEqual(chunks, ["one two three", "four five"])
+        chunks = chunk_text(" ".join(str(i) for i in range(10)), chunk_words=4, overlap=1)
+        self.assertEqual(chunks, ["0 1 2 3", "3 4 5 6", "6 7 8 9"])
+
+    def test_incremental_ingest(self):
+        """Test that only changed files are re-indexed, a running reader sees updates, and compaction keeps results."""
+        reader = VectorIndex(self.index.path)
+        self.assertIsInstance(reader._vectors, np.memmap)
+        self.assertEqual(self.index.ingest([self.docs])["unchanged"], 2)
+
+        self.write("notes.txt", "Dijkstra's algorithm finds shortest paths in weighted graphs.")
+        stats = self.index.ingest([self.docs])
+        self.assertEqual((stats["updated"], stats["unchanged"]), (1, 1))
+        self.assertEqual(reader.search("binary search sorted arrays"), [])
+        self.assertIn("Dijkstra", reader.search("shortest paths in a graph")[0].text)
+
+        os.remove(os.path.join(self.docs, "resume.md"))
+        self.assertEqual(self.index.ingest([self.docs], prune=True)["removed"], 1)
+        self.assertEqual(reader.search("Kafka pipeline"), [])
+        self.index.compact()
+        self.assertIn("Dijkstra", reader.search("shortest paths in a graph")[0].text)
+        self.assertEqual(len(reader), 1)
+        self.assertEqual(reader.manifest["rows"], 1)
+
+    def test_llm_sends_top_chunks_before_question(self):
+        """Test that retrieved notes go right before the question, after the cacheable conversation prefix."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_ollama.return_value.list.side_effect = Exception("Connection refused")
+            context = ConversationContext()
+            context.add("What is Python?", "A programming language.")
+            client = LLMClient(context=context, retriever=self.index, retrieval_k=1)
+            messages = client._build_messages("How did you use Kubernetes?")
+            self.assertEqual(messages[:3], context.messages("")[:3])
+            self.assertEqual(messages[-2]["role"], "system")
+            self.assertIn("[resume.md]", messages[-2]["content"])
+            self.assertIn("Kubernetes at Acme", messages[-2]["content"])
+            self.assertEqual(messages[-1], {"role": "user", "content": "How did you use Kubernetes?"})
+            self.assertEqual(len(client._build_messages("What is the weather like?")), 4)
+            client.close()
+
+    def test_cached_answers_are_keyed_on_retrieved_notes(self):
+        """Test that editing the notes behind an answer misses the cache instead of serving the stale answer."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_ollama.return_value.list.side_effect = Exception("Connection refused")
+            client = LLMClient(model="test", cache=AnswerCache(), retriever=self.index, retrieval_k=1)
+            question = "How did you use Kubernetes?"
+            client.store_answer(question, "I ran clusters at Acme.")
+            self.assertEqual(client._cached_answer(question, client.retrieve(question)), "I ran clusters at Acme.")
+            self.assertEqual(client.coalesce_key("What is the weather like?"), "test\nwhat is the weather like")
+            self.assertNotEqual(client.coalesce_key(question), "test\nhow did you use kubernetes")
+
+            self.write("resume.md", "I moved our services to Kubernetes at Initech and wrote the Helm charts.")
+            self.index.ingest([self.docs])
+            self.assertIsNone(client._cached_answer(question, client.retrieve(question)))
+            client.close()
+
+    def test_notes_are_retrieved_once_per_question(self):
+        """Test that one answered question searches the index once, for the key, the prompt and the cache."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_ollama.return_value.chat.return_value = iter([{"message": {"content": "From my notes."}}])
+            client = LLMClient(model="test", cache=AnswerCache(), retriever=self.index, retrieval_k=1)
+            client.connection.wait_checked()
+            scheduler = InferenceScheduler()
+            worker = AnswerWorker(client, scheduler=scheduler)
+            with patch.object(self.index, "search", wraps=self.index.search) as search:
+                job = worker.submit("How did you use Kubernetes?")
+                worker.wait(timeout=5)
+            self.assertEqual(job.text, "From my notes.")
+            self.assertEqual(search.call_count, 1)
+            messages = mock_ollama.return_value.chat.call_args.kwargs["messages"]
+            self.assertEqual(messages[-2]["content"], job.notes)
+            self.assertEqual(client._cached_answer(job.question, job.notes), "From my notes.")
+            worker.shutdown()
+            scheduler.shutdown()
+            client.close()
+
+    def test_answer_bank_is_grounded_in_notes(self):
+        """Test that the bank answers from the notes and regenerates answers when the notes change."""
+        llm = MagicMock()
+        llm.model = "test"
+        llm.retriever = None
+        llm.get_answer.side_effect = lambda q, fallback=True: f"Answer to {q}"
+        bank_dir = os.path.join(self.tmp.name, "bank")
+        build_answer_bank(["Tell me about yourself"], llm, bank_dir, retriever=self.index)
+        self.assertIs(llm.retriever, self.index)
+        build_answer_bank(["Tell me about yourself"], llm, bank_dir)
+        self.assertEqual(llm.get_answer.call_count, 1)
+
+        self.write("resume.md", "I moved our services to Kubernetes at Initech.")
+        self.index.ingest([self.docs])
+        build_answer_bank(["Tell me about yourself"], llm, bank_dir)
+        self.assertEqual(llm.get_answer.call_count, 2)
+
+
+class TestInferenceScheduler(unittest.TestCase):
+    """Tests for the process-wide InferenceScheduler shared by all sessions."""
+
+    def _generator(self, name, started, release=None, chunks=("a", " b")):
+        def generate():
+            started.append(name)
+            if release is not None:
+                release.wait(2)
+            yield from chunks
+        return generate
+
+    def test_sessions_take_turns_newest_first(self):
+        """Test the concurrency limit, round robin between sessions and newest-first within one."""
+        scheduler = InferenceScheduler(max_concurrent=1)
+        started, release = [], threading.Event()
+        blocker = scheduler.submit("z", self._generator("blocker", started, release))
+        a1 = scheduler.submit("a", self._generator("a1", started))
+        a2 = scheduler.submit("a", self._generator("a2", started))
+        b1 = scheduler.submit("b", self._generator("b1", started))
+
+        self.assertEqual(scheduler.running, 1)
+        self.assertIsNone(blocker.position())
+        self.assertEqual([a2.position(), b1.position(), a1.position()], [0, 1, 2])
+        self.assertGreater(a1.expected_wait(), a2.expected_wait())
+
+        release.set()
+        for ticket in (blocker, a1, a2, b1):
+            list(ticket.stream())
+        self.assertEqual(started, ["blocker", "a2", "b1", "a1"])
+        scheduler.shutdown()
+
+    def test_identical_questions_share_one_generation(self):
+        """Test single-flight coalescing of identical concurrent questions."""
+        scheduler = InferenceScheduler(max_concurrent=2)
+        started, release = [], threading.Event()
+        first = scheduler.submit("a", self._generator("first", started, release), key="q")
+        second = scheduler.submit("b", self._generator("second", started, release), key="q")
+        release.set()
+
+        self.assertEqual("".join(first.stream()), "a b")
+        self.assertEqual("".join(second.stream()), "a b")
+        self.assertEqual(started, ["first"])
+        self.assertFalse(first.joined)
+        self.assertTrue(second.joined)
+        self.assertEqual(scheduler.coalesced, 1)
+        scheduler.shutdown()
+
+    def test_cancelled_queued_question_is_dropped(self):
+        """Test that a queued generation nobody waits for never runs."""
+        scheduler = InferenceScheduler(max_concurrent=1)
+        started, release = [], threading.Event()
+        blocker = scheduler.submit("a", self._generator("blocker", started, release))
+        dropped = scheduler.submit("b", self._generator("dropped", started))
+        self.assertEqual(scheduler.queue_depth(), 1)
+        dropped.cancel()
+        self.assertEqual(scheduler.queue_depth(), 0)
+        self.assertEqual(list(dropped.stream()), [])
+
+        release.set()
+        list(blocker.stream())
+        time.sleep(0.05)
+        self.assertEqual(started, ["blocker"])
+        scheduler.shutdown()
+
+    def test_workers_in_two_sessions_share_a_generation(self):
+        """Test that answer workers coalesce through the scheduler and both sessions keep the turn."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.side_effect = lambda **kwargs: iter([
+                {'message': {'content': 'Shared '}}, {'message': {'content': 'answer.'}}])
+            mock_ollama.return_value = mock_client
+            scheduler = InferenceScheduler(max_concurrent=1)
+            clients = [LLMClient(context=ConversationContext()) for _ in range(2)]
+            release = threading.Event()
+            blocker = scheduler.submit("other", self._generator("blocker", [], release))
+            workers = [AnswerWorker(client, scheduler=scheduler, session_id=f"s{i}") for i, client in enumerate(clients)]
+            jobs = [worker.submit("What is a semaphore?") for worker in workers]
+            deadline = time.monotonic() + 2
+            while not all(job.ticket is not None for job in jobs) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+            list(blocker.stream())
+            for worker in workers:
+                worker.wait(timeout=5)
+
+            self.assertEqual([job.text for job in jobs], ["Shared answer.", "Shared answer."])
+            self.assertEqual(mock_client.chat.call_count, 1)
+            self.assertEqual([len(client.context) for client in clients], [1, 1])
+            for worker, client in zip(workers, clients):
+                worker.shutdown()
+                client.close()
+            scheduler.shutdown()
+
+    def test_sessions_with_different_conversations_never_share(self):
+        """Test that the coalescing key covers the conversation the shared answer is prompted with."""
+        with patch('llm.ollama.Client') as mock_ollama:
+            mock_ollama.return_value.list.side_effect = Exception("Connection refused")
+            clients = [LLMClient(model="test", context=ConversationContext()) for _ in range(3)]
+            question = "What is a semaphore?"
+            self.assertEqual(clients[0].coalesce_key(question), clients[1].coalesce_key(question))
+            clients[0].context.add("What did you build at Acme?", "A payment service in Go.")
+            clients[2].context.add("What did you build at Acme?", "A payment service in Go.")
+            self.assertNotEqual(clients[0].coalesce_key(question), clients[1].coalesce_key(question))
+            self.assertEqual(clients[0].coalesce_key(question), clients[2].coalesce_key(question))
+            for client in clients:
+                client.close()
+
+
+class TestUpdateNotifier(unittest.TestCase):
+    """Tests for the UpdateNotifier class - wakes the UI when producers have new data."""
+
+    def test_wait_returns_when_published(self):
+        """Test that a waiting consumer wakes up on publish rather than at the timeout."""
+        notifier = UpdateNotifier()
+        threading.Timer(0.05, notifier.publish).start()
+        start = time.monotonic()
+        version = notifier.wait(since=0, timeout=5)
+        self.assertEqual(version, 1)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_wait_times_out_without_updates(self):
+        """Test that wait returns the unchanged version after the timeout."""
+        notifier = UpdateNotifier()
+        self.assertEqual(notifier.wait(since=0, timeout=0.01), 0)
+
+    def test_producers_publish_updates(self):
+        """Test that the transcriber and answer worker publish when they have new data."""
+        notifier = UpdateNotifier()
+        transcriber = AudioTranscriber(mock_mode=True, notifier=notifier)
+        transcriber.partial_transcript = "What is"
+        self.assertEqual(notifier.version, 1)
+        transcriber.partial_transcript = "What is"  # unchanged partials are not published
+        self.assertEqual(notifier.version, 1)
+        transcriber._publish_final("What is a REST API?")
+        transcriber.get_transcript()
+        self.assertGreaterEqual(notifier.version, 3)
+
+        version = notifier.version
+        worker = AnswerWorker(SlowStreamingLLM(delay=0, chunks=2), notifier=notifier)
+        worker.submit("q")
+        worker.wait(timeout=5)
+        # One publish per chunk plus one when the job finishes
+        deadline = time.monotonic() + 1
+        while notifier.version < version + 3 and time.monotonic() < deadline:
+            notifier.wait(since=notifier.version, timeout=0.05)
+        self.assertEqual(notifier.version, version + 3)
+        worker.shutdown()
+
+
+def synth_frame(lines, width=400, height=300, background=255):
+    """Builds a BGRA frame with bars standing in for text lines at (top, bottom, shade) or (top, bottom, shade, left, right)."""
+    frame = np.full((height, width, 4), background, dtype=np.uint8)
+    for line in lines:
+        top, bottom, shade = line[:3]
+        left, right = line[3:] if len(line) > 3 else (20, width - 20)
+        frame[top:bottom, left:right, :3] = shade
+        # Gaps between "letters" so the bar looks like text rather than a solid box
+        frame[top:bottom, left:right:7, :3] = background
+    return frame
+
+
+class TestScreenCapturerCaching(unittest.TestCase):
+    """Tests for preprocessing, text-block OCR and OCR caching in ScreenCapturer."""
+
+    def setUp(self):
+        self.ocr_calls = []
+
+        def fake_ocr(img):
+            self.ocr_calls.append(img.size)
+            return f"text {len(self.ocr_calls)}"
+
+        patcher = patch('vision.pytesseract.image_to_string', side_effect=fake_ocr)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_preprocess_binarizes_light_and_dark_themes(self):
+        """Test that text ends up dark on white for both light and dark screens."""
+        for background, shade in [(255, 0), (30, 220)]:
+            binary = preprocess(synth_frame([(30, 58, shade)], background=background))
+            self.assertEqual(binary.dtype, np.uint8)
+            self.assertEqual(binary[5, 5], 255)  # background
+            self.assertEqual(binary[40, 22], 0)  # text
+
+    def test_preprocess_downscales_wide_frames(self):
+        """Test that frames wider than 2560 px are halved by default."""
+        frame = np.full((100, 3000, 4), 255, dtype=np.uint8)
+        self.assertEqual(preprocess(frame).shape, (50, 1500))
+        self.assertEqual(preprocess(frame, scale=1).shape, (100, 3000))
+
+    def test_text_blocks_split_by_rows_and_columns(self):
+        """Test that blocks are separated at blank gaps and returned in reading order."""
+        frame = synth_frame([(30, 58, 0, 20, 150), (30, 58, 0, 250, 380), (130, 158, 0), (168, 196, 0)])
+        blocks = find_text_blocks(preprocess(frame))
+        self.assertEqual(len(blocks), 3)
+        (t1, l1, b1, r1), (t2, l2, _, _), (t3, _, b3, _) = blocks
+        self.assertEqual(t1, t2)
+        self.assertLess(r1, l2)
+        # Two lines 10 px apart stay in one block so they are OCR'd together
+        self.assertTrue(t3 <= 130 and 196 <= b3)
+
+    def test_identical_frame_served_from_cache(self):
+        """Test that an unchanged screen returns instantly without running OCR."""
+        capturer = ScreenCapturer(ocr_workers=1)
+        frame = synth_frame([(30, 58, 0), (130, 158, 0, 20, 200)])
+        first = capturer.read_frame(frame)
+        calls = len(self.ocr_calls)
+        self.assertEqual(calls, 2)
+        self.assertEqual(capturer.read_frame(frame.copy()), first)
+        self.assertEqual(len(self.ocr_calls), calls)
+        self.assertEqual(capturer.frame_cache_hits, 1)
+
+    def test_only_changed_blocks_are_reocrd(self):
+        """Test that a change in one region re-runs OCR on that block only."""
+        capturer = ScreenCapturer(ocr_workers=1)
+        capturer.read_frame(synth_frame([(30, 58, 0), (130, 158, 0), (230, 258, 0)]))
+        calls = len(self.ocr_calls)
+        capturer.read_frame(synth_frame([(30, 58, 0), (130, 158, 0, 20, 200), (230, 258, 0)]))
+        self.assertEqual(len(self.ocr_calls), calls + 1)
+        self.assertEqual(len(capturer.changed_blocks), 1)
+        top, _, bottom, _ = capturer.changed_blocks[0]
+        self.assertTrue(top <= 130 and 158 <= bottom)
+        self.assertEqual(capturer.blocks_reused, 2)
+
+    def test_parallel_ocr_keeps_reading_order(self):
+        """Test that blocks OCR'd concurrently are reassembled top to bottom."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        def fake_ocr(img):
+            # Later blocks finish first
+            time.sleep(0.05 * (4 - len(self.ocr_calls)))
+            self.ocr_calls.append(img.size)
+            return f"{img.size[1]}px block"
+
+        with ThreadPoolExecutor(max_workers=4) as executor, \
+                patch('vision.pytesseract.image_to_string', side_effect=fake_ocr):
+            capturer = ScreenCapturer(ocr_workers=4, ocr_executor=executor)
+            text = capturer.read_frame(synth_frame([(20, 30, 0), (60, 80, 0), (120, 150, 0), (200, 240, 0)]))
+        self.assertEqual(text.splitlines(), ["18px block", "28px block", "38px block", "48px block"])
+
+    def test_blank_screen_needs_no_ocr(self):
+        """Test that a screen without text runs no OCR at all."""
+        capturer = ScreenCapturer()
+        self.assertEqual(capturer.read_frame(synth_frame([])), "")
+        self.assertEqual(self.ocr_calls, [])
+
+
+PROBLEM_TEXT = ("Given an array of integers nums and an integer target, return the indices of the two "
+                "numbers such that they add up to target. Example: Input: nums = [2,7,11,15]")
+
+
+class TestScreenWatch(unittest.TestCase):
+    """Tests for the background screen-watch mode of ScreenCapturer."""
+
+    def _screenshot(self, frame):
+        shot = MagicMock()
+        shot.size = (frame.shape[1], frame.shape[0])
+        shot.bgra = frame.tobytes()
+        return shot
+
+    def test_problem_text_heuristic(self):
+        """Test that problem statements are told apart from ordinary screen text."""
+        self.assertTrue(looks_like_problem(PROBLEM_TEXT))
+        self.assertFalse(looks_like_problem("Inbox (3) - Meeting notes for Thursday, agenda and action items"))
+        self.assertFalse(looks_like_problem("return array"))
+
+    def test_watch_runs_ocr_only_after_screen_settles(self):
+        """Test that OCR runs once per stable change and new problems are queued."""
+        frame_a = synth_frame([(30, 58, 0)])
+        frame_b = synth_frame([(30, 58, 0), (130, 158, 0, 20, 200)])
+        frames = [frame_a] * 4 + [frame_b] * 4
+        shots = [self._screenshot(f) for f in frames]
+
+        notifier = UpdateNotifier()
+        with patch.dict(os.environ, {'DISPLAY': ':0'}), \
+                patch('vision.mss.mss') as mock_mss, \
+                patch('vision.pytesseract.image_to_string', return_value=PROBLEM_TEXT) as mock_ocr:
+            sct = mock_mss.return_value.__enter__.return_value
+            sct.monitors = [None, {}]
+            sct.grab.side_effect = lambda monitor: shots.pop(0) if len(shots) > 1 else shots[0]
+
+            capturer = ScreenCapturer(ocr_workers=1, notifier=notifier)
+            capturer.tesseract_available = True
+            self.assertTrue(capturer.start_watching(interval=0.01, stable_samples=2))
+            deadline = time.monotonic() + 5
+            while len(shots) > 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            capturer.stop_watching()
+
+        # One OCR pass per settled screen, never per sample
+        self.assertEqual(capturer.watch_ocr_runs, 2)
+        self.assertGreaterEqual(capturer.watch_samples, 8)
+        # The second screen gained a block, so it is reported as a new problem
+        results = capturer.get_watch_results()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0], PROBLEM_TEXT.strip())
+        self.assertEqual(capturer.get_watch_results(), [])
+        self.assertGreaterEqual(notifier.version, 1)
+        self.assertFalse(capturer.watching)
+
+    def test_watch_unavailable_when_headless(self):
+        """Test that watching refuses to start without a display."""
+        with patch.dict(os.environ, {}, clear=True), patch('platform.system', return_value='Linux'):
+            capturer = ScreenCapturer()
+            self.assertFalse(capturer.start_watching())
+            self.assertIn("DISPLAY", capturer.watch_error)
+            self.assertFalse(capturer.watching)
+
+
 class TestIntegration(unittest.TestCase):
     """Integration tests for the AI Interview Cracker application."""
 
@@ -318,5 +1775,162 @@ class TestIntegration(unittest.TestCase):
             self.assertIn("dependency injection", answer)
 
 
+class TestMetrics(unittest.TestCase):
+    """Tests for the Metrics registry used to time pipeline stages."""
+
+    def test_spans_counters_and_gauges(self):
+        """Test that spans record durations and the snapshot summarizes them."""
+        registry = Metrics()
+        for _ in range(3):
+            with registry.span("ocr"):
+                time.sleep(0.01)
+        registry.observe("asr", 0.2)
+        registry.incr("answer_cache_hits", 2)
+        registry.set_gauge("asr_queue_depth", 4)
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["stages"]["ocr"]["count"], 3)
+        self.assertGreaterEqual(snapshot["stages"]["ocr"]["p50_ms"], 10)
+        self.assertAlmostEqual(snapshot["stages"]["asr"]["p95_ms"], 200)
+        self.assertEqual(snapshot["counters"], {"answer_cache_hits": 2})
+        self.assertEqual(snapshot["gauges"], {"asr_queue_depth": 4})
+
+        text = registry.to_prometheus()
+        self.assertIn('copilot_stage_duration_seconds{stage="asr",quantile="0.5"} 0.200000', text)
+        self.assertIn('copilot_stage_duration_seconds_count{stage="ocr"} 3', text)
+        self.assertIn("copilot_answer_cache_hits_total 2", text)
+        self.assertIn("copilot_asr_queue_depth 4", text)
+
+    def test_disabled_registry_records_nothing(self):
+        """Test that a disabled registry ignores every call."""
+        registry = Metrics(enabled=False)
+        with registry.span("ocr"):
+            pass
+        registry.observe("asr", 1.0)
+        registry.incr("hits")
+        registry.set_gauge("depth", 1)
+        self.assertEqual(registry.snapshot(), {"stages": {}, "counters": {}, "gauges": {}})
+
+    def test_llm_stream_records_first_token(self):
+        """Test that streaming an answer records time to first token and tokens per second."""
+        with patch('llm.metrics', Metrics()) as registry, patch('llm.ollama.Client') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.list.return_value = {'models': []}
+            mock_client.chat.return_value = iter([{'message': {'content': word}} for word in ("a", " b", " c")])
+            mock_ollama.return_value = mock_client
+            client = LLMClient()
+            list(client.stream_answer("Test question"))
+            client.close()
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["stages"]["llm_first_token"]["count"], 1)
+        self.assertEqual(snapshot["stages"]["llm_answer"]["count"], 1)
+        self.assertIn("llm_tokens_per_second", snapshot["gauges"])
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+    """Tests for the benchmark helpers in benchmarks/."""
+
+    def test_fake_ollama_streams_to_llm_client(self):
+        """Test that the real Ollama client works against the fake server."""
+        with FakeOllamaServer(token_rate=1000, first_token_delay=0) as server:
+            client = LLMClient(model="benchmark", host=server.url, keep_alive="5m")
+            self.assertTrue(client._connected)
+            chunks = list(client.stream_answer("What is a thread?"))
+            client.close()
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), server.answer)
+        chat_requests = [body for path, body in server.requests if path == "/api/chat"]
+        self.assertEqual(chat_requests[-1]["keep_alive"], "5m")
+
+    def test_compare_flags_slower_stages(self):
+        """Test that only stages slower than tolerance plus slack count as regressions."""
+        baseline = {"stages": {"asr": percentiles([0.020] * 10), "answer": percentiles([0.400] * 10)}}
+        results = {"stages": {"asr": percentiles([0.022] * 10), "answer": percentiles([0.700] * 10)}}
+        regressions = compare(results, baseline, tolerance=0.5, slack_ms=5.0)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(r.startswith("answer") for r in regressions))
+
+
+class TestBatchCli(unittest.TestCase):
+    """Tests for the batch processing command line in src/cli.py."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.inputs = os.path.join(self.tmp.name, "recordings")
+        os.makedirs(self.inputs)
+        for i, seconds in enumerate((2.0, 4.0)):
+            write_wav(os.path.join(self.inputs, f"interview-{i}.wav"), synth_utterance(seconds, seed=i))
+        with open(os.path.join(self.inputs, "notes.txt"), "w") as f:
+            f.write("not an input")
+        self.output = os.path.join(self.tmp.name, "results.jsonl")
+
+    def run_cli(self, *args):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return cli.main([self.inputs, "-o", self.output, "--asr", "mock", *args])
+
+    def read_output(self):
+        with open(self.output) as f:
+            return [json.loads(line) for line in f]
+
+    def test_transcribes_files_and_resumes(self):
+        """Test that every audio file is transcribed once, with timestamps, across reruns."""
+        self.assertEqual(self.run_cli("--workers", "0", "--no-answers"), 0)
+        records = self.read_output()
+        self.assertEqual(sorted(os.path.basename(r["file"]) for r in records), ["interview-0.wav", "interview-1.wav"])
+        for record in records:
+            self.assertEqual(record["kind"], "transcript")
+            self.assertLess(record["start"], record["end"])
+            self.assertIn("Mock transcript", record["text"])
+
+        # A rerun skips finished files; a changed file is processed again
+        self.assertEqual(self.run_cli("--workers", "0", "--no-answers"), 0)
+        self.assertEqual(len(self.read_output()), 2)
+        write_wav(os.path.join(self.inputs, "interview-0.wav"), synth_utterance(3.0, seed=5))
+        self.assertEqual(self.run_cli("--workers", "0", "--no-answers"), 0)
+        self.assertEqual(len(self.read_output()), 3)
+
+    def test_slow_recognition_never_laps_the_ring(self):
+        """Test that a long silence after an utterance waits for its recognition instead of overwriting it."""
+        path = os.path.join(self.tmp.name, "long-pause.wav")
+        utterance = synth_utterance(1.5)
+        write_wav(path, np.concatenate([utterance, np.zeros(16000 * 10, dtype=np.int16), utterance]))
+        # A 6-second ring: the pause alone is longer
+        processor = cli.BatchProcessor(asr=MockBackend(latency=0.5), answers=False, max_backlog=1,
+                                       vad_options={"max_segment_s": 2.0})
+        records, _ = processor.process_audio(path)
+        processor.close()
+        self.assertEqual(processor.transcriber.overruns, 0)
+        self.assertEqual(len(records), 2)
+        self.assertLess(records[0]["end"], 3)
+        self.assertGreater(records[1]["start"], 10)
+
+    def test_resume_drops_results_after_checkpoint(self):
+        """Test that output written after the last checkpoint (a crash mid-file) is discarded."""
+        self.assertEqual(self.run_cli("--workers", "1", "--no-answers"), 0)
+        expected = self.read_output()
+        with open(self.output, "a") as f:
+            f.write('{"file": "half written"')
+        self.assertEqual(self.run_cli("--workers", "1", "--no-answers"), 0)
+        self.assertEqual(self.read_output(), expected)
+        # Without a checkpoint, existing output is not touched unless asked to
+        os.remove(self.output + ".checkpoint")
+        self.assertEqual(self.run_cli("--workers", "0", "--no-answers"), 2)
+        self.assertEqual(self.run_cli("--workers", "0", "--no-answers", "--restart"), 0)
+        self.assertEqual(len(self.read_output()), len(expected))
+
+    def test_questions_are_answered(self):
+        """Test that detected questions get an Ollama answer."""
+        with FakeOllamaServer(token_rate=1000, first_token_delay=0) as server, \
+                patch('audio.MockBackend.recognize', return_value="What is a REST API?"):
+            self.assertEqual(self.run_cli("--workers", "0", "--host", server.url, "--model", "benchmark"), 0)
+        records = self.read_output()
+        self.assertEqual(len(records), 2)
+        for record in records:
+            self.assertTrue(record["is_question"])
+            self.assertEqual(record["answer"], server.answer)
+
+
 if __name__ == '__main__':
     unittest.main()